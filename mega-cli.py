@@ -30,22 +30,34 @@ class MegaCLI:
             await asyncio.sleep(3)
 
     async def async_run(self) -> None:
-        async with self.objects[self.args.lib]() as megadebrid:
-            megadebrid_method = getattr(
-                megadebrid, MegaArgParser.method_resolver(self.args.command)
-            )
-
-            method_args = set(getfullargspec(megadebrid_method).args[1:])
-            require_args = {
-                key: value
-                for key, value in vars(self.args).items()
-                if key in method_args
-            }
-            result = await megadebrid_method(**require_args)
-            print(result)
-
-            # TODO: need to be implemented
-            # await a.run_until_interrupt('none')
+        megadebrid_class = self.objects[self.args.lib]
+
+        try:
+            async with megadebrid_class() as megadebrid:
+                megadebrid_method = getattr(
+                    megadebrid, MegaArgParser.method_resolver(self.args.command)
+                )
+
+                method_args = set(getfullargspec(megadebrid_method).args[1:])
+                require_args = {
+                    key: value
+                    for key, value in vars(self.args).items()
+                    if key in method_args
+                }
+                result = megadebrid_method(**require_args)
+
+                # Bulk commands stream their results as soon as each one completes
+                if hasattr(result, "__aiter__"):
+                    async for item in result:
+                        print(item)
+                else:
+                    print(await result)
+
+                # TODO: need to be implemented
+                # await a.run_until_interrupt('none')
+        finally:
+            # The shared connector outlives the sessions which used it
+            await megadebrid_class.close_shared_connector()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,12 @@
 import asyncio
-from bs4 import BeautifulSoup
+from typing import Optional, Union
 
 from megadebrid.libs.base import MegaDebrid
+from megadebrid.utils.extractors import (
+    DebridCodesExtractor,
+    parse_debrid_codes_in_thread,
+)
+from megadebrid.utils.uploads import TorrentSource, torrent_form
 
 
 class MegaDebridAjax(MegaDebrid):
@@ -9,8 +14,8 @@ class MegaDebridAjax(MegaDebrid):
     Mega-Debrid AJAX: provide the methods to perform similar actions than AJAX backend.
     """
 
-    def __init__(self) -> MegaDebrid:
-        super().__init__(is_ajax=True)
+    def __init__(self, *args, **kwargs) -> MegaDebrid:
+        super().__init__(*args, is_ajax=True, **kwargs)
         self.is_authenticated()
 
     @property
@@ -38,20 +43,48 @@ class MegaDebridAjax(MegaDebrid):
         params = {"ajax": "getMyTorrents"}
 
         async with self.session.get(self.base_url, params=params) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
-    async def get_torrent_status(self, torrent_id: str) -> dict:
+    async def get_torrent_status(
+        self, torrent_id: Union[str, list[str]], batch_size: int = 50
+    ) -> dict:
         """
         POST torrent(s) id(s) to have the current status of the elements wished to be uploaded on the seedbox
         on https://www.mega-debrid.eu/index.php?ajax=statusTorrent
+        The IDs are sent by batches of 'batch_size' ('torrentId[]' array), the statuses are merged.
         """
+        torrent_ids = [torrent_id] if isinstance(torrent_id, str) else list(torrent_id)
+        batch_size = max(1, batch_size)
+        batches = [
+            torrent_ids[start : start + batch_size]
+            for start in range(0, len(torrent_ids), batch_size)
+        ]
+
+        responses = await asyncio.gather(*map(self.post_torrents_status, batches))
+
+        for response in responses:
+            if response.get("response_code") != "ok":
+                return response
+
+        torrents = {}
+
+        for response in responses:
+            torrents.update(response.get("torrents") or {})
+
+        return {
+            **(responses[0] if responses else {"response_code": "ok"}),
+            "torrents": torrents,
+        }
+
+    async def post_torrents_status(self, torrent_ids: list[str]) -> dict:
+        """POST one batch of torrents ids on https://www.mega-debrid.eu/index.php?ajax=statusTorrent"""
         params = {"ajax": "statusTorrent"}
-        data = {"torrentId[]": torrent_id}
+        data = [("torrentId[]", torrent_id) for torrent_id in torrent_ids]
 
         async with self.session.post(
             self.base_url, params=params, data=data
         ) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
     async def upload_magnet(self, magnet: str) -> dict:
         """
@@ -67,23 +100,27 @@ class MegaDebridAjax(MegaDebrid):
         async with self.session.post(
             self.base_url, params=params, data=data
         ) as response:
-            return await response.json(content_type="text/html")
-
-    async def upload_torrent(self, torrent: str, split_size_file: int = 0) -> dict:
+            return await self.read_json(response)
+
+    async def upload_torrent(
+        self,
+        torrent: TorrentSource,
+        split_size_file: int = 0,
+        filename: Optional[str] = None,
+    ) -> dict:
         """
-        POST torrent file on the seedbox to be processed
+        POST torrent file (or its content as bytes) on the seedbox to be processed
         on https://www.mega-debrid.eu/index.php?ajax=uploadTorrent
         """
         params = {"ajax": "uploadTorrent"}
-        data = {
-            "splitSizeFile": split_size_file,
-            "torrent": open(torrent, "rb"),
-        }
 
-        async with self.session.post(
-            self.base_url, params=params, data=data
-        ) as response:
-            return await response.json(content_type="text/html")
+        async with torrent_form(
+            "torrent", torrent, filename=filename, splitSizeFile=split_size_file
+        ) as form:
+            async with self.session.post(
+                self.base_url, params=params, data=form
+            ) as response:
+                return await self.read_json(response)
 
     async def remove_torrent(self, torrent_id: str) -> dict:
         """
@@ -96,12 +133,12 @@ class MegaDebridAjax(MegaDebrid):
         async with self.session.post(
             self.base_url, params=params, data=data
         ) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
-    async def debrid_link(self, link: str, password: str = "") -> dict:
+    async def get_debrid_codes(self, link: str, password: str = "") -> list[str]:
         """
-        POST a link to be debrided
-        on https://www.mega-debrid.eu/index.php?ajax=statusTorrent
+        POST link(s) (one per line) to be debrided and return the code of each one
+        on https://www.mega-debrid.eu/index.php?ajax=xhr_debrid
         Content-Type: 'application/x-www-form-urlencoded'
         """
         params = {
@@ -113,15 +150,27 @@ class MegaDebridAjax(MegaDebrid):
             "i": "0",
             "password": password,
         }
+        extractor = DebridCodesExtractor()
+        html_chunks = []
 
         async with self.session.post(
             self.base_url, params=params, data=data
         ) as response:
-            html_body = await response.text()
+            # Read the 'debrid_<N>' codes while the HTML is received
+            async for chunk in response.content.iter_any():
+                extractor.feed(chunk)
+                html_chunks.append(chunk)
 
-        soup = BeautifulSoup(html_body, "html.parser")
-        debrid_code = soup.find(id="debrid_0")["data-code"]
+        # Unexpected markup: parse the whole document out of the event loop
+        return extractor.get_codes() or await parse_debrid_codes_in_thread(
+            b"".join(html_chunks)
+        )
 
+    async def debrid_code(self, debrid_code: str) -> dict:
+        """
+        POST a debrid code to get the debrided link
+        on https://www.mega-debrid.eu/index.php?ajax=debrid
+        """
         params = {
             "ajax": "debrid",
             "json": "1",
@@ -131,4 +180,27 @@ class MegaDebridAjax(MegaDebrid):
         async with self.session.post(
             self.base_url, params=params, data=data
         ) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
+
+    async def debrid_link(self, link: str, password: str = "") -> dict:
+        """
+        POST a link to be debrided
+        on https://www.mega-debrid.eu/index.php?ajax=xhr_debrid then ajax=debrid
+        """
+        debrid_codes = await self.get_debrid_codes(link, password)
+
+        if not debrid_codes:
+            return {
+                "response_code": "INVALID_RESPONSE",
+                "response_text": "No debrid code found for the link.",
+            }
+
+        return await self.debrid_code(debrid_codes[0])
+
+    async def debrid_links(self, links: list[str], password: str = "") -> list[dict]:
+        """
+        POST several links at once to be debrided, then debrid all their codes concurrently
+        (the responses are in the order of the links found by Mega-Debrid)
+        """
+        debrid_codes = await self.get_debrid_codes("\n".join(links), password)
+        return list(await asyncio.gather(*map(self.debrid_code, debrid_codes)))
@@ -1,8 +1,20 @@
 import asyncio
-from typing import Optional, Any
+from typing import Any, AsyncIterator, Iterable, Optional
+from urllib.parse import urlparse
 
 from megadebrid.libs.base import MegaDebrid
-from megadebrid.utils.decorators import renew_obsolete_token
+from megadebrid.utils.bulk import map_concurrently
+from megadebrid.utils.caches import (
+    create_hosters_cache,
+    create_links_cache,
+    create_token_cache,
+)
+from megadebrid.utils.limiters import create_bucket
+from megadebrid.utils.decorators import rate_limited, renew_obsolete_token
+from megadebrid.utils.uploads import TorrentSource, torrent_form
+
+# Uploads in progress at once by the bulk methods
+BULK_CONCURRENCY = 8
 
 
 class MegaDebridApi(MegaDebrid):
@@ -12,22 +24,99 @@ class MegaDebridApi(MegaDebrid):
     WARNING : If you send more than 50 requests per seconds, your IP address will be banned for 1 day.
     """
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
         self.api_token = self.config.get_api_token()
+        # Single-flight authentication: concurrent coroutines wait for the one logging in
+        self.token_lock = None
+        self.token_renewals = 0
+
+        # Token cache: reuse the token of the previous processes instead of logging in again
+        token_cache_config = self.config.get_token_cache_config()
+        self.token_cache = create_token_cache(
+            self.config.get_credentials().get("Username", ""),
+            backend=token_cache_config["BACKEND"],
+            path=token_cache_config["PATH"],
+            url=token_cache_config["REDIS_URL"],
+        )
+
+        # Hosters cache: the hosters list changes rarely, serve it without network call
+        hosters_cache_config = self.config.get_hosters_cache_config()
+        self.hosters_cache = create_hosters_cache(
+            float(hosters_cache_config["TTL"]), path=hosters_cache_config["PATH"]
+        )
+
+        # Links cache: a link unrestricted again before its debrid link expires costs no request
+        links_cache_config = self.config.get_links_cache_config()
+        self.links_cache = create_links_cache(
+            float(links_cache_config["TTL"]),
+            size=int(links_cache_config["SIZE"]),
+            backend=links_cache_config["BACKEND"],
+            url=links_cache_config["REDIS_URL"],
+        )
+
+        limiter_config = self.config.get_limiter_config()
+        self.limiter = create_bucket(
+            "api",
+            rate=float(limiter_config["RATE"]),
+            burst=int(limiter_config["BURST"]),
+            backend=limiter_config["BACKEND"],
+            url=limiter_config["REDIS_URL"],
+            fallback_rate=float(limiter_config["FALLBACK_RATE"]),
+        )
+        self.login_limiter = create_bucket(
+            "login",
+            rate=float(limiter_config["LOGIN_RATE"]),
+            burst=int(limiter_config["LOGIN_BURST"]),
+            backend=limiter_config["BACKEND"],
+            url=limiter_config["REDIS_URL"],
+            fallback_rate=float(limiter_config["LOGIN_FALLBACK_RATE"]),
+        )
 
     @property
     def api_url(self) -> str:
         return f"{ self.base_url }/api.php"
 
+    @property
+    def rate_limit_stats(self) -> dict[str, dict]:
+        """Counters of the calls and their waiting time on each limiter"""
+        return {"api": self.limiter.stats, "login": self.login_limiter.stats}
+
     async def __aenter__(self):
         await super().__aenter__()
         await self.get_token()
         return self
 
+    async def __aexit__(self, *err):
+        # The background refresh of the hosters list uses the session: let it finish first
+        await self.hosters_cache.wait_refresh()
+        await super().__aexit__(*err)
+
+    def get_token_lock(self) -> asyncio.Lock:
+        """Return the authentication lock, created lazily to be bound to the running event loop"""
+        if self.token_lock is None:
+            self.token_lock = asyncio.Lock()
+
+        return self.token_lock
+
     async def get_token(self, is_renew: bool = False) -> None:
-        """Verify if token is present config, else authenticate user with his credentials"""
-        if not self.api_token:
+        """
+        Verify if token is present in environment variables, config or cache,
+        else authenticate user with his credentials and cache the new token
+        """
+        if self.api_token:
+            return
+
+        async with self.get_token_lock():
+            # Another coroutine may have authenticated while waiting for the lock
+            if self.api_token:
+                return
+
+            self.api_token = await self.token_cache.load()
+
+            if self.api_token:
+                return
+
             response = await self.connect_user()
             self.api_token = response.get("token")
 
@@ -37,10 +126,24 @@ class MegaDebridApi(MegaDebrid):
                     "Could not authenticate on Mega-Debrid API: require to have token."
                 )
 
-            # Save token
-            if False:
-                self.config.save_api_token(self.api_token)
+            if is_renew:
+                self.token_renewals += 1
+
+            await self.token_cache.save(self.api_token)
 
+    async def renew_token(self, stale_token: Optional[str]) -> None:
+        """
+        Re-authenticate once for all the coroutines which got a 'TOKEN_ERROR' with the same token:
+        the first one logs in, the others wait for it then use the new token.
+        """
+        async with self.get_token_lock():
+            if self.api_token == stale_token:
+                self.api_token = None
+                await self.token_cache.invalidate(stale_token)
+
+        await self.get_token(is_renew=True)
+
+    @rate_limited("limiter", "login_limiter")
     async def connect_user(self) -> dict[str, str]:
         """
         Connect user:
@@ -56,9 +159,10 @@ class MegaDebridApi(MegaDebrid):
         }
 
         async with self.session.get(self.api_url, params=params) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
     @renew_obsolete_token
+    @rate_limited()
     async def get_user_history(self) -> dict[str, Any]:
         """
         Get user history:
@@ -71,20 +175,41 @@ class MegaDebridApi(MegaDebrid):
         }
 
         async with self.session.get(self.api_url, params=params) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
-    @renew_obsolete_token
     async def get_hosters_list(self) -> dict[str, Any]:
         """
-        Get hosters list:
+        Get hosters list from the cache, refreshed in background once expired (cf. HOSTERS_CACHE config)
+        """
+        return await self.hosters_cache.get(self.fetch_hosters_list)
+
+    @rate_limited()
+    async def fetch_hosters_list(self) -> dict[str, Any]:
+        """
+        Get hosters list (no token required):
         URL: https://www.mega-debrid.eu/api.php?action=getHostersList
         """
         params = {"action": "getHostersList"}
 
         async with self.session.get(self.api_url, params=params) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
+
+    async def get_hoster(self, link: str) -> Optional[dict[str, Any]]:
+        """Return the hoster supporting the link (matched on its domains), None if unsupported"""
+        hostname = (urlparse(link).hostname or "").lower()
+        response = await self.get_hosters_list()
+
+        for hoster in response.get("hosters", []):
+            for domain in hoster.get("domains", []):
+                if hostname == domain.lower() or hostname.endswith(
+                    f".{ domain.lower() }"
+                ):
+                    return hoster
+
+        return None
 
     @renew_obsolete_token
+    @rate_limited()
     async def upload_magnet(self, magnet: str) -> dict[str, Any]:
         """
         Upload torrent (magnet URL of the torrent):
@@ -98,12 +223,15 @@ class MegaDebridApi(MegaDebrid):
         async with self.session.post(
             self.api_url, params=params, data={"magnet": magnet}
         ) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
     @renew_obsolete_token
-    async def upload_torrent(self, torrent: str) -> dict[str, Any]:
+    @rate_limited()
+    async def upload_torrent(
+        self, torrent: TorrentSource, filename: Optional[str] = None
+    ) -> dict[str, Any]:
         """
-        Upload torrent (upload file directly):
+        Upload torrent (upload file directly, or its content as bytes):
         URL: https://www.mega-debrid.eu/api.php?action=uploadTorrent&token=[token]
         """
         params = {
@@ -111,12 +239,38 @@ class MegaDebridApi(MegaDebrid):
             "token": self.api_token,
         }
 
-        async with self.session.post(
-            self.api_url, params=params, data={"file": open(torrent, "rb")}
-        ) as response:
-            return await response.json(content_type="text/html")
+        async with torrent_form("file", torrent, filename=filename) as form:
+            async with self.session.post(
+                self.api_url, params=params, data=form
+            ) as response:
+                return await self.read_json(response)
+
+    async def upload_magnets(
+        self, magnets: Iterable[str], concurrency: int = BULK_CONCURRENCY
+    ) -> AsyncIterator[tuple[str, dict[str, Any]]]:
+        """
+        Upload many magnets with at most 'concurrency' requests in progress (still under the rate limit):
+        yield the (magnet, response) pairs as soon as each upload completes.
+        """
+        async for magnet, response in map_concurrently(
+            self.upload_magnet, magnets, concurrency
+        ):
+            yield magnet, response
+
+    async def upload_torrents(
+        self, torrents: Iterable[TorrentSource], concurrency: int = BULK_CONCURRENCY
+    ) -> AsyncIterator[tuple[TorrentSource, dict[str, Any]]]:
+        """
+        Upload many torrents (paths or contents) with at most 'concurrency' requests in progress:
+        yield the (torrent, response) pairs as soon as each upload completes.
+        """
+        async for torrent, response in map_concurrently(
+            self.upload_torrent, torrents, concurrency
+        ):
+            yield torrent, response
 
     @renew_obsolete_token
+    @rate_limited()
     async def get_torrents_list(self) -> dict[str, Any]:
         """
         Get Torrents list:
@@ -128,9 +282,10 @@ class MegaDebridApi(MegaDebrid):
         }
 
         async with self.session.get(self.api_url, params=params) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
     @renew_obsolete_token
+    @rate_limited()
     async def get_torrent_status(self, torrent_hash: str) -> dict[str, Any]:
         """
         Get torrent information:
@@ -144,10 +299,27 @@ class MegaDebridApi(MegaDebrid):
         async with self.session.post(
             self.api_url, params=params, data={"hash": torrent_hash}
         ) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
 
-    @renew_obsolete_token
     async def debrid_link(
+        self, link: str, password: Optional[str] = None, cache: bool = True
+    ) -> dict[str, str]:
+        """
+        Get debrid link from the cache (cf. LINKS_CACHE config), else from Mega-Debrid API.
+        With cache=False, the link is always unrestricted again (and the new response cached).
+        """
+        password_hash = self.hash_passwd(password)
+        response = await self.links_cache.get(link, password_hash) if cache else None
+
+        if response is None:
+            response = await self.fetch_debrid_link(link, password)
+            await self.links_cache.set(link, password_hash, response)
+
+        return response
+
+    @renew_obsolete_token
+    @rate_limited()
+    async def fetch_debrid_link(
         self, link: str, password: Optional[str] = None
     ) -> dict[str, str]:
         """
@@ -166,4 +338,4 @@ class MegaDebridApi(MegaDebrid):
         async with self.session.post(
             self.api_url, params=params, data=data
         ) as response:
-            return await response.json(content_type="text/html")
+            return await self.read_json(response)
@@ -1,15 +1,28 @@
 import asyncio
 from hashlib import md5
-from aiohttp import ClientSession
+from typing import Any, Callable, Optional
+from weakref import WeakKeyDictionary
+from aiohttp import ClientResponse, ClientSession, ClientTimeout, TCPConnector
 
 from megadebrid.parsers.configparser import MegaConfigParser
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson only speeds up the decoding of the big responses
+    from json import loads as json_loads
+
 
 class MegaDebrid:
     DOMAIN = "www.mega-debrid.eu"
+    # Connectors shared by all the MegaDebrid objects of the process (one per event loop)
+    _shared_connectors = WeakKeyDictionary()
+    # Beginning of a non-JSON body kept in the error response
+    INVALID_BODY_LENGTH = 200
 
     def __init__(self, *args, **kwargs) -> None:
         self.config = MegaConfigParser(config_path=kwargs.pop("config", None))
+        # JSON decoder of the responses: orjson if installed, else the standard library
+        self.loads: Callable[[bytes], Any] = kwargs.pop("loads", None) or json_loads
 
         ajax_config = (
             self.config.get_ajax_info() if kwargs.pop("is_ajax", False) else {}
@@ -17,7 +30,28 @@ class MegaDebrid:
         headers = self.set_headers(ajax_config["USER-AGENT"]) if ajax_config else {}
         cookies = ajax_config["COOKIES"] if ajax_config else {}
 
-        self.session = ClientSession(headers=headers, cookies=cookies)
+        # Connector: given one, shared one or dedicated one (only the later is closed with the session)
+        connector_config = self.config.get_connector_config()
+        connector = kwargs.pop("connector", None)
+        share_connector = kwargs.pop(
+            "share_connector", self.to_bool(connector_config["SHARED"])
+        )
+        connector_owner = connector is None and not share_connector
+
+        if connector is None:
+            connector = (
+                self.get_shared_connector(connector_config)
+                if share_connector
+                else self.create_connector(connector_config)
+            )
+
+        self.session = ClientSession(
+            headers=headers,
+            cookies=cookies,
+            connector=connector,
+            connector_owner=connector_owner,
+            timeout=self.create_timeout(connector_config),
+        )
 
     async def __aenter__(self):
         # Called when enter in 'async with MegaDebrid() as megadebrid:'
@@ -44,7 +78,75 @@ class MegaDebrid:
             "X-Requested-With": "XMLHttpRequest",
         }
 
+    async def read_json(self, response: ClientResponse) -> dict[str, Any]:
+        """
+        Decode the JSON body of the response, whatever its content type (Mega-Debrid answers 'text/html').
+        A non-JSON body (e.g. error or maintenance page) becomes an 'INVALID_RESPONSE' error response.
+        """
+        body = await response.read()
+
+        try:
+            return self.loads(body)
+        except ValueError:
+            return {
+                "response_code": "INVALID_RESPONSE",
+                "response_text": body[: self.INVALID_BODY_LENGTH].decode(
+                    errors="replace"
+                ),
+                "http_status": response.status,
+            }
+
     @staticmethod
     def hash_passwd(password):
         """Password is md5 encoded"""
         return md5(password.encode()).hexdigest() if password else ""
+
+    @staticmethod
+    def to_bool(value: str) -> bool:
+        """Config values are strings: 'true', 'yes', 'on' or '1' are True"""
+        return str(value).strip().lower() in ("true", "yes", "on", "1")
+
+    @staticmethod
+    def to_seconds(value: str) -> Optional[float]:
+        """Config values are strings: empty or '0' means no timeout"""
+        return float(value) if value and float(value) > 0 else None
+
+    @staticmethod
+    def create_connector(connector_config: dict) -> TCPConnector:
+        """Build the TCP connector (connection pool) tuned with the CONNECTOR config"""
+        return TCPConnector(
+            limit=int(connector_config["LIMIT"]),
+            limit_per_host=int(connector_config["LIMIT_PER_HOST"]),
+            ttl_dns_cache=int(connector_config["DNS_CACHE_TTL"]),
+            keepalive_timeout=float(connector_config["KEEPALIVE_TIMEOUT"]),
+        )
+
+    @classmethod
+    def create_timeout(cls, connector_config: dict) -> ClientTimeout:
+        """Build the requests timeouts with the CONNECTOR config"""
+        return ClientTimeout(
+            total=cls.to_seconds(connector_config["TIMEOUT_TOTAL"]),
+            connect=cls.to_seconds(connector_config["TIMEOUT_CONNECT"]),
+            sock_read=cls.to_seconds(connector_config["TIMEOUT_SOCK_READ"]),
+        )
+
+    @classmethod
+    def get_shared_connector(cls, connector_config: dict) -> TCPConnector:
+        """Return the connector shared in the current event loop, create it if required"""
+        loop = asyncio.get_event_loop()
+        connector = cls._shared_connectors.get(loop)
+
+        if connector is None or connector.closed:
+            connector = cls._shared_connectors[loop] = cls.create_connector(
+                connector_config
+            )
+
+        return connector
+
+    @classmethod
+    async def close_shared_connector(cls) -> None:
+        """Close the connector shared in the current event loop"""
+        connector = cls._shared_connectors.pop(asyncio.get_event_loop(), None)
+
+        if connector is not None:
+            await connector.close()
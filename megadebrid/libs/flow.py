@@ -1,11 +1,21 @@
 import asyncio
+import re
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, Iterable, Optional, Union
 
 from aiofiles import open as aiopen
 from urllib.parse import urlparse, parse_qs, unquote_plus
 
-from megadebrid.utils.progressions import Progress
+from megadebrid.utils.bulk import error_response, map_concurrently
+from megadebrid.utils.checkpoints import Checkpoint
+from megadebrid.utils.pollers import PollingSchedule, TorrentsPoller
+from megadebrid.utils.progressions import (
+    Progress,
+    ProgressCallback,
+    ProgressTracker,
+    announce_phase,
+)
+from megadebrid.utils.uploads import TorrentSource
 from megadebrid.libs.api import MegaDebridApi
 
 
@@ -15,9 +25,12 @@ class MegaDebridFlow(MegaDebridApi):
     to perform a chain the actions to obtain the desired beahvior.
     """
 
+    # 'Content-Range' header of a partial response: first byte, last byte (inclusive) and size
+    CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
     def __init__(self, *args, **kwargs) -> None:
         # flow = kwargs.pop('flow', 'api')
-        super().__init__()
+        super().__init__(*args, **kwargs)
         self.progress = Progress()
 
     @staticmethod
@@ -38,28 +51,183 @@ class MegaDebridFlow(MegaDebridApi):
             exit(1)
         return path
 
-    async def wait_until_complete(self, torrent_hash: str, second: int = 3) -> dict:
+    async def wait_until_complete(
+        self,
+        torrent_hash: str,
+        second: int = 3,
+        max_second: int = 60,
+        shared: bool = False,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> dict:
         """
-        Request the torrent status until upload is complete
+        Request the torrent status until upload is complete.
+        The interval between two requests adapts to the estimated time to completion:
+        long while the conversion is far from over, short when it nears.
 
         Args:
             torrent_hash (str): Torrent hash to monitor.
-            second (int, optional): Second to wait between each request. Defaults to 1.
+            second (int, optional): Minimum second to wait between each request. Defaults to 3.
+            max_second (int, optional): Maximum second to wait between each request. Defaults to 60.
+            shared (bool, optional): Use the poller shared by all the waiters of the event loop,
+                                     which requests each torrent once per cycle. Defaults to False.
+            on_progress (Callable, optional): Called with the 'converting' progress events. Defaults to None.
 
         Returns:
             dict: Return last the torrent status response which is complete
         """
+        schedule = PollingSchedule(min_interval=second, max_interval=max_second)
+        tracker = ProgressTracker(on_progress, "converting")
+        printed = None
+
+        if shared:
+            async for json_rep in TorrentsPoller.shared().watch(
+                self, torrent_hash, schedule=schedule
+            ):
+                printed = self.print_status(json_rep["status"], printed)
+                self.track_status(tracker, json_rep["status"])
+
+            return json_rep
+
         json_rep = await self.get_torrent_status(torrent_hash)
+        self.track_status(tracker, json_rep["status"])
 
         while json_rep["status"]["status"] != "complete":
-            await asyncio.sleep(second)
+            await asyncio.sleep(schedule.next_interval(json_rep["status"]))
             json_rep = await self.get_torrent_status(torrent_hash)
-
-            print(json_rep["status"])
-            # end='\r' if json_rep['status']['status'] != 'complete' else '\n')            # will change size when printing
+            printed = self.print_status(json_rep["status"], printed)
+            self.track_status(tracker, json_rep["status"])
 
         return json_rep
 
+    @staticmethod
+    def print_status(status: dict, printed: Optional[tuple] = None) -> tuple:
+        """Print the torrent status only when it changes, return what was printed"""
+        current = (status.get("status"), status.get("progress"))
+
+        if current != printed:
+            print(status)
+
+        return current
+
+    @staticmethod
+    def track_status(tracker: ProgressTracker, status: dict) -> None:
+        """Report the conversion progress of the torrent status: 'size' in bytes, 'speed' in MB/s"""
+        size = PollingSchedule.to_float(status.get("size"))
+        progress = PollingSchedule.to_float(status.get("progress"))
+        tracker.update(
+            done=int(size * progress / 100),
+            total=int(size),
+            rate=PollingSchedule.to_float(status.get("speed")) * 1024 * 1024,
+        )
+
+    @staticmethod
+    def split_ranges(
+        total: int, segments: int, offset: int = 0
+    ) -> list[tuple[int, int]]:
+        """
+        Split the file size into contiguous byte ranges (inclusive, as the HTTP 'Range' header)
+
+        Args:
+            total (int): Size in bytes to split.
+            segments (int): Number of ranges wished.
+            offset (int, optional): First byte of the first range. Defaults to 0.
+
+        Returns:
+            list: List of (start, end) byte ranges covering the whole size.
+        """
+        segment_size = -(-total // max(segments, 1))  # Ceil division
+        return [
+            (offset + start, offset + min(start + segment_size, total) - 1)
+            for start in range(0, total, segment_size)
+        ]
+
+    async def probe_file(self, url: str) -> dict:
+        """
+        Query the headers of the remote file to know if it could be downloaded by segments or resumed
+
+        Args:
+            url (str): URL of the file to download.
+
+        Returns:
+            dict: Size of the file ('size'), whether the server accepts byte ranges ('ranges')
+                  and its validators ('etag', 'last_modified').
+        """
+        async with self.session.head(url, allow_redirects=True) as response:
+            return {
+                "size": int(response.headers.get("Content-Length", 0)),
+                "ranges": response.headers.get("Accept-Ranges", "").lower() == "bytes",
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+
+    async def save_segment(
+        self,
+        url: str,
+        checkpoint: Checkpoint,
+        start: int,
+        end: int,
+        chunk_size: int,
+        on_chunk: Callable[[int], None],
+    ) -> None:
+        """
+        Download a byte range of the remote file and write it in place into the '.part' file
+
+        Args:
+            url (str): URL of the file to download.
+            checkpoint (Checkpoint): Partial download where the range will be written and recorded.
+            start (int): First byte of the range.
+            end (int): Last byte of the range (inclusive).
+            chunk_size (int): Size of the chunks while streaming the response.
+            on_chunk (Callable): Called with the size of each written chunk.
+        """
+        headers = {"Range": f"bytes={ start }-{ end }"}
+
+        async with self.session.get(url, headers=headers) as response:
+            if response.status != 206:
+                raise Exception(
+                    f"Could not download bytes { start }-{ end } of '{ url }': "
+                    f"server replied { response.status } instead of 206."
+                )
+
+            content_range = self.CONTENT_RANGE.fullmatch(
+                response.headers.get("Content-Range", "").strip()
+            )
+
+            if content_range is None or content_range.group(1, 2) != (
+                str(start),
+                str(end),
+            ):
+                raise Exception(
+                    f"Could not download bytes { start }-{ end } of '{ url }': "
+                    f"server replied the range '{ response.headers.get('Content-Range') }'."
+                )
+
+            async with aiopen(checkpoint.part_path, "r+b") as f:
+                await f.seek(start)
+                synced = start  # First byte not synced to the disk yet
+
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    await f.write(chunk)
+                    start += len(chunk)
+                    on_chunk(len(chunk))
+
+                    if checkpoint.is_due():
+                        await checkpoint.sync(f)
+                        checkpoint.add(synced, start - 1)
+                        synced = start
+                        await checkpoint.save()
+
+                await checkpoint.sync(f)
+
+                if start > synced:
+                    checkpoint.add(synced, start - 1)
+
+            if start != end + 1:
+                raise Exception(
+                    f"Could not download bytes { start }-{ end } of '{ url }': "
+                    "the response didn't match the length of the range."
+                )
+
     async def save_file(
         self,
         url: str,
@@ -67,9 +235,13 @@ class MegaDebridFlow(MegaDebridApi):
         filename: Optional[str] = None,
         chunk_size: int = 1024 * 1024 * 10,
         progress_bar: Optional[str] = None,
+        segments: int = 1,
+        on_progress: Optional[ProgressCallback] = None,
     ) -> Path:
         """
-        Asynchronous downloading and saving of the remote file
+        Asynchronous downloading and saving of the remote file.
+        The file is written as '<filename>.part' next to a sidecar '<filename>.part.json':
+        calling it again for the same file resumes the missing byte ranges, then the file is renamed.
 
         Args:
             url (str): URL of the file to download.
@@ -77,6 +249,9 @@ class MegaDebridFlow(MegaDebridApi):
             filename (str): Filename to save on the local disk.
             chunk_size (int, optional): Size of the chunks while streaming the response. Defaults to 10MB.
             progress_bar (str, optional): Name of the show_progress wishes: None, bar or size. Default to None.
+            segments (int, optional): Number of byte ranges downloaded concurrently. Defaults to 1.
+                                      Fall back on a single stream if the server doesn't accept ranges.
+            on_progress (Callable, optional): Called with the 'downloading' progress events. Defaults to None.
 
         Returns:
             Path: Path of the saved file
@@ -84,26 +259,160 @@ class MegaDebridFlow(MegaDebridApi):
         folder = (
             folder if isinstance(folder, Path) else Path(folder)
         )  # ? PREVENT ANY PROBLEM YET
+        filename = filename or unquote_plus(url.rsplit("/", 1)[-1])
+        checkpoint = await Checkpoint.load(folder / filename)
+
+        if segments > 1 or checkpoint:
+            remote_file = await self.probe_file(url)
+
+            if remote_file["ranges"] and remote_file["size"]:
+                if not checkpoint or not checkpoint.matches(
+                    total=remote_file["size"],
+                    etag=remote_file["etag"],
+                    last_modified=remote_file["last_modified"],
+                ):
+                    checkpoint = Checkpoint(
+                        path=folder / filename,
+                        url=url,
+                        total=remote_file["size"],
+                        etag=remote_file["etag"],
+                        last_modified=remote_file["last_modified"],
+                    )
+                    await checkpoint.allocate()
+
+                return await self.save_file_segmented(
+                    url=url,
+                    checkpoint=checkpoint,
+                    chunk_size=chunk_size,
+                    progress_bar=progress_bar,
+                    segments=segments,
+                    on_progress=on_progress,
+                )
 
         async with self.session.get(url) as response:
-            content_length = int(response.headers.get("Content-Length", 0))
-            filename = filename or unquote_plus(url.rsplit("/", 1)[-1])
-
-            async with aiopen(folder / filename, "wb") as f:
-                chunk_written = 0
-
-                async for chunk in response.content.iter_chunked(chunk_size):
-                    await f.write(chunk)
+            checkpoint = Checkpoint(
+                path=folder / filename,
+                url=url,
+                total=int(response.headers.get("Content-Length", 0)),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
+            await checkpoint.save(force=True)
+            tracker = ProgressTracker(
+                on_progress, "downloading", total=checkpoint.total
+            )
+
+            try:
+                async with aiopen(checkpoint.part_path, "wb") as f:
+                    chunk_written = synced = 0
+
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        await f.write(chunk)
+                        chunk_written += len(chunk)
+                        tracker.advance(len(chunk))
+
+                        if checkpoint.is_due():
+                            await checkpoint.sync(f)
+                            checkpoint.add(synced, chunk_written - 1)
+                            synced = chunk_written
+                            await checkpoint.save()
+
+                        if progress_bar:
+                            self.progress.render(
+                                progress=chunk_written,
+                                total=checkpoint.total,
+                                choice=progress_bar,
+                                to_convert=True,
+                            )
+
+                    await checkpoint.sync(f)
+
+                    if chunk_written > synced:
+                        checkpoint.add(synced, chunk_written - 1)
+
+                if checkpoint.total and chunk_written != checkpoint.total:
+                    raise Exception(
+                        f"Could not download '{ url }': received { chunk_written } bytes "
+                        f"instead of { checkpoint.total }."
+                    )
+            finally:
+                await checkpoint.save(force=True)
+
+                if progress_bar:
+                    self.progress.finish()
+
+        return await checkpoint.complete()
+
+    async def save_file_segmented(
+        self,
+        url: str,
+        checkpoint: Checkpoint,
+        chunk_size: int = 1024 * 1024 * 10,
+        progress_bar: Optional[str] = None,
+        segments: int = 4,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Path:
+        """
+        Download the missing byte ranges of the '.part' file concurrently, then rename it
 
-                    if progress_bar:
-                        chunk_written += chunk_size
-                        self.progress.render(
-                            progress=chunk_written, total=content_length, choice="bar"
-                        )
+        Args:
+            url (str): URL of the file to download (server must accept byte ranges).
+            checkpoint (Checkpoint): Partial download (preallocated) to complete.
+            chunk_size (int, optional): Size of the chunks while streaming the responses. Defaults to 10MB.
+            progress_bar (str, optional): Name of the show_progress wishes: None, bar or size. Default to None.
+            segments (int, optional): Number of byte ranges downloaded concurrently. Defaults to 4.
+            on_progress (Callable, optional): Called with the 'downloading' progress events. Defaults to None.
 
-                await f.flush()
+        Returns:
+            Path: Path of the saved file
+        """
+        chunk_written = checkpoint.completed
+        missing = checkpoint.missing()
+        remaining = sum(end - start + 1 for start, end in missing)
+        semaphore = asyncio.Semaphore(max(segments, 1))
+        tracker = ProgressTracker(
+            on_progress, "downloading", total=checkpoint.total, done=chunk_written
+        )
 
-        return folder / filename
+        def on_chunk(size: int) -> None:
+            nonlocal chunk_written
+            chunk_written += size
+            tracker.advance(size)
+
+            if progress_bar:
+                self.progress.render(
+                    progress=chunk_written,
+                    total=checkpoint.total,
+                    choice=progress_bar,
+                    to_convert=True,
+                )
+
+        async def save_range(start: int, end: int) -> None:
+            async with semaphore:
+                await self.save_segment(
+                    url, checkpoint, start, end, chunk_size, on_chunk
+                )
+
+        # Share the segments between the missing ranges according to their size
+        ranges = [
+            byte_range
+            for start, end in missing
+            for byte_range in self.split_ranges(
+                total=end - start + 1,
+                segments=max(1, round(segments * (end - start + 1) / remaining)),
+                offset=start,
+            )
+        ]
+
+        try:
+            await asyncio.gather(*(save_range(start, end) for start, end in ranges))
+        finally:
+            await checkpoint.save(force=True)
+
+            if progress_bar:
+                self.progress.finish()
+
+        return await checkpoint.complete()
 
     async def debrid_and_save_file(
         self,
@@ -112,6 +421,9 @@ class MegaDebridFlow(MegaDebridApi):
         password: str = "",
         chunk_size: int = 1024 * 1024 * 10,
         progress_bar: str = None,
+        segments: int = 1,
+        cache: bool = True,
+        on_progress: Optional[ProgressCallback] = None,
     ) -> Path:
         """
         Debride the file/link and download it to the specified folder.
@@ -123,22 +435,142 @@ class MegaDebridFlow(MegaDebridApi):
             password (str, optional): if the link have password. Defaults to "".
             chunk_size (int, optional): Size of the chunks while streaming the response. Defaults to 10MB.
             progress_bar (str or None, optional): Name of the show_progress wishes: None, bar or size. Default to None.
+            segments (int, optional): Number of byte ranges downloaded concurrently. Defaults to 1.
+            cache (bool, optional): Reuse the debrid link cached for this link. Defaults to True.
+            on_progress (Callable, optional): Called with the 'debriding' then 'downloading' progress events.
+                                              Defaults to None.
 
         Returns:
             str: Path of the downloaded file
         """
-        json_rep = await self.debrid_link(link, password)
-        saved_path = await self.save_file(
-            url=json_rep["debridLink"],
-            folder=folder,
-            filename=json_rep["filename"],
-            chunk_size=chunk_size,
-            progress_bar=progress_bar,
-        )
+        announce_phase(on_progress, "debriding")
+        json_rep = await self.debrid_link(link, password, cache=cache)
+
+        try:
+            saved_path = await self.save_file(
+                url=json_rep["debridLink"],
+                folder=folder,
+                filename=json_rep["filename"],
+                chunk_size=chunk_size,
+                progress_bar=progress_bar,
+                segments=segments,
+                on_progress=on_progress,
+            )
+        except Exception:
+            # The debrid link may have expired: the next attempt unrestricts the link again
+            await self.links_cache.invalidate(link, self.hash_passwd(password))
+            raise
 
         return saved_path
 
-    async def download_magnet(self, magnet: str, folder: Path) -> Path:
+    async def debrid_and_save_many(
+        self,
+        links: Iterable[str],
+        folder: Path,
+        password: str = "",
+        concurrency: int = 2,
+        prefetch: int = 4,
+        chunk_size: int = 1024 * 1024 * 10,
+        segments: int = 1,
+        cache: bool = True,
+    ) -> AsyncIterator[tuple[str, Union[Path, dict]]]:
+        """
+        Debride the links and download them to the specified folder, as a pipeline:
+        the debrid links are resolved ahead by their own workers while the files of the previous ones
+        are downloaded, so that the 'getLink' latency is hidden behind the transfers.
+
+        Args:
+            links (Iterable[str]): direct download links, read lazily.
+            folder (Path): folder to save the files.
+            password (str, optional): if the links have password. Defaults to "".
+            concurrency (int, optional): Number of files downloaded concurrently. Defaults to 2.
+            prefetch (int, optional): Number of links resolved concurrently, and of resolved links
+                                      waiting for a download (bounded as the debrid links expire). Defaults to 4.
+            chunk_size (int, optional): Size of the chunks while streaming the responses. Defaults to 10MB.
+            segments (int, optional): Number of byte ranges downloaded concurrently per file. Defaults to 1.
+            cache (bool, optional): Reuse the debrid links cached for these links. Defaults to True.
+
+        Yields:
+            tuple: (link, Path of the downloaded file) as soon as each one completes,
+                   or (link, error response) if it could not be debrided or downloaded.
+        """
+        concurrency = max(concurrency, 1)
+        resolved = asyncio.Queue(maxsize=max(prefetch, 1))
+        results = asyncio.Queue()
+
+        async def debrid(link: str) -> dict:
+            return await self.debrid_link(link, password, cache=cache)
+
+        async def resolve() -> None:
+            try:
+                async for link, json_rep in map_concurrently(debrid, links, prefetch):
+                    await resolved.put((link, json_rep))
+            except Exception as error:
+                # Reading the links failed: raise it to the caller, which stops the downloads
+                await results.put(error)
+
+            for _ in range(concurrency):
+                await resolved.put(None)
+
+        async def download_one(link: str, json_rep: dict) -> Union[Path, dict]:
+            if json_rep.get("response_code") != "ok":
+                return json_rep
+
+            try:
+                return await self.save_file(
+                    url=json_rep["debridLink"],
+                    folder=folder,
+                    filename=json_rep["filename"],
+                    chunk_size=chunk_size,
+                    segments=segments,
+                )
+            except Exception as error:
+                # The debrid link may have expired: the next attempt unrestricts the link again
+                await self.links_cache.invalidate(link, self.hash_passwd(password))
+                return error_response(error)
+
+        async def download() -> None:
+            try:
+                while (item := await resolved.get()) is not None:
+                    link, json_rep = item
+
+                    try:
+                        result = await download_one(link, json_rep)
+                    except Exception as error:
+                        # E.g. links cache unreachable: only this link fails
+                        result = error_response(error)
+
+                    await results.put((link, result))
+            finally:
+                # Whatever happens, the consumer must know this worker is done
+                results.put_nowait(None)
+
+        workers = [asyncio.ensure_future(resolve())] + [
+            asyncio.ensure_future(download()) for _ in range(concurrency)
+        ]
+
+        try:
+            finished = 0
+
+            while finished < concurrency:
+                item = await results.get()
+
+                if item is None:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def download_magnet(
+        self,
+        magnet: str,
+        folder: Path,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Path:
         """
         Uses the torrent converter with a magnet link,
         then download the file in the specified folder.
@@ -146,6 +578,8 @@ class MegaDebridFlow(MegaDebridApi):
         Args:
             magnet (str): magnet link of the torrent.
             folder (Path): folder to save the file.
+            on_progress (Callable, optional): Called with the 'converting', 'debriding' then 'downloading'
+                                              progress events. Defaults to None.
 
         Returns:
             Path: Path of the downloaded file
@@ -153,32 +587,42 @@ class MegaDebridFlow(MegaDebridApi):
         json_rep = await self.upload_magnet(magnet)
         torrent_hash = json_rep["newTorrent"]["hash"] or self.get_magnet_hash(magnet)
 
-        json_rep = await self.wait_until_complete(torrent_hash)
+        json_rep = await self.wait_until_complete(
+            torrent_hash, shared=True, on_progress=on_progress
+        )
         saved_path = await self.debrid_and_save_file(
-            link=json_rep["status"]["ub_link"], folder=folder
+            link=json_rep["status"]["ub_link"], folder=folder, on_progress=on_progress
         )
 
         return saved_path
 
-    async def download_torrent(self, torrent_path: Path, folder: Path) -> Path:
+    async def download_torrent(
+        self,
+        torrent_path: TorrentSource,
+        folder: Path,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> Path:
         """
         Uses the torrent converter with a torrent file,
         then download the file in the specified folder.
 
         Args:
-            torrent_path (Path): path of the torrent file.
+            torrent_path (Path or bytes): path of the torrent file, or its content.
             folder (Path): folder to save the file.
+            on_progress (Callable, optional): Called with the 'converting', 'debriding' then 'downloading'
+                                              progress events. Defaults to None.
 
         Returns:
             Path: Path of the downloaded file
         """
-        print(type(torrent_path), torrent_path)
         json_rep = await self.upload_torrent(torrent_path)
         torrent_hash = json_rep["newTorrent"]["hash"]
 
-        json_rep = await self.wait_until_complete(torrent_hash)
+        json_rep = await self.wait_until_complete(
+            torrent_hash, shared=True, on_progress=on_progress
+        )
         saved_path = await self.debrid_and_save_file(
-            link=json_rep["status"]["ub_link"], folder=folder
+            link=json_rep["status"]["ub_link"], folder=folder, on_progress=on_progress
         )
 
         return saved_path
@@ -1,5 +1,21 @@
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
 from pathlib import Path
+import sys
+
+
+def read_lines(path: str) -> list[str]:
+    """Read the items of a bulk command, one per line ('-' for stdin), skipping blank and '#' lines"""
+    try:
+        text = sys.stdin.read() if path == "-" else Path(path).read_text()
+    except OSError as error:
+        # Reported by argparse as a usage error
+        raise ArgumentTypeError(f"can't read '{ path }': { error.strerror or error }")
+
+    return [
+        line.strip()
+        for line in text.splitlines()
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
 
 
 class MegaArgParser:
@@ -13,6 +29,8 @@ class MegaArgParser:
             "history": "get_user_history",
             "hosters-list": "get_hosters_list",
             "hosters": "get_hosters_list",
+            "hoster": "get_hoster",
+            "supported": "get_hoster",
             "my-torrents": "get_torrents_list",
             "list": "get_torrents_list",
             "torrents": "get_torrents_list",
@@ -20,8 +38,11 @@ class MegaArgParser:
             "status": "get_torrent_status",
             "upload-magnet": "upload_magnet",
             "magnet": "upload_magnet",
+            "upload-magnets": "upload_magnets",
+            "magnets": "upload_magnets",
             "upload-torrent": "upload_torrent",
             "torrent": "upload_torrent",
+            "upload-torrents": "upload_torrents",
             "remove-torrent": "remove_torrent",
             "remove": "remove_torrent",
             "debrid-link": "debrid_link",
@@ -34,6 +55,7 @@ class MegaArgParser:
             "debrid-and-download": "debrid_and_save_file",
             "download": "debrid_and_save_file",
             "unrestrict": "debrid_and_save_file",
+            "download-many": "debrid_and_save_many",
             "download-magnet": "download_magnet",
             "ddl-magnet": "download_magnet",
             "download-torrent": "download_torrent",
@@ -91,16 +113,25 @@ class MegaArgParser:
         parser_ajax_torrent_status = subparser_ajax.add_parser(
             "torrent-status",
             aliases=["status"],
-            help="get the status of a torrent",
+            help="get the status of torrent(s)",
         )
         parser_ajax_torrent_status.add_argument(
             "-i",
             "--id",
             metavar="ID",
             type=str,
+            nargs="+",
             required=True,
             dest="torrent_id",
-            help="ID of the torrent to query",
+            help="ID(s) of the torrent(s) to query",
+        )
+        parser_ajax_torrent_status.add_argument(
+            "--batch-size",
+            metavar="SIZE",
+            type=int,
+            default=50,
+            dest="batch_size",
+            help="number of IDs queried per request (default: 50)",
         )
 
         # MegaDebridAjax: uploadMagnet
@@ -196,6 +227,19 @@ class MegaArgParser:
             help="list availables hosters (no authenticate)",
         )
 
+        # MegaDebridApi: getHostersList (cached)
+        parser_api_hoster = subparser_api.add_parser(
+            "hoster",
+            aliases=["supported"],
+            help="get the hoster supporting a link (no authenticate)",
+        )
+        parser_api_hoster.add_argument(
+            "link",
+            metavar="LINK",
+            type=str,
+            help="link to check",
+        )
+
         # MegaDebridApi: getTorrents
         parser_api_torrents_list = subparser_api.add_parser(
             "my-torrents",
@@ -251,6 +295,51 @@ class MegaArgParser:
             help="path to the torrent file",
         )
 
+        # MegaDebridApi: uploadTorrent (bulk of magnets)
+        parser_api_upload_magnets = subparser_api.add_parser(
+            "upload-magnets",
+            aliases=["magnets"],
+            help="add the magnet links of a file (or stdin), concurrently",
+        )
+        parser_api_upload_magnets.add_argument(
+            "-f",
+            "--from-file",
+            metavar="PATH",
+            dest="magnets",
+            type=read_lines,
+            default="-",
+            help="file with one magnet per line, '-' for stdin (default)",
+        )
+        parser_api_upload_magnets.add_argument(
+            "-c",
+            "--concurrency",
+            metavar="N",
+            type=int,
+            default=8,
+            help="maximum number of uploads in progress",
+        )
+
+        # MegaDebridApi: uploadTorrent (bulk of torrent files)
+        parser_api_upload_torrents = subparser_api.add_parser(
+            "upload-torrents",
+            help="add the torrent files, concurrently",
+        )
+        parser_api_upload_torrents.add_argument(
+            "torrents",
+            metavar="PATH",
+            type=Path,
+            nargs="+",
+            help="paths to the torrent files",
+        )
+        parser_api_upload_torrents.add_argument(
+            "-c",
+            "--concurrency",
+            metavar="N",
+            type=int,
+            default=8,
+            help="maximum number of uploads in progress",
+        )
+
         # MegaDebridApi: getLink
         parser_api_debrid_link = subparser_api.add_parser(
             "debrid-link",
@@ -270,6 +359,12 @@ class MegaArgParser:
             type=str,
             help="if the link have password",
         )
+        parser_api_debrid_link.add_argument(
+            "--no-cache",
+            dest="cache",
+            action="store_false",
+            help="unrestrict the link again instead of reusing the cached debrid link",
+        )
 
         # Subparsers for MegaDebridFlow
         parser_flow = subparsers.add_parser("flow")
@@ -301,7 +396,17 @@ class MegaArgParser:
             dest="second",
             type=int,
             default=3,
-            help="second to wait and each request of the status (default: 3)",
+            help="minimum second to wait between each request of the status (default: 3)",
+        )
+        subparser_flow_wait_complete.add_argument(
+            "-m",
+            "--max-second",
+            metavar="SEC",
+            dest="max_second",
+            type=int,
+            default=60,
+            help="maximum second to wait between each request of the status, "
+            "reached while the torrent is far from complete (default: 60)",
         )
 
         # MegaDebridFlow: save_file
@@ -353,6 +458,15 @@ class MegaArgParser:
             default=None,
             help="choose whether or not to display the progress bar and its type (default: None)",
         )
+        subparser_flow_save_file.add_argument(
+            "-s",
+            "--segments",
+            metavar="NUM",
+            dest="segments",
+            type=int,
+            default=1,
+            help="number of byte ranges downloaded concurrently when the server accepts them (default: 1)",
+        )
 
         # MegaDebridFlow: debrid_and_save_file
         subparser_flow_debrid_save = subparser_flow.add_parser(
@@ -400,6 +514,94 @@ class MegaArgParser:
             default=None,
             help="choose whether or not to display the progress bar and its type (default: None)",
         )
+        subparser_flow_debrid_save.add_argument(
+            "-s",
+            "--segments",
+            metavar="NUM",
+            dest="segments",
+            type=int,
+            default=1,
+            help="number of byte ranges downloaded concurrently when the server accepts them (default: 1)",
+        )
+        subparser_flow_debrid_save.add_argument(
+            "--no-cache",
+            dest="cache",
+            action="store_false",
+            help="unrestrict the link again instead of reusing the cached debrid link",
+        )
+
+        # MegaDebridFlow: debrid_and_save_many
+        subparser_flow_debrid_save_many = subparser_flow.add_parser(
+            "download-many",
+            help="unrestrict the links of a file (or stdin) and download them to the specified folder, "
+            "resolving the next links while the files are downloaded",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "-f",
+            "--from-file",
+            metavar="PATH",
+            dest="links",
+            type=read_lines,
+            default="-",
+            help="file with one link per line, '-' for stdin (default)",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "-p",
+            "--password",
+            metavar="PASSWD",
+            dest="password",
+            type=str,
+            help="if the links have password",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "-F",
+            "--folder",
+            metavar="PATH",
+            dest="folder",
+            type=Path,
+            default=Path.home() / "Downloads",
+            help="folder to save the files (default: ~/Downloads)",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "--concurrency",
+            metavar="NUM",
+            dest="concurrency",
+            type=int,
+            default=2,
+            help="number of files downloaded concurrently (default: 2)",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "--prefetch",
+            metavar="NUM",
+            dest="prefetch",
+            type=int,
+            default=4,
+            help="number of links resolved ahead of the downloads (default: 4)",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "-c",
+            "--chunk-size",
+            metavar="SIZE",
+            dest="chunk_size",
+            type=int,
+            default=1024 * 1024 * 10,
+            help="size of the chunks while streaming the responses (default: 10MB)",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "-s",
+            "--segments",
+            metavar="NUM",
+            dest="segments",
+            type=int,
+            default=1,
+            help="number of byte ranges downloaded concurrently per file when the server accepts them (default: 1)",
+        )
+        subparser_flow_debrid_save_many.add_argument(
+            "--no-cache",
+            dest="cache",
+            action="store_false",
+            help="unrestrict the links again instead of reusing the cached debrid links",
+        )
 
         # MegaDebridFlow: download_magnet
         subparser_flow_download_magnet = subparser_flow.add_parser(
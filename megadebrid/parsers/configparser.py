@@ -16,6 +16,108 @@ class MegaConfigParser(ConfigParser):
     # AJAX environment variables
     ENV_VAR_USER_AGENT = "MEGA_USER_AGENT"
     ENV_VAR_COOKIES = "MEGA_COOKIES"
+    # CONNECTOR environment variables (and their default value)
+    ENV_VARS_CONNECTOR = {
+        "LIMIT": "MEGA_CONNECTOR_LIMIT",
+        "LIMIT_PER_HOST": "MEGA_CONNECTOR_LIMIT_PER_HOST",
+        "DNS_CACHE_TTL": "MEGA_CONNECTOR_DNS_CACHE_TTL",
+        "KEEPALIVE_TIMEOUT": "MEGA_CONNECTOR_KEEPALIVE_TIMEOUT",
+        "TIMEOUT_TOTAL": "MEGA_CONNECTOR_TIMEOUT_TOTAL",
+        "TIMEOUT_CONNECT": "MEGA_CONNECTOR_TIMEOUT_CONNECT",
+        "TIMEOUT_SOCK_READ": "MEGA_CONNECTOR_TIMEOUT_SOCK_READ",
+        "SHARED": "MEGA_CONNECTOR_SHARED",
+    }
+    CONNECTOR_DEFAULTS = {
+        "LIMIT": "100",
+        "LIMIT_PER_HOST": "16",
+        "DNS_CACHE_TTL": "300",
+        "KEEPALIVE_TIMEOUT": "30",
+        "TIMEOUT_TOTAL": "",  # No total timeout: downloads could take hours
+        "TIMEOUT_CONNECT": "30",
+        "TIMEOUT_SOCK_READ": "300",
+        "SHARED": "false",
+    }
+    # LIMITER environment variables (and their default value)
+    ENV_VARS_LIMITER = {
+        "RATE": "MEGA_LIMITER_RATE",
+        "BURST": "MEGA_LIMITER_BURST",
+        "LOGIN_RATE": "MEGA_LIMITER_LOGIN_RATE",
+        "LOGIN_BURST": "MEGA_LIMITER_LOGIN_BURST",
+        "BACKEND": "MEGA_LIMITER_BACKEND",
+        "REDIS_URL": "MEGA_LIMITER_REDIS_URL",
+        "FALLBACK_RATE": "MEGA_LIMITER_FALLBACK_RATE",
+        "LOGIN_FALLBACK_RATE": "MEGA_LIMITER_LOGIN_FALLBACK_RATE",
+    }
+    LIMITER_DEFAULTS = {
+        "RATE": "40",  # API: more than 50 requests per second ban the IP for 1 day
+        "BURST": "10",
+        "LOGIN_RATE": "0.05",  # connectUser: 4 login failed ban the IP for some minutes
+        "LOGIN_BURST": "3",
+        "BACKEND": "memory",  # 'redis' to share the buckets between processes
+        "REDIS_URL": getenv("CELERY_BROKER_URL", "redis://localhost:6379"),
+        # Rates of each process while Redis is unreachable: 10 processes stay under the limits
+        "FALLBACK_RATE": "4",
+        "LOGIN_FALLBACK_RATE": "0.005",
+    }
+    # TOKEN_CACHE environment variables (and their default value)
+    ENV_VARS_TOKEN_CACHE = {
+        "BACKEND": "MEGA_TOKEN_CACHE_BACKEND",
+        "PATH": "MEGA_TOKEN_CACHE_PATH",
+        "REDIS_URL": "MEGA_TOKEN_CACHE_REDIS_URL",
+    }
+    TOKEN_CACHE_DEFAULTS = {
+        "BACKEND": "file",  # 'redis' to share the token between hosts, 'none' to disable
+        "PATH": str(Path.home() / ".mega" / "token.json"),
+        "REDIS_URL": getenv("CELERY_BROKER_URL", "redis://localhost:6379"),
+    }
+    # HOSTERS_CACHE environment variables (and their default value)
+    ENV_VARS_HOSTERS_CACHE = {
+        "TTL": "MEGA_HOSTERS_CACHE_TTL",
+        "PATH": "MEGA_HOSTERS_CACHE_PATH",
+    }
+    HOSTERS_CACHE_DEFAULTS = {
+        "TTL": "3600",  # The hosters list changes about once a day, '0' disables the cache
+        "PATH": str(Path.home() / ".mega" / "hosters.json"),  # '' disables the snapshot
+    }
+    # LINKS_CACHE environment variables (and their default value)
+    ENV_VARS_LINKS_CACHE = {
+        "TTL": "MEGA_LINKS_CACHE_TTL",
+        "SIZE": "MEGA_LINKS_CACHE_SIZE",
+        "BACKEND": "MEGA_LINKS_CACHE_BACKEND",
+        "REDIS_URL": "MEGA_LINKS_CACHE_REDIS_URL",
+    }
+    LINKS_CACHE_DEFAULTS = {
+        "TTL": "3600",  # Below the lifetime of the debrid links, '0' disables the cache
+        "SIZE": "1024",
+        "BACKEND": "memory",  # 'redis' to share the links between processes
+        "REDIS_URL": getenv("CELERY_BROKER_URL", "redis://localhost:6379"),
+    }
+
+    # TASKS_DEDUP environment variables (and their default value)
+    ENV_VARS_TASKS_DEDUP = {
+        "WINDOW": "MEGA_TASKS_DEDUP_WINDOW",
+        "BACKEND": "MEGA_TASKS_DEDUP_BACKEND",
+        "REDIS_URL": "MEGA_TASKS_DEDUP_REDIS_URL",
+        "PENDING_TIMEOUT": "MEGA_TASKS_DEDUP_PENDING_TIMEOUT",
+    }
+    TASKS_DEDUP_DEFAULTS = {
+        "WINDOW": "86400",  # Seconds a submitted task stays the answer to the same work, '0' disables it
+        "BACKEND": "memory",  # 'redis' to share the index between Mega-Web and the Mega-Workers
+        "REDIS_URL": getenv("CELERY_BROKER_URL", "redis://localhost:6379"),
+        "PENDING_TIMEOUT": "600",  # Seconds an indexed task may stay PENDING before being replaced
+    }
+
+    # TASKS_STREAM environment variables (and their default value)
+    ENV_VARS_TASKS_STREAM = {
+        "BACKEND": "MEGA_TASKS_STREAM_BACKEND",
+        "REDIS_URL": "MEGA_TASKS_STREAM_REDIS_URL",
+        "CHANNEL": "MEGA_TASKS_STREAM_CHANNEL",
+    }
+    TASKS_STREAM_DEFAULTS = {
+        "BACKEND": "none",  # 'redis' to publish the task states to Mega-Web instead of polling them
+        "REDIS_URL": getenv("CELERY_BROKER_URL", "redis://localhost:6379"),
+        "CHANNEL": "mega:tasks",
+    }
 
     def __init__(self, config_path=None) -> None:
         super().__init__()
@@ -63,6 +165,40 @@ class MegaConfigParser(ConfigParser):
             "COOKIES": envvars_cookies or config_cookies,
         }
 
+    def read_section_envvars(self, env_vars: dict[str, str]) -> dict[str, str]:
+        """Read section settings from environment variables"""
+        return {
+            key: getenv(env_var)
+            for key, env_var in env_vars.items()
+            if getenv(env_var) is not None
+        }
+
+    def read_section_config(self, section: str) -> dict[str, str]:
+        """Read section settings from config file"""
+        return dict(self[section].items()) if self.has_section(section) else {}
+
+    def get_section_config(
+        self, section: str, env_vars: dict[str, str], defaults: dict[str, str]
+    ) -> dict[str, str]:
+        """Deal between section environment variables, config file and default values"""
+        return {
+            **defaults,
+            **self.read_section_config(section),
+            **self.read_section_envvars(env_vars),
+        }
+
+    def get_connector_config(self) -> dict[str, str]:
+        """Deal between CONNECTOR environment variables, config file and default values"""
+        return self.get_section_config(
+            "CONNECTOR", self.ENV_VARS_CONNECTOR, self.CONNECTOR_DEFAULTS
+        )
+
+    def get_limiter_config(self) -> dict[str, str]:
+        """Deal between LIMITER environment variables, config file and default values"""
+        return self.get_section_config(
+            "LIMITER", self.ENV_VARS_LIMITER, self.LIMITER_DEFAULTS
+        )
+
     def export_api_envvars(self) -> dict:
         """Export API from environment variables"""
         raise NotImplementedError
@@ -83,10 +219,32 @@ class MegaConfigParser(ConfigParser):
         """Deal between environment variable and config API"""
         return self.read_api_envvars() or self.read_api_config()
 
-    def save_api_token(self, token) -> None:
-        if "^Token =" in "":
-            pass
-            # config.has_section('API')
-            # config.has_option('API', 'TOKEN')
-        else:
-            f"Token = {token}"
+    def get_token_cache_config(self) -> dict[str, str]:
+        """Deal between TOKEN_CACHE environment variables, config file and default values"""
+        return self.get_section_config(
+            "TOKEN_CACHE", self.ENV_VARS_TOKEN_CACHE, self.TOKEN_CACHE_DEFAULTS
+        )
+
+    def get_hosters_cache_config(self) -> dict[str, str]:
+        """Deal between HOSTERS_CACHE environment variables, config file and default values"""
+        return self.get_section_config(
+            "HOSTERS_CACHE", self.ENV_VARS_HOSTERS_CACHE, self.HOSTERS_CACHE_DEFAULTS
+        )
+
+    def get_links_cache_config(self) -> dict[str, str]:
+        """Deal between LINKS_CACHE environment variables, config file and default values"""
+        return self.get_section_config(
+            "LINKS_CACHE", self.ENV_VARS_LINKS_CACHE, self.LINKS_CACHE_DEFAULTS
+        )
+
+    def get_tasks_dedup_config(self) -> dict[str, str]:
+        """Deal between TASKS_DEDUP environment variables, config file and default values"""
+        return self.get_section_config(
+            "TASKS_DEDUP", self.ENV_VARS_TASKS_DEDUP, self.TASKS_DEDUP_DEFAULTS
+        )
+
+    def get_tasks_stream_config(self) -> dict[str, str]:
+        """Deal between TASKS_STREAM environment variables, config file and default values"""
+        return self.get_section_config(
+            "TASKS_STREAM", self.ENV_VARS_TASKS_STREAM, self.TASKS_STREAM_DEFAULTS
+        )
@@ -0,0 +1,45 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable
+
+
+def error_response(error: BaseException) -> dict[str, str]:
+    """Response of an item whose request failed, so that the other items go on"""
+    return {
+        "response_code": "CLIENT_ERROR",
+        "response_text": f"{ type(error).__name__ }: { error }",
+    }
+
+
+async def map_concurrently(
+    func: Callable[[Any], Awaitable[Any]],
+    items: Iterable[Any],
+    concurrency: int = 8,
+) -> AsyncIterator[tuple[Any, Any]]:
+    """
+    Call 'func' on each item with at most 'concurrency' calls in progress, the items being read lazily.
+    Yield the (item, result) pairs in completion order; a failed call yields its error response.
+    The calls in progress are cancelled if the iteration is left early.
+    """
+    items = iter(items)
+    pending = {}
+
+    try:
+        while True:
+            for item in items:
+                pending[asyncio.ensure_future(func(item))] = item
+
+                if len(pending) >= max(1, concurrency):
+                    break
+
+            if not pending:
+                return
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                item = pending.pop(task)
+                error = task.exception()
+                yield item, error_response(error) if error else task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,389 @@
+import asyncio
+from collections import OrderedDict
+from hashlib import sha1
+from json import dumps, loads
+from os import open as os_open, replace
+from pathlib import Path
+from time import monotonic, time
+from typing import Any, Awaitable, Callable, Optional
+
+from aiofiles import open as aiopen
+
+from megadebrid.utils.stores import RedisError, get_async_redis
+
+
+async def write_json(path: Path, data: Any, mode: int = 0o666) -> None:
+    """
+    Write atomically the data in the JSON file: readers never see a partial file.
+    The file is created with the permissions 'mode' (minus the umask), e.g. 0o600 for a secret.
+    """
+    tmp_path = path.with_name(f"{ path.name }.tmp")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A leftover temporary file would keep its permissions
+    tmp_path.unlink(missing_ok=True)
+
+    async with aiopen(
+        tmp_path, "w", opener=lambda file, flags: os_open(file, flags, mode)
+    ) as f:
+        await f.write(dumps(data))
+
+    replace(tmp_path, path)
+
+
+class TokenCache:
+    """
+    API token shared by all the processes of the same user (Mega-CLI runs, Mega-Workers tasks):
+    the file records the username, the token and its issue time. Without path, nothing is cached.
+    The token is only invalidated when Mega-Debrid answers 'TOKEN_ERROR'.
+    """
+
+    def __init__(self, username: str, path: Optional[Path] = None) -> None:
+        self.username = username
+        self.path = path
+
+    async def read(self) -> Optional[dict]:
+        """Return the cached entry of the user: {'token': ..., 'issued_at': ...}"""
+        if self.path is None or not self.path.exists():
+            return None
+
+        async with aiopen(self.path, "r") as f:
+            try:
+                entry = loads(await f.read())
+            except ValueError:
+                return None
+
+        return entry if entry.get("username") == self.username else None
+
+    async def load(self) -> Optional[str]:
+        """Return the cached token of the user, if any"""
+        entry = await self.read()
+        return entry.get("token") if entry else None
+
+    async def save(self, token: str) -> None:
+        """Write atomically the token and its issue time"""
+        if self.path is None:
+            return
+
+        entry = {"username": self.username, "token": token, "issued_at": time()}
+        # Readable by the user only: the token gives access to the account
+        await write_json(self.path, entry, mode=0o600)
+
+    async def invalidate(self, token: Optional[str]) -> None:
+        """Drop the cached token if it is still the rejected one (not renewed by another process)"""
+        if token and await self.load() == token:
+            self.path.unlink(missing_ok=True)
+
+
+class RedisTokenCache(TokenCache):
+    """API token cached in Redis, shared by all the hosts using the same Redis (e.g. Mega-Workers)"""
+
+    # Compare-and-delete: don't drop a token renewed meanwhile by another process
+    INVALIDATE_SCRIPT = """
+    if redis.call("HGET", KEYS[1], "token") == ARGV[1] then
+        return redis.call("DEL", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, username: str, url: str) -> None:
+        super().__init__(username=username)
+        self.url = url
+        self.key = f"mega:token:{ username }"
+
+    async def read(self) -> Optional[dict]:
+        try:
+            entry = await get_async_redis(self.url).hgetall(self.key)
+        except (RedisError, OSError):
+            return None
+
+        if not entry:
+            return None
+
+        return {
+            "token": entry[b"token"].decode(),
+            "issued_at": float(entry[b"issued_at"]),
+        }
+
+    async def save(self, token: str) -> None:
+        try:
+            await get_async_redis(self.url).hset(
+                self.key, mapping={"token": token, "issued_at": time()}
+            )
+        except (RedisError, OSError):
+            pass
+
+    async def invalidate(self, token: Optional[str]) -> None:
+        if not token:
+            return
+
+        try:
+            client = get_async_redis(self.url)
+            await client.register_script(self.INVALIDATE_SCRIPT)(
+                keys=[self.key], args=[token]
+            )
+        except (RedisError, OSError):
+            pass
+
+
+def create_token_cache(
+    username: str, backend: str = "file", path: str = "", url: str = ""
+) -> TokenCache:
+    """Return the token cache of the user with the wished backend: 'file', 'redis' or 'none'"""
+    if backend.lower() == "redis" and url:
+        return RedisTokenCache(username, url=url)
+
+    if backend.lower() == "file" and path:
+        return TokenCache(username, path=Path(path).expanduser())
+
+    return TokenCache(username)
+
+
+class HostersCache:
+    """
+    Hosters list shared by all the objects of the process, with an on-disk snapshot for the next processes.
+    Stale-while-revalidate: an expired list (or the snapshot) is served right away while a single
+    background task fetches the new one; the network is only awaited when nothing is cached yet.
+    """
+
+    # Caches shared by all the objects of the process, per snapshot path
+    _shared = {}
+
+    def __init__(self, ttl: float, path: Optional[Path] = None) -> None:
+        self.ttl = ttl
+        self.path = path
+        self.response = None
+        self.fetched_at = 0.0
+        self.refresh_task = None
+
+    @classmethod
+    def shared(cls, ttl: float, path: Optional[Path] = None) -> "HostersCache":
+        """Return the cache shared in the process for this snapshot, create it if required"""
+        cache = cls._shared.get(path)
+
+        if cache is None or cache.ttl != ttl:
+            cache = cls._shared[path] = cls(ttl=ttl, path=path)
+
+        return cache
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.response is not None and time() - self.fetched_at < self.ttl
+
+    async def read(self) -> None:
+        """Load the on-disk snapshot, if any"""
+        if self.path is None or not self.path.exists():
+            return
+
+        async with aiopen(self.path, "r") as f:
+            try:
+                snapshot = loads(await f.read())
+            except ValueError:
+                return
+
+        self.response = snapshot.get("response")
+        self.fetched_at = snapshot.get("fetched_at", 0.0)
+
+    async def refresh(self, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        """Fetch the hosters list, keep it and write the snapshot if Mega-Debrid answered 'ok'"""
+        response = await fetch()
+
+        if response.get("response_code") == "ok":
+            self.response, self.fetched_at = response, time()
+
+            if self.path is not None:
+                await write_json(
+                    self.path, {"fetched_at": self.fetched_at, "response": response}
+                )
+
+        return response
+
+    def start_refresh(self, fetch: Callable[[], Awaitable[dict]]) -> asyncio.Task:
+        """Return the running refresh task, start one if required (single-flight)"""
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.ensure_future(self.refresh(fetch))
+            # A failed background refresh keeps serving the stale list: mark its error as retrieved
+            self.refresh_task.add_done_callback(
+                lambda task: task.cancelled() or task.exception()
+            )
+
+        return self.refresh_task
+
+    async def get(self, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        """Return the cached hosters list, refresh it in background once expired"""
+        if self.ttl <= 0:
+            return await fetch()
+
+        if self.response is None:
+            await self.read()
+
+        if self.response is None:
+            return await self.start_refresh(fetch)
+
+        if not self.is_fresh:
+            self.start_refresh(fetch)
+
+        return self.response
+
+    async def wait_refresh(self) -> None:
+        """Wait for the background refresh (e.g. before closing its session), ignore its failure"""
+        if self.refresh_task is not None and not self.refresh_task.done():
+            await asyncio.gather(self.refresh_task, return_exceptions=True)
+
+
+def create_hosters_cache(ttl: float, path: str = "") -> HostersCache:
+    """Return the hosters cache shared in the process, with an on-disk snapshot if a path is given"""
+    return HostersCache.shared(ttl, path=Path(path).expanduser() if path else None)
+
+
+class LinksCache:
+    """
+    Responses of getLink ({debridLink, filename}) shared by all the objects of the process, keyed by
+    the link and the hash of its password: a link unrestricted again within 'ttl' seconds (retried task,
+    link submitted twice) costs no request nor quota. The least recently used entries beyond 'size' are evicted.
+    """
+
+    # Caches shared by all the objects of the process, per backend
+    _shared = {}
+
+    def __init__(self, ttl: float, size: int) -> None:
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()  # key: (expiration time, response)
+        self.stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def shared(cls, ttl: float, size: int) -> "LinksCache":
+        """Return the in-memory cache shared in the process, create it if required"""
+        cache = cls._shared.get("memory")
+
+        if type(cache) is not cls or (cache.ttl, cache.size) != (ttl, size):
+            cache = cls._shared["memory"] = cls(ttl=ttl, size=size)
+
+        return cache
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.size > 0
+
+    @staticmethod
+    def make_key(link: str, password_hash: str) -> str:
+        """Key of the link: the password only appears hashed"""
+        return sha1(f"{ link }\n{ password_hash }".encode()).hexdigest()
+
+    def record(self, response: Optional[dict]) -> Optional[dict]:
+        """Update the hits and misses counters"""
+        self.stats["hits" if response else "misses"] += 1
+        return response
+
+    def get_local(self, key: str) -> Optional[dict]:
+        """Return the response cached in the process if not expired"""
+        entry = self.entries.get(key)
+
+        if entry is None:
+            return None
+
+        if entry[0] <= monotonic():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set_local(self, key: str, response: dict) -> None:
+        """Cache the response in the process, evict the least recently used ones"""
+        self.entries[key] = (monotonic() + self.ttl, response)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    async def get(self, link: str, password_hash: str) -> Optional[dict]:
+        """Return the cached response of the link, if any"""
+        if not self.enabled:
+            return None
+
+        return self.record(self.get_local(self.make_key(link, password_hash)))
+
+    async def set(self, link: str, password_hash: str, response: dict) -> None:
+        """Cache the response of the link if Mega-Debrid unrestricted it"""
+        if self.enabled and response.get("response_code") == "ok":
+            self.set_local(self.make_key(link, password_hash), response)
+
+    async def invalidate(self, link: str, password_hash: str) -> None:
+        """Drop the cached response of the link (e.g. its download failed)"""
+        self.entries.pop(self.make_key(link, password_hash), None)
+
+
+class RedisLinksCache(LinksCache):
+    """
+    getLink responses cached in Redis, shared by all the Mega-Workers: the entries expire with the
+    Redis TTL (the eviction depends on the Redis 'maxmemory-policy').
+    Fall back on the in-memory cache of the process when Redis isn't reachable.
+    """
+
+    def __init__(self, ttl: float, size: int, url: str) -> None:
+        super().__init__(ttl=ttl, size=size)
+        self.url = url
+
+    @classmethod
+    def shared(cls, ttl: float, size: int, url: str = "") -> "RedisLinksCache":
+        """Return the Redis cache shared in the process, create it if required"""
+        cache = cls._shared.get("redis")
+
+        if type(cache) is not cls or (cache.ttl, cache.size, cache.url) != (
+            ttl,
+            size,
+            url,
+        ):
+            cache = cls._shared["redis"] = cls(ttl=ttl, size=size, url=url)
+
+        return cache
+
+    @staticmethod
+    def make_redis_key(key: str) -> str:
+        return f"mega:link:{ key }"
+
+    async def get(self, link: str, password_hash: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+
+        key = self.make_key(link, password_hash)
+
+        try:
+            entry = await get_async_redis(self.url).get(self.make_redis_key(key))
+        except (RedisError, OSError):
+            return self.record(self.get_local(key))
+
+        return self.record(loads(entry) if entry else None)
+
+    async def set(self, link: str, password_hash: str, response: dict) -> None:
+        if not self.enabled or response.get("response_code") != "ok":
+            return
+
+        key = self.make_key(link, password_hash)
+
+        try:
+            await get_async_redis(self.url).set(
+                self.make_redis_key(key), dumps(response), ex=max(1, int(self.ttl))
+            )
+        except (RedisError, OSError):
+            self.set_local(key, response)
+
+    async def invalidate(self, link: str, password_hash: str) -> None:
+        key = self.make_key(link, password_hash)
+        await super().invalidate(link, password_hash)
+
+        try:
+            await get_async_redis(self.url).delete(self.make_redis_key(key))
+        except (RedisError, OSError):
+            pass
+
+
+def create_links_cache(
+    ttl: float, size: int, backend: str = "memory", url: str = ""
+) -> LinksCache:
+    """Return the links cache shared in the process with the wished backend: 'memory' or 'redis'"""
+    if backend.lower() == "redis" and url:
+        return RedisLinksCache.shared(ttl, size=size, url=url)
+
+    return LinksCache.shared(ttl, size=size)
@@ -0,0 +1,177 @@
+import asyncio
+from json import dumps, loads
+from os import fsync, replace
+from pathlib import Path
+from time import monotonic
+from typing import Optional
+
+from aiofiles import open as aiopen
+
+
+class Checkpoint:
+    """
+    Partial download: the bytes are written in '<file>.part' while the sidecar '<file>.part.json'
+    records the remote file identity (URL, ETag/Last-Modified, size) and the completed byte ranges.
+    A byte range must only be added once synced to the disk: the sidecar never claims lost bytes.
+    """
+
+    SAVE_INTERVAL = 1.0  # Minimum seconds between two writes of the sidecar
+
+    def __init__(
+        self,
+        path: Path,
+        url: str,
+        total: int = 0,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        ranges: Optional[list] = None,
+    ) -> None:
+        self.path = path
+        self.url = url
+        self.total = total
+        self.etag = etag
+        self.last_modified = last_modified
+        self.ranges = [tuple(r) for r in ranges or []]
+        self.saved_at = 0.0
+        self.lock = asyncio.Lock()  # The segments of the file save the same sidecar
+
+    @staticmethod
+    def part_path_of(path: Path) -> Path:
+        return path.with_name(f"{ path.name }.part")
+
+    @staticmethod
+    def sidecar_path_of(path: Path) -> Path:
+        return path.with_name(f"{ path.name }.part.json")
+
+    @property
+    def part_path(self) -> Path:
+        return self.part_path_of(self.path)
+
+    @property
+    def sidecar_path(self) -> Path:
+        return self.sidecar_path_of(self.path)
+
+    @property
+    def completed(self) -> int:
+        """Number of bytes already written"""
+        return sum(end - start + 1 for start, end in self.ranges)
+
+    @classmethod
+    async def load(cls, path: Path) -> Optional["Checkpoint"]:
+        """Return the checkpoint of a previous partial download of the file, if any"""
+        sidecar_path = cls.sidecar_path_of(path)
+
+        if not sidecar_path.exists() or not cls.part_path_of(path).exists():
+            return None
+
+        async with aiopen(sidecar_path, "r") as f:
+            try:
+                state = loads(await f.read())
+            except ValueError:
+                return None
+
+        return cls(path=path, **state)
+
+    def matches(
+        self,
+        total: int,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> bool:
+        """
+        Verify the remote file is still the one partially downloaded.
+        The URL isn't compared: an unrestricted link changes each time it is debrided.
+        """
+        if total != self.total:
+            return False
+        if etag and self.etag:
+            return etag == self.etag
+        if last_modified and self.last_modified:
+            return last_modified == self.last_modified
+        return True
+
+    def add(self, start: int, end: int) -> None:
+        """Mark the byte range as written (inclusive, as the HTTP 'Range' header)"""
+        merged = []
+
+        for range_start, range_end in sorted(self.ranges + [(start, end)]):
+            if merged and range_start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_end))
+            else:
+                merged.append((range_start, range_end))
+
+        self.ranges = merged
+
+    def missing(self) -> list[tuple[int, int]]:
+        """Return the byte ranges which haven't been written yet"""
+        missing, offset = [], 0
+
+        for start, end in self.ranges:
+            if start > offset:
+                missing.append((offset, start - 1))
+            offset = max(offset, end + 1)
+
+        if offset < self.total:
+            missing.append((offset, self.total - 1))
+
+        return missing
+
+    async def allocate(self) -> None:
+        """Create the '.part' file with the final size: each range will be written in place"""
+        async with aiopen(self.part_path, "wb") as f:
+            await f.truncate(self.total)
+
+        await self.save(force=True)
+
+    def is_due(self) -> bool:
+        """Whether the sidecar should be written again (at most once per SAVE_INTERVAL)"""
+        return (
+            not self.lock.locked() and monotonic() - self.saved_at >= self.SAVE_INTERVAL
+        )
+
+    @staticmethod
+    async def sync(part_file) -> None:
+        """Flush the bytes written in the '.part' file to the disk, before recording their range"""
+        await part_file.flush()
+        await asyncio.to_thread(fsync, part_file.fileno())
+
+    async def save(self, force: bool = False) -> None:
+        """Write atomically the sidecar, at most once per SAVE_INTERVAL unless forced"""
+        if not force and not self.is_due():
+            return
+
+        async with self.lock:
+            # Before any await: the other segments skip this interval
+            self.saved_at = monotonic()
+            state = {
+                "url": self.url,
+                "total": self.total,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "ranges": self.ranges,
+            }
+            tmp_path = self.sidecar_path.with_name(f"{ self.sidecar_path.name }.tmp")
+
+            async with aiopen(tmp_path, "w") as f:
+                await f.write(dumps(state))
+
+            replace(tmp_path, self.sidecar_path)
+
+    async def complete(self) -> Path:
+        """
+        Rename atomically the '.part' file to its final name and drop the sidecar.
+        Raise if byte ranges are missing: the sidecar is kept so the download can be resumed.
+        """
+        missing = self.missing()
+
+        if missing:
+            await self.save(force=True)
+            raise Exception(
+                f"Could not complete '{ self.path }': "
+                f"{ sum(end - start + 1 for start, end in missing) } bytes missing "
+                f"in { len(missing) } byte ranges."
+            )
+
+        replace(self.part_path, self.path)
+        self.sidecar_path.unlink(missing_ok=True)
+        return self.path
@@ -3,16 +3,19 @@ from inspect import signature
 
 
 def renew_obsolete_token(method):
-    """Catch obsolete token messe in response, than re-authenticate and re-execute function"""
+    """
+    Catch obsolete token messe in response, than re-authenticate and re-execute function.
+    The renewal is single-flight: concurrent requests failing with the same token share one login.
+    """
 
     @wraps(method)
     async def wrapper_func(self, *method_args, **method_kwargs):
+        stale_token = self.api_token
         response = await method(self, *method_args, **method_kwargs)
 
         # {"response_code": "TOKEN_ERROR", "response_text": "Token error, please log-in"}
         if response.get("response_code") == "TOKEN_ERROR":
-            self.api_token = None
-            await self.get_token(is_renew=True)
+            await self.renew_token(stale_token)
             response = await method(self, *method_args, **method_kwargs)
 
         return response
@@ -21,3 +24,24 @@ def renew_obsolete_token(method):
     wrapper_func.__signature__ = signature(method)
 
     return wrapper_func
+
+
+def rate_limited(*limiters: str):
+    """Wait for a token of each limiter (attribute name of the object) before executing the request"""
+
+    limiters = limiters or ("limiter",)
+
+    def decorator(method):
+        @wraps(method)
+        async def wrapper_func(self, *method_args, **method_kwargs):
+            for limiter in limiters:
+                await getattr(self, limiter).acquire()
+
+            return await method(self, *method_args, **method_kwargs)
+
+        # Make wrapped signature available
+        wrapper_func.__signature__ = signature(method)
+
+        return wrapper_func
+
+    return decorator
@@ -0,0 +1,93 @@
+import asyncio
+import re
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import html as lxml_html
+except ImportError:  # lxml only speeds up the fallback parsing
+    lxml_html = None
+
+
+DEBRID_ID = re.compile(r"^debrid_(\d+)$")
+
+
+class DebridCodesExtractor:
+    """
+    Incremental scanner of the 'xhr_debrid' HTML: read the 'data-code' of the 'debrid_<N>' elements
+    while the body is received, without building a document tree.
+    Only the unfinished tag at the end of a chunk is kept until the next one.
+    """
+
+    # Opening tag with the id 'debrid_<N>', whatever the order of its attributes
+    # (the whitespace before 'id' excludes the attributes such as 'data-id')
+    DEBRID_TAG = re.compile(rb"""<[^<>]*\sid\s*=\s*["']?debrid_(\d+)\b[^<>]*>""")
+    DATA_CODE = re.compile(rb"""\bdata-code\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+
+    def __init__(self) -> None:
+        self.buffer = b""
+        self.codes = {}  # N: data-code
+
+    def feed(self, chunk: bytes) -> None:
+        """Scan the received chunk of the body"""
+        self.buffer += chunk
+        end = 0
+
+        for match in self.DEBRID_TAG.finditer(self.buffer):
+            code = self.DATA_CODE.search(match.group(0))
+
+            if code:
+                value = next(group for group in code.groups() if group is not None)
+                self.codes[int(match.group(1))] = value.decode()
+
+            end = match.end()
+
+        # Keep the unfinished tag, if any, for the next chunk
+        rest = self.buffer[end:]
+        start = rest.rfind(b"<")
+        self.buffer = rest[start:] if start != -1 and b">" not in rest[start:] else b""
+
+    def get_codes(self) -> list[str]:
+        """Return the codes in the order of the submitted links"""
+        return [self.codes[index] for index in sorted(self.codes)]
+
+
+def extract_debrid_codes(html_body: bytes) -> list[str]:
+    """Return the codes of the 'debrid_<N>' elements of the whole 'xhr_debrid' HTML"""
+    extractor = DebridCodesExtractor()
+    extractor.feed(html_body)
+    return extractor.get_codes()
+
+
+def parse_debrid_codes(html_body: bytes) -> list[str]:
+    """Fallback: parse the document tree (lxml if installed, else BeautifulSoup) to find the codes"""
+    if not html_body.strip():
+        return []
+
+    if lxml_html is not None:
+        elements = [
+            (element.get("id"), element.get("data-code"))
+            for element in lxml_html.fromstring(html_body).xpath(
+                "//*[starts-with(@id, 'debrid_') and @data-code]"
+            )
+        ]
+    else:
+        elements = [
+            (element["id"], element["data-code"])
+            for element in BeautifulSoup(html_body, "html.parser").find_all(
+                id=DEBRID_ID, attrs={"data-code": True}
+            )
+        ]
+
+    codes = {
+        int(match.group(1)): code
+        for element_id, code in elements
+        if (match := DEBRID_ID.match(element_id))
+    }
+    return [codes[index] for index in sorted(codes)]
+
+
+async def parse_debrid_codes_in_thread(html_body: bytes) -> list[str]:
+    """Parse the document tree out of the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        None, parse_debrid_codes, html_body
+    )
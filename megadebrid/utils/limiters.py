@@ -0,0 +1,182 @@
+import asyncio
+from time import monotonic
+from typing import Optional
+
+from megadebrid.utils.stores import RedisError, get_async_redis
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket: allow 'burst' calls at once, then 'rate' calls per second.
+    Each call reserves its token immediately and sleeps only the time required to get it,
+    so the waiting calls are served in order without polling.
+    """
+
+    # Buckets shared by all the objects of the process: the Mega-Debrid limits are per IP address
+    _shared = {}
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = monotonic()
+        self.stats = {"calls": 0, "delayed": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    @classmethod
+    def shared(cls, name: str, rate: float, burst: int) -> "TokenBucket":
+        """Return the bucket shared in the process under this name, create it if required"""
+        bucket = cls._shared.get(name)
+
+        if type(bucket) is not cls or (bucket.rate, bucket.burst) != (rate, burst):
+            bucket = cls._shared[name] = cls(rate=rate, burst=burst)
+
+        return bucket
+
+    def reserve(self) -> float:
+        """Take a token and return the seconds to wait before it is really available"""
+        if self.rate <= 0:
+            return 0.0
+
+        now = monotonic()
+        self.tokens = min(
+            float(self.burst), self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        self.tokens -= 1
+
+        return max(0.0, -self.tokens / self.rate)
+
+    def record(self, wait: float) -> None:
+        """Update the counters of the waiting time of the calls"""
+        self.stats["calls"] += 1
+        self.stats["total_wait"] += wait
+        self.stats["max_wait"] = max(self.stats["max_wait"], wait)
+
+        if wait:
+            self.stats["delayed"] += 1
+
+    async def acquire(self) -> float:
+        """Wait until a token is available, return the waited seconds"""
+        wait = self.reserve()
+        self.record(wait)
+
+        if wait:
+            await asyncio.sleep(wait)
+
+        return wait
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    Token bucket stored in Redis and shared by all the processes (e.g. Mega-Workers) using the same key:
+    the tokens are reserved by an atomic Lua script, so the combined rate stays under the limit.
+    Fall back on an in-memory bucket of the process when Redis isn't reachable: every process uses it,
+    so its 'fallback_rate' (without burst) must be the share of the limit of one process.
+    """
+
+    RETRY_INTERVAL = 30.0  # Seconds using the in-memory bucket before retrying Redis
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local time = redis.call("TIME")
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local state = redis.call("HMGET", KEYS[1], "tokens", "updated_at")
+    local tokens = tonumber(state[1]) or burst
+    local updated_at = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate) - 1
+    redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated_at", tostring(now))
+    redis.call("EXPIRE", KEYS[1], math.ceil((burst - tokens) / rate) + 1)
+    if tokens < 0 then
+        return tostring(-tokens / rate)
+    end
+    return "0"
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        url: str,
+        key: Optional[str] = None,
+        fallback_rate: Optional[float] = None,
+    ) -> None:
+        super().__init__(rate=rate, burst=burst)
+        self.url = url
+        self.key = key or "mega:limiter"
+        self.retry_at = 0.0
+        self.fallback = TokenBucket(
+            rate=rate if fallback_rate is None else fallback_rate, burst=1
+        )
+
+    @classmethod
+    def shared(
+        cls,
+        name: str,
+        rate: float,
+        burst: int,
+        url: str = "",
+        fallback_rate: Optional[float] = None,
+    ) -> "RedisTokenBucket":
+        """Return the bucket shared in the process under this name, create it if required"""
+        bucket = cls._shared.get(name)
+        fallback_rate = rate if fallback_rate is None else fallback_rate
+
+        if type(bucket) is not cls or (
+            bucket.rate,
+            bucket.burst,
+            bucket.url,
+            bucket.fallback.rate,
+        ) != (rate, burst, url, fallback_rate):
+            bucket = cls._shared[name] = cls(
+                rate=rate,
+                burst=burst,
+                url=url,
+                key=f"mega:limiter:{ name }",
+                fallback_rate=fallback_rate,
+            )
+
+        return bucket
+
+    async def reserve_shared(self) -> float:
+        """Take a token in Redis and return the seconds to wait before it is really available"""
+        client = get_async_redis(self.url)
+        script = client.register_script(self.SCRIPT)
+        return float(await script(keys=[self.key], args=[self.rate, self.burst]))
+
+    async def acquire(self) -> float:
+        """Wait until a token is available (in Redis or locally as fallback), return the waited seconds"""
+        if self.rate <= 0:
+            wait = 0.0
+        elif monotonic() < self.retry_at:
+            wait = self.fallback.reserve()
+        else:
+            try:
+                wait = await self.reserve_shared()
+            except (RedisError, OSError):
+                self.retry_at = monotonic() + self.RETRY_INTERVAL
+                wait = self.fallback.reserve()
+
+        self.record(wait)
+
+        if wait:
+            await asyncio.sleep(wait)
+
+        return wait
+
+
+def create_bucket(
+    name: str,
+    rate: float,
+    burst: int,
+    backend: str = "memory",
+    url: str = "",
+    fallback_rate: Optional[float] = None,
+) -> TokenBucket:
+    """Return the bucket shared in the process with the wished backend: 'memory' or 'redis'"""
+    if backend.lower() == "redis" and url:
+        return RedisTokenBucket.shared(
+            name, rate=rate, burst=burst, url=url, fallback_rate=fallback_rate
+        )
+
+    return TokenBucket.shared(name, rate=rate, burst=burst)
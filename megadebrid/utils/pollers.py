@@ -0,0 +1,225 @@
+import asyncio
+from time import monotonic
+from typing import Any, AsyncIterator, Optional
+from weakref import WeakKeyDictionary
+
+
+class PollingSchedule:
+    """
+    Adaptive interval between two status requests of a torrent: estimate the time to completion
+    from the progress made since the previous samples (or from the speed and size fields at first),
+    wait half of it so the interval tightens as completion nears, and back off while it is unknown
+    (e.g. pending torrent). The interval always stays between 'min_interval' and 'max_interval'.
+    """
+
+    BACKOFF = 2.0  # Growth factor of the interval while the time to completion can't be estimated
+
+    def __init__(self, min_interval: float = 3, max_interval: float = 60) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+        self.sample = None  # (time, progress) of the last progress change
+
+    @staticmethod
+    def to_float(value: Any) -> float:
+        """Status fields are strings which may be empty or None"""
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def estimate(self, status: dict) -> Optional[float]:
+        """Return the estimated seconds before the torrent is complete, None if unknown"""
+        now = monotonic()
+        progress = self.to_float(status.get("progress"))
+        # 'speed' is in MB/s and 'size' in bytes
+        speed = self.to_float(status.get("speed")) * 1024 * 1024
+        size = self.to_float(status.get("size"))
+        eta = None
+
+        if self.sample and progress > self.sample[1] and now > self.sample[0]:
+            eta = (
+                (100 - progress) * (now - self.sample[0]) / (progress - self.sample[1])
+            )
+        elif speed > 0 and size > 0:
+            eta = size * (100 - progress) / 100 / speed
+
+        # Keep the oldest sample while the progress stalls: the estimated rate includes the stall.
+        # No sample before the first progress: the time spent pending isn't conversion time
+        if progress > 0 and (self.sample is None or progress != self.sample[1]):
+            self.sample = (now, progress)
+
+        return eta
+
+    def next_interval(self, status: dict) -> float:
+        """Return the seconds to wait before requesting again the status"""
+        eta = self.estimate(status)
+        interval = self.interval * self.BACKOFF if eta is None else eta / 2
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+        return self.interval
+
+
+class Waiter:
+    """Torrent hash watched by a coroutine, with the client to use, its schedule and its queue of statuses"""
+
+    def __init__(
+        self, client: Any, torrent_hash: str, schedule: PollingSchedule
+    ) -> None:
+        self.client = client
+        self.torrent_hash = torrent_hash.lower()
+        self.schedule = schedule
+        self.due_at = monotonic()
+        self.queue = asyncio.Queue()
+
+
+class TorrentsPoller:
+    """
+    Torrents status poller shared by every waiter of the event loop: each cycle serves the waiters
+    due at the same time, with one getTorrent request per distinct hash sent concurrently.
+    getTorrents isn't used: its entries carry no hash to match them with the waiters.
+    """
+
+    # One poller per event loop: the asyncio objects can't be shared between loops
+    _shared = WeakKeyDictionary()
+    COALESCE = 1.0  # Waiters due within this second after the earliest one are served by the same cycle
+
+    def __init__(self) -> None:
+        self.waiters: list[Waiter] = []
+        self.task = None
+        self.wakeup = None
+        self.cycles = 0
+
+    @classmethod
+    def shared(cls) -> "TorrentsPoller":
+        """Return the poller of the current event loop, create it if required"""
+        loop = asyncio.get_event_loop()
+
+        if loop not in cls._shared:
+            cls._shared[loop] = cls()
+
+        return cls._shared[loop]
+
+    @staticmethod
+    def is_complete(json_rep: dict) -> bool:
+        return json_rep["status"]["status"] == "complete"
+
+    async def watch(
+        self,
+        client: Any,
+        torrent_hash: str,
+        schedule: Optional[PollingSchedule] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Yield the status responses of the torrent at each due cycle until it is complete
+
+        Args:
+            client (MegaDebridApi): API object used to query the statuses.
+            torrent_hash (str): Torrent hash to monitor.
+            schedule (PollingSchedule, optional): Intervals between the statuses. Defaults to PollingSchedule().
+
+        Yields:
+            dict: Torrent status response, as returned by getTorrent.
+        """
+        waiter = Waiter(client, torrent_hash, schedule or PollingSchedule())
+        self.waiters.append(waiter)
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        elif self.wakeup is not None:
+            # The new waiter is due now: don't let it wait the end of the current sleep
+            self.wakeup.cancel()
+
+        try:
+            while True:
+                json_rep = await waiter.queue.get()
+
+                try:
+                    if isinstance(json_rep, BaseException):
+                        raise json_rep
+
+                    yield json_rep
+                    waiter.due_at = monotonic() + waiter.schedule.next_interval(
+                        json_rep["status"]
+                    )
+                finally:
+                    # Acknowledge the status: the poller waits for it before the next cycle
+                    waiter.queue.task_done()
+
+                if self.is_complete(json_rep):
+                    return
+        finally:
+            self.waiters.remove(waiter)
+
+            # Acknowledge the statuses never consumed (e.g. waiter cancelled) to not block the poller
+            while not waiter.queue.empty():
+                waiter.queue.get_nowait()
+                waiter.queue.task_done()
+
+    async def poll(self, waiters: list[Waiter]) -> None:
+        """Send the requests of one cycle and dispatch the statuses to the waiters"""
+        waiters_by_hash: dict[str, list[Waiter]] = {}
+
+        for waiter in waiters:
+            waiters_by_hash.setdefault(waiter.torrent_hash, []).append(waiter)
+
+        async def get_status(torrent_hash: str, hash_waiters: list[Waiter]) -> dict:
+            # Any waiter whose client is still open can query the status for all of them
+            client = next(
+                (waiter.client for waiter in hash_waiters if waiter.client.session),
+                hash_waiters[-1].client,
+            )
+            return await client.get_torrent_status(torrent_hash)
+
+        # The failure of one request is only given to the waiters of its torrent
+        responses = await asyncio.gather(
+            *(
+                get_status(torrent_hash, hash_waiters)
+                for torrent_hash, hash_waiters in waiters_by_hash.items()
+            ),
+            return_exceptions=True,
+        )
+
+        for hash_waiters, json_rep in zip(waiters_by_hash.values(), responses):
+            for waiter in hash_waiters:
+                waiter.queue.put_nowait(json_rep)
+
+    async def sleep(self, delay: float) -> bool:
+        """Sleep until the delay is elapsed or a new waiter cancels the sleep, return False if so"""
+        self.wakeup = wakeup = asyncio.ensure_future(asyncio.sleep(delay))
+
+        try:
+            await asyncio.wait([wakeup])
+        finally:
+            wakeup.cancel()
+            self.wakeup = None
+
+        return not wakeup.cancelled()
+
+    async def run(self) -> None:
+        """Poll while there are waiters: each cycle serves the waiters due at the earliest time"""
+        while self.waiters:
+            due_at = min(waiter.due_at for waiter in self.waiters)
+            delay = due_at - monotonic()
+
+            if delay > 0 and not await self.sleep(delay):
+                continue  # Woken up by a new waiter
+
+            waiters = [
+                waiter
+                for waiter in self.waiters
+                if waiter.due_at <= due_at + self.COALESCE
+            ]
+
+            if not waiters:
+                continue
+
+            try:
+                await self.poll(waiters)
+            except Exception as error:
+                for waiter in waiters:
+                    if waiter.queue.empty():
+                        waiter.queue.put_nowait(error)
+
+            self.cycles += 1
+            # Let the waiters consume their status (and leave if complete) before the next cycle
+            await asyncio.gather(*(waiter.queue.join() for waiter in waiters))
@@ -1,4 +1,57 @@
+import sys
+from time import monotonic
+from typing import Callable, Optional, TextIO
+
+# Receiver of the progress events of a task
+ProgressCallback = Callable[[dict], None]
+
+
 class Progress:
+    """
+    Terminal renderer of a download, called for every chunk: it redraws at most once per 'interval' seconds
+    (and at completion) whatever the chunk size, and between two redraws costs a clock read only.
+    It shows the exact bytes done, the instantaneous and smoothed rates and the estimated time left.
+    When the stream isn't a terminal (logs, pipes), a plain line is written every 'log_interval' seconds instead.
+    """
+
+    SMOOTHING = 0.3  # Weight of the last instantaneous rate in the smoothed rate
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        log_interval: float = 10.0,
+        stream: Optional[TextIO] = None,
+        size: int = 40,
+    ) -> None:
+        self.interval = interval
+        self.log_interval = log_interval
+        self.stream = stream
+        self.size = size
+        self.filled = "█" * size
+        self.empty = "." * size
+        self.reset()
+
+    def reset(self, total: int = 0) -> None:
+        """Start the progress of a new download"""
+        self.total = total
+        self.drawn_at = None
+        self.sampled = 0
+        self.sampled_at = monotonic()
+        self.rate = 0.0
+        self.smoothed = 0.0
+        self.pending = False  # A terminal line is drawn without its end of line
+        # Overwrite the terminal line often, but write the logs rarely
+        self.tty = self.is_tty
+        self.redraw = self.interval if self.tty else self.log_interval
+
+    @property
+    def output(self) -> TextIO:
+        return self.stream or sys.stdout
+
+    @property
+    def is_tty(self) -> bool:
+        return getattr(self.output, "isatty", lambda: False)()
+
     @staticmethod
     def convert_bytes(size):
         for x in ["bytes", "kB", "MB", "GB", "TB"]:
@@ -9,31 +62,182 @@ class Progress:
         return size
 
     @staticmethod
-    def bar(progress: int, total: int, char: str = "█", size: int = 60) -> None:
-        x = int(size * progress / total)
-        print(
-            f"Downloading [{ char * x }{ ( '.' * ( size - x )) }] "
-            f"{ progress }/{ total }",
-            flush=True,
-            end="\r" if size != total else "\n",
+    def convert_seconds(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return (
+            f"{hours}:{minutes:02d}:{seconds:02d}"
+            if hours
+            else f"{minutes:02d}:{seconds:02d}"
         )
 
-    @staticmethod
-    def size(progress: int, total: int):
-        print(
-            f"{ progress }/{ total }",
-            flush=True,
-            end="\r" if progress != total else "\n",
+    def sample(self, progress: int, now: float) -> None:
+        """Update the instantaneous rate since the previous redraw and the smoothed (exponential average) one"""
+        elapsed = now - self.sampled_at
+
+        if elapsed > 0:
+            self.rate = (progress - self.sampled) / elapsed
+            self.smoothed = (
+                self.rate
+                if not self.smoothed
+                else self.SMOOTHING * self.rate + (1 - self.SMOOTHING) * self.smoothed
+            )
+
+        self.sampled = progress
+        self.sampled_at = now
+
+    def line(
+        self, progress: int, total: int, choice: str = "", to_convert: bool = False
+    ) -> str:
+        """Text of the progress: bar (if wished and the size is known), bytes done, rates and time left"""
+        fields = []
+
+        if total:
+            if choice.lower() == "bar":
+                x = self.size * min(progress, total) // total
+                fields.append(f"Downloading [{ self.filled[:x] }{ self.empty[x:] }]")
+
+            fields.append(f"{100 * progress / total:5.1f}%")
+
+        if to_convert:
+            fields.append(
+                f"{ self.convert_bytes(progress) }/{ self.convert_bytes(total) }"
+                if total
+                else self.convert_bytes(progress)
+            )
+        else:
+            fields.append(f"{ progress }/{ total }" if total else str(progress))
+
+        fields.append(
+            f"{ self.convert_bytes(self.rate) }/s (avg { self.convert_bytes(self.smoothed) }/s)"
         )
 
+        if total and progress < total and self.smoothed > 0:
+            fields.append(
+                f"ETA { self.convert_seconds((total - progress) / self.smoothed) }"
+            )
+
+        return "  ".join(fields)
+
     def render(
         self, progress: int, total: int, choice: str = "", to_convert: bool = False
     ) -> None:
-        if to_convert:
-            progress = self.convert_bytes(progress)
-            total = self.convert_bytes(total)
+        """Redraw the progress if the interval is elapsed, or the download complete"""
+        now = monotonic()
+        complete = 0 < total <= progress
 
-        if choice.lower() == "bar":
-            self.bar(progress, total)
+        if total != self.total or progress < self.sampled:
+            # Progress of another download: the bytes already there (resumed) aren't in the rate
+            self.reset(total)
+            self.sampled = progress
+        elif (
+            self.drawn_at is not None
+            and not complete
+            and now - self.drawn_at < self.redraw
+        ):
+            return
+
+        self.sample(progress, now)
+        self.drawn_at = now
+        line = self.line(progress, total, choice=choice, to_convert=to_convert)
+
+        if self.tty:
+            # Overwrite the previous line, ended once complete
+            self.output.write(f"\r{ line }\x1b[K" + ("\n" if complete else ""))
+            self.pending = not complete
         else:
-            self.size(progress, total)
+            self.output.write(f"{ line }\n")
+
+        self.output.flush()
+
+    def finish(self) -> None:
+        """End the line of a download whose size was unknown"""
+        if self.pending:
+            self.output.write("\n")
+            self.output.flush()
+
+        self.reset()
+
+
+class ProgressTracker:
+    """
+    Progress of one phase of a task (e.g. 'converting', 'downloading'), sent to the callback as events:
+    {"phase": name, "done": bytes done, "total": bytes expected (0 if unknown), "rate": bytes per second}.
+    The first event announces the phase. Without callback, tracking the progress costs nothing.
+    """
+
+    def __init__(
+        self,
+        callback: Optional[ProgressCallback],
+        phase: str,
+        total: int = 0,
+        done: int = 0,
+    ) -> None:
+        self.callback = callback
+        self.phase = phase
+        self.total = total
+        self.done = done
+        self.initial = done  # Resumed bytes don't count in the rate
+        self.started = monotonic()
+        self.emit()
+
+    def advance(self, size: int) -> None:
+        """Count the bytes done since the previous event"""
+        self.done += size
+        self.emit()
+
+    def update(self, done: int, total: int, rate: Optional[float] = None) -> None:
+        """Set the progress as reported by a third party (e.g. torrent status), with its rate if known"""
+        self.done = done
+        self.total = total
+        self.emit(rate)
+
+    def emit(self, rate: Optional[float] = None) -> None:
+        if self.callback is None:
+            return
+
+        if rate is None:
+            elapsed = monotonic() - self.started
+            rate = (self.done - self.initial) / elapsed if elapsed > 0 else 0.0
+
+        self.callback(
+            {
+                "phase": self.phase,
+                "done": self.done,
+                "total": self.total,
+                "rate": round(rate, 1),
+            }
+        )
+
+
+def announce_phase(callback: Optional[ProgressCallback], phase: str) -> None:
+    """Send the first event of a phase whose progress isn't tracked (e.g. 'debriding')"""
+    ProgressTracker(callback, phase)
+
+
+class ThrottledCallback:
+    """
+    Forward the progress events to the callback at most once per 'interval' seconds:
+    the first event of each phase and the last one (done == total) are always forwarded.
+    """
+
+    def __init__(self, callback: ProgressCallback, interval: float = 2.0) -> None:
+        self.callback = callback
+        self.interval = interval
+        self.phase = None
+        self.sent_at = 0.0
+
+    def __call__(self, event: dict) -> None:
+        now = monotonic()
+        last = 0 < event["total"] <= event["done"]
+
+        if (
+            event["phase"] == self.phase
+            and not last
+            and now - self.sent_at < self.interval
+        ):
+            return
+
+        self.phase = event["phase"]
+        self.sent_at = now
+        self.callback(event)
@@ -0,0 +1,39 @@
+import asyncio
+from weakref import WeakKeyDictionary
+
+try:
+    import redis
+    from redis import asyncio as aioredis
+    from redis.exceptions import RedisError
+except ImportError:  # Redis is only required to share states between processes
+    redis = aioredis = None
+    RedisError = OSError
+
+
+# Redis clients shared in the process: synchronous ones per URL, asynchronous ones per event loop and URL
+_clients = {}
+_async_clients = WeakKeyDictionary()
+
+
+def get_redis(url: str) -> "redis.Redis":
+    """Return the synchronous Redis client of the process for this URL"""
+    if redis is None:
+        raise RedisError("Redis support requires the 'redis' package.")
+
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url, socket_connect_timeout=2)
+
+    return _clients[url]
+
+
+def get_async_redis(url: str) -> "aioredis.Redis":
+    """Return the asynchronous Redis client of the current event loop for this URL"""
+    if aioredis is None:
+        raise RedisError("Redis support requires the 'redis' package.")
+
+    loop_clients = _async_clients.setdefault(asyncio.get_event_loop(), {})
+
+    if url not in loop_clients:
+        loop_clients[url] = aioredis.Redis.from_url(url, socket_connect_timeout=2)
+
+    return loop_clients[url]
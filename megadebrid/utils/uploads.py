@@ -0,0 +1,57 @@
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional, Union
+
+from aiofiles import open as aiopen
+from aiohttp import FormData
+
+# Torrent to upload: path of the .torrent file or its content (e.g. received by Mega-Web or the broker)
+TorrentSource = Union[str, Path, bytes]
+
+TORRENT_CONTENT_TYPE = "application/x-bittorrent"
+CHUNK_SIZE = 64 * 1024
+
+
+async def iter_chunks(f, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read the opened file by chunks, without blocking the event loop"""
+    while chunk := await f.read(chunk_size):
+        yield chunk
+
+
+@asynccontextmanager
+async def torrent_form(
+    field: str,
+    torrent: TorrentSource,
+    filename: Optional[str] = None,
+    **fields: Any,
+) -> AsyncIterator[FormData]:
+    """
+    Build the multipart form uploading the torrent in 'field' (with the other 'fields'):
+    a file is streamed from an asynchronous source, closed when leaving the context even on error;
+    bytes are sent as is, without temporary file.
+    """
+    form = FormData()
+
+    for name, value in fields.items():
+        form.add_field(name, str(value))
+
+    if isinstance(torrent, (bytes, bytearray, memoryview)):
+        form.add_field(
+            field,
+            bytes(torrent),
+            filename=filename or "upload.torrent",
+            content_type=TORRENT_CONTENT_TYPE,
+        )
+        yield form
+        return
+
+    path = Path(torrent)
+
+    async with aiopen(path, "rb") as f:
+        form.add_field(
+            field,
+            iter_chunks(f),
+            filename=filename or path.name,
+            content_type=TORRENT_CONTENT_TYPE,
+        )
+        yield form
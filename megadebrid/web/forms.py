@@ -1,7 +1,7 @@
 from pathlib import Path
 
-from wtforms.validators import regexp, DataRequired
-from wtforms import Form, StringField, TextAreaField
+from wtforms.validators import regexp, DataRequired, NumberRange, Optional
+from wtforms import Form, IntegerField, StringField, TextAreaField
 
 
 class SaveFileForm(Form):
@@ -15,6 +15,12 @@ class SaveFileForm(Form):
         render_kw={"class": "form-control mb-2"},
         default=Path.home() / "Downloads",
     )
+    segments = IntegerField(
+        "Number of segments downloaded concurrently",
+        validators=[Optional(), NumberRange(min=1)],
+        render_kw={"class": "form-control mb-2"},
+        default=1,
+    )
 
 
 class DebridAndSaveFileForm(Form):
@@ -31,6 +37,42 @@ class DebridAndSaveFileForm(Form):
     password = StringField(
         "Link password (optional)", render_kw={"class": "form-control mb-2"}, default=""
     )
+    segments = IntegerField(
+        "Number of segments downloaded concurrently",
+        validators=[Optional(), NumberRange(min=1)],
+        render_kw={"class": "form-control mb-2"},
+        default=1,
+    )
+
+
+class DebridAndSaveBatchForm(Form):
+    links = TextAreaField(
+        "Links to unrestrict (one per line)",
+        validators=[DataRequired()],
+        render_kw={"class": "form-control mb-2", "rows": "6"},
+    )
+    folder = StringField(
+        "Folder to save the files",
+        render_kw={"class": "form-control mb-2"},
+        default=Path.home() / "Downloads",
+    )
+    password = StringField(
+        "Links password (optional)",
+        render_kw={"class": "form-control mb-2"},
+        default="",
+    )
+    concurrency = IntegerField(
+        "Number of files downloaded concurrently",
+        validators=[Optional(), NumberRange(min=1)],
+        render_kw={"class": "form-control mb-2"},
+        default=2,
+    )
+    segments = IntegerField(
+        "Number of segments downloaded concurrently per file",
+        validators=[Optional(), NumberRange(min=1)],
+        render_kw={"class": "form-control mb-2"},
+        default=1,
+    )
 
 
 class DownloadMagnetForm(Form):
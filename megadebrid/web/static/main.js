@@ -1,4 +1,12 @@
+const FINAL_STATES = ['SUCCESS', 'FAILURE', 'REVOKED'];
+const RUNNING_STATES = ['PENDING', 'STARTED', 'PROGRESS'];
+// Streamed events of the tasks without row yet (e.g. submitted, status being fetched)
+const MAX_UNRENDERED_EVENTS = 1000;
+const unrenderedEvents = new Map();
+let statusStream = null;
+
 (function() {
+    statusStream = openStatusStream();
     console.log('Mega-Web is started up and ready to use!');
   })();
 
@@ -16,7 +24,65 @@
       body: JSON.stringify(values),  // JSON.stringify({ task: task_type }),
     })
     .then(response => response.json())
-    .then(data => getStatus(data.task_id));
+    .then(data => {
+      // A duplicate submission answers with the existing task: its row may be refreshed already
+      if (!data.duplicate || document.getElementById(data.task_id) === null) getStatus(data.task_id);
+    });
+  }
+
+  function formatResult(result) {
+    // Document of a batch: summary of its links instead of each path
+    if (result !== null && typeof result === 'object' && 'total' in result) {
+      const failed = Object.keys(result.errors).length;
+      return `${result.done}/${result.total} links done` + (failed ? `, ${failed} failed` : '');
+    }
+    // Progress event of a running task: phase, bytes done/total and rate
+    if (result !== null && typeof result === 'object' && 'phase' in result) {
+      const percent = result.total ? ` ${(100 * result.done / result.total).toFixed(1)}%` : '';
+      return `${result.phase}${percent} (${formatBytes(result.rate)}/s)`;
+    }
+    return result;
+  }
+
+  function formatBytes(size) {
+    const units = ['bytes', 'kB', 'MB', 'GB', 'TB'];
+    let unit = 0;
+    while (size >= 1024 && unit < units.length - 1) {
+      size /= 1024;
+      unit++;
+    }
+    return `${size.toFixed(1)} ${units[unit]}`;
+  }
+
+  function stateRank(status) {
+    return FINAL_STATES.includes(status) ? RUNNING_STATES.length : Math.max(RUNNING_STATES.indexOf(status), 0);
+  }
+
+  function renderStatus(res) {
+    let row = document.getElementById(res.task_id);
+    if (row === null) {
+      row = document.getElementById('tasks').insertRow(0);
+      row.setAttribute("id", res.task_id);
+
+      // An event streamed before the row existed may be newer than the fetched status
+      const streamed = unrenderedEvents.get(res.task_id);
+      unrenderedEvents.delete(res.task_id);
+      if (streamed !== undefined && stateRank(streamed.task_status) >= stateRank(res.task_status)) res = streamed;
+    }
+
+    const html = `
+        <tr>
+          <td>${res.task_id}</td>
+          <td>${res.task_status}</td>
+          <td>${formatResult(res.task_result)}</td>
+        </tr>`;
+
+    row.innerHTML = html;
+    row.dataset.status = res.task_status;
+  }
+
+  function isStreamed() {
+    return statusStream !== null && statusStream.readyState !== EventSource.CLOSED;
   }
 
   function getStatus(taskID) {
@@ -28,27 +94,66 @@
     })
     .then(response => response.json())
     .then(res => {
-      const html = `
-        <tr>
-          <td>${taskID}</td>
-          <td>${res.task_status}</td>
-          <td>${res.task_result}</td>
-        </tr>`;
-
-      const existsRow = document.getElementById(taskID);
-      if (existsRow === null) {
-        const newRow = document.getElementById('tasks').insertRow(0);
-        newRow.setAttribute("id", taskID);
-        newRow.innerHTML = html;
-      } else {
-        existsRow.innerHTML = html;
-      }
+      renderStatus(res);
 
-      const taskStatus = res.task_status;
-      if (taskStatus === 'SUCCESS' || taskStatus === 'FAILURE') return false;
+      // The stream pushes the next changes: poll only without it
+      if (FINAL_STATES.includes(res.task_status) || isStreamed()) return false;
       setTimeout(function() {
         getStatus(res.task_id);
       }, 1000);
     })
     .catch(err => console.log(err));
-}
\ No newline at end of file
+  }
+
+  function refreshRunningTasks() {
+    const taskIDs = Array.from(document.querySelectorAll('#tasks tr[id]'))
+      .filter(row => !FINAL_STATES.includes(row.dataset.status))
+      .map(row => row.id);
+    if (taskIDs.length === 0) return;
+
+    // One request for all the running tasks
+    fetch('/tasks/status', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ task_ids: taskIDs }),
+    })
+    .then(response => response.json())
+    .then(statuses => {
+      Object.entries(statuses).forEach(([taskID, res]) => {
+        renderStatus({ task_id: taskID, ...res });
+        // Without stream, each running task is polled again
+        if (!FINAL_STATES.includes(res.task_status) && !isStreamed()) {
+          setTimeout(function() {
+            getStatus(taskID);
+          }, 1000);
+        }
+      });
+    })
+    .catch(err => console.log(err));
+  }
+
+  function openStatusStream() {
+    // One connection for every task: the server pushes the state changes published by the workers
+    const source = new EventSource('/tasks/stream');
+
+    source.onmessage = event => {
+      const res = JSON.parse(event.data);
+      if (document.getElementById(res.task_id) !== null) {
+        renderStatus(res);
+        return;
+      }
+      // Keep the last event of the task: its row may be created later
+      unrenderedEvents.delete(res.task_id);
+      unrenderedEvents.set(res.task_id, res);
+      if (unrenderedEvents.size > MAX_UNRENDERED_EVENTS) unrenderedEvents.delete(unrenderedEvents.keys().next().value);
+    };
+    // Changes may have been missed while (re)connecting
+    source.onopen = refreshRunningTasks;
+    source.onerror = () => {
+      // Stream disabled or unreachable: back to polling each task
+      if (source.readyState === EventSource.CLOSED) refreshRunningTasks();
+    };
+    return source;
+  }
@@ -1,19 +1,27 @@
 from megadebrid.worker.celery import app as celery_app
-from flask import Blueprint, jsonify, request, render_template
+from flask import Blueprint, Response, jsonify, request, render_template
 
+from megadebrid.utils.stores import RedisError
+from megadebrid.worker.status import get_tasks_status, task_status
 from megadebrid.worker.tasks import (
     save_file,
     debrid_and_save_file,
+    debrid_and_save_batch,
     download_magnet,
     download_torrent,
+    get_task_stream,
+    submit_task,
 )
 from megadebrid.web.forms import (
     SaveFileForm,
     DebridAndSaveFileForm,
+    DebridAndSaveBatchForm,
     DownloadMagnetForm,
     DownloadTorrentForm,
 )
 
+# Task IDs accepted by one bulk status request
+MAX_STATUS_TASKS = 1000
 
 megaweb = Blueprint(
     "tasks",
@@ -27,6 +35,11 @@ TASKS_MAPPER = {
         "form": DebridAndSaveFileForm,
         "func": debrid_and_save_file,
     },
+    "DebridAndSaveBatch": {
+        "desc": "Debrid & Save Links",
+        "form": DebridAndSaveBatchForm,
+        "func": debrid_and_save_batch,
+    },
     "DownloadMagnet": {
         "desc": "Download Magnet",
         "form": DownloadMagnetForm,
@@ -66,20 +79,71 @@ async def run_task():
     form = task["form"](**post_json)
 
     if form.validate():
-        task = task["func"].delay(**post_json)
-        return jsonify({"task_id": task.id}), 202
+        # Validated values of the submitted fields: a cleared optional field keeps the default of the task
+        task_kwargs = {
+            name: value
+            for name, value in form.data.items()
+            if name in post_json and value is not None
+        }
+        # The same work submitted again (double-click, automation) is answered by the existing task
+        task_id, duplicate = submit_task(task["func"], **task_kwargs)
+        return jsonify({"task_id": task_id, "duplicate": duplicate}), (
+            200 if duplicate else 202
+        )
 
     return jsonify({"message": "Bad Request", "error": form.errors}), 400
 
 
+@megaweb.route("/tasks/stream", methods=["GET"])
+def stream_status():
+    """Server-Sent Events of the state changes published by the Mega-Workers (synchronous: streamed by the server)"""
+    task_stream = get_task_stream()
+
+    try:
+        if task_stream is None:
+            raise RedisError("The stream is disabled, see the TASKS_STREAM config.")
+
+        pubsub = task_stream.subscribe()
+    except (RedisError, OSError) as error:
+        # The browser falls back on requesting the status of each task
+        return jsonify({"message": "Service Unavailable", "error": str(error)}), 503
+
+    return Response(
+        task_stream.events(pubsub),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@megaweb.route("/tasks/status", methods=["POST"])
+async def get_bulk_status():
+    """Status of many tasks in one request: {"task_ids": [...]} answered by {task_id: status}"""
+    task_ids = (request.get_json(silent=True) or {}).get("task_ids")
+
+    if (
+        not isinstance(task_ids, list)
+        or not all(isinstance(task_id, str) for task_id in task_ids)
+        or len(task_ids) > MAX_STATUS_TASKS
+    ):
+        return (
+            jsonify(
+                {
+                    "message": "Bad Request",
+                    "error": "You need specify 'task_ids', a list of at most "
+                    f"{ MAX_STATUS_TASKS } task IDs.",
+                }
+            ),
+            400,
+        )
+
+    return jsonify(get_tasks_status(task_ids)), 200
+
+
 @megaweb.route("/tasks/<task_id>", methods=["GET"])
 async def get_status(task_id):
     task_result = celery_app.AsyncResult(task_id)
     result = {
         "task_id": task_id,
-        "task_status": task_result.status,
-        "task_result": task_result.result
-        if isinstance(task_result.result, str)
-        else None,
+        **task_status(task_result.status, task_result.result),
     }
     return jsonify(result), 200
@@ -25,5 +25,20 @@ app.conf.update(
     result_expires=604800,  # Results expires after 7 days: 604800 seconds
 )
 
+# Execution pool: 'asyncio' runs many I/O-bound tasks concurrently as coroutines in one process
+# (CELERY_WORKER_CONCURRENCY downloads in progress at once), otherwise a Celery pool name (default: prefork)
+ASYNCIO_POOL = "megadebrid.worker.pool:AsyncioPool"
+worker_pool = environ.get("CELERY_WORKER_POOL", "prefork")
+
+if worker_pool in ("asyncio", ASYNCIO_POOL):
+    app.conf.update(
+        worker_pool=ASYNCIO_POOL,
+        worker_concurrency=int(environ.get("CELERY_WORKER_CONCURRENCY", 32)),
+        # Backpressure: reserve no more tasks than the downloads in progress
+        worker_prefetch_multiplier=1,
+    )
+else:
+    app.conf.update(worker_pool=worker_pool)
+
 if __name__ == "__main__":
     app.start()
@@ -0,0 +1,250 @@
+from base64 import b32decode
+from binascii import Error as Base32Error
+from hashlib import sha1
+from pathlib import Path
+from threading import Lock
+from time import monotonic
+from typing import Any, Optional, Union
+from urllib.parse import urlsplit, urlunsplit
+
+from megadebrid.libs.flow import MegaDebridFlow
+from megadebrid.utils.stores import RedisError, get_redis
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def split_links(links: Union[str, list[str]]) -> list[str]:
+    """Links of a batch, given as a list or a newline-separated string (Mega-Web form), without duplicates"""
+    if isinstance(links, str):
+        links = links.splitlines()
+
+    return list(dict.fromkeys(link.strip() for link in links if link.strip()))
+
+
+def canonical_link(link: str) -> str:
+    """Normalise the link: lower-cased scheme and host, without default port, credentials nor fragment"""
+    parsed = urlsplit(link.strip())
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or "").lower()
+
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{ parsed.port }"
+
+    return urlunsplit((scheme, netloc, parsed.path or "/", parsed.query, ""))
+
+
+def magnet_infohash(magnet: str) -> str:
+    """Infohash of the magnet in lower-case hexadecimal (base32 ones are converted)"""
+    infohash = MegaDebridFlow.get_magnet_hash(magnet.strip())
+
+    if len(infohash) == 32:
+        try:
+            return b32decode(infohash.upper()).hex()
+        except Base32Error:
+            pass
+
+    return infohash.lower()
+
+
+def bencode_end(data: bytes, start: int) -> int:
+    """Return the index following the bencoded value beginning at 'start'"""
+    token = data[start : start + 1]
+
+    if token == b"i":
+        return data.index(b"e", start) + 1
+
+    if token in (b"l", b"d"):
+        index = start + 1
+
+        while data[index : index + 1] != b"e":
+            index = bencode_end(data, index)
+
+        return index + 1
+
+    if token.isdigit():
+        colon = data.index(b":", start)
+        return colon + 1 + int(data[start:colon])
+
+    raise ValueError(f"Invalid bencoded value at byte { start }.")
+
+
+def torrent_infohash(content: bytes) -> str:
+    """Infohash of the torrent: SHA-1 of its bencoded 'info' dictionary, as found in the file"""
+    if content[:1] != b"d":
+        raise ValueError("The torrent is not a bencoded dictionary.")
+
+    index = 1
+
+    while content[index : index + 1] != b"e":
+        key_end = bencode_end(content, index)
+        value_end = bencode_end(content, key_end)
+
+        if content[content.index(b":", index) + 1 : key_end] == b"info":
+            return sha1(content[key_end:value_end]).hexdigest()
+
+        index = value_end
+
+    raise ValueError("The torrent has no 'info' dictionary.")
+
+
+def torrent_file_identity(torrent_path: str) -> str:
+    """Infohash of the torrent file, or its path if it can't be read here (e.g. only mounted in the worker)"""
+    try:
+        return torrent_infohash(Path(torrent_path).expanduser().read_bytes())
+    except (OSError, ValueError):
+        return f"path:{ Path(torrent_path).expanduser() }"
+
+
+# What identifies the work of each task, whatever the way it was submitted
+TASK_IDENTITIES = {
+    "save_file": lambda kwargs: canonical_link(kwargs["url"]),
+    "debrid_and_save_file": lambda kwargs: canonical_link(kwargs["link"]),
+    "debrid_and_save_batch": lambda kwargs: "\n".join(
+        sorted(canonical_link(link) for link in split_links(kwargs["links"]))
+    ),
+    "download_magnet": lambda kwargs: magnet_infohash(kwargs["magnet"]),
+    "download_torrent": lambda kwargs: torrent_file_identity(kwargs["torrent_path"]),
+}
+
+
+def task_key(task_name: str, kwargs: dict[str, Any]) -> Optional[str]:
+    """Canonical key of the task: the same work saved in the same folder, None if it can't be identified"""
+    identity = TASK_IDENTITIES.get(task_name.rsplit(".", 1)[-1])
+
+    try:
+        work = identity(kwargs) if identity else None
+    except (KeyError, TypeError, ValueError, IndexError):
+        work = None
+
+    if not work:
+        return None
+
+    folder = Path(str(kwargs.get("folder") or "~/Downloads")).expanduser()
+    digest = sha1(f"{ work }\n{ folder }".encode()).hexdigest()
+    return f"{ task_name }:{ digest }"
+
+
+class TaskIndex:
+    """
+    Index of the tasks in flight or completed by canonical key, kept for the dedup window:
+    a task submitted again for the same work is answered by the indexed one.
+    In memory, only deduplicate the tasks submitted by the process.
+    """
+
+    def __init__(self, window: float, pending_timeout: float = 600) -> None:
+        self.window = window
+        self.pending_timeout = pending_timeout  # Seconds waiting for a worker
+        self.tasks = {}  # key: (task_id, expiration)
+        self.lock = Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the task indexed for the key, if any"""
+        with self.lock:
+            indexed = self.tasks.get(key)
+
+        return indexed[0] if indexed and indexed[1] > monotonic() else None
+
+    def claim(self, key: str, task_id: str) -> str:
+        """Index the task for the key unless another one is: return the task indexed for the key"""
+        if self.window <= 0:
+            return task_id
+
+        with self.lock:
+            indexed = self.tasks.get(key)
+
+            if indexed and indexed[1] > monotonic():
+                return indexed[0]
+
+            self.tasks[key] = (task_id, monotonic() + self.window)
+            return task_id
+
+    def age(self, key: str) -> Optional[float]:
+        """Return the seconds since the task was indexed for the key, None if there is none"""
+        with self.lock:
+            indexed = self.tasks.get(key)
+
+        if not indexed or indexed[1] <= monotonic():
+            return None
+
+        return self.window - (indexed[1] - monotonic())
+
+    def release(self, key: str, task_id: str) -> None:
+        """Remove the task from the index (e.g. failed), unless another one replaced it meanwhile"""
+        with self.lock:
+            if self.tasks.get(key, (None,))[0] == task_id:
+                del self.tasks[key]
+
+
+class RedisTaskIndex(TaskIndex):
+    """Index of the tasks in Redis, shared by Mega-Web and the Mega-Workers (in memory while unreachable)"""
+
+    # Compare-and-delete: don't drop a task indexed meanwhile by another process
+    RELEASE_SCRIPT = """
+    if redis.call("GET", KEYS[1]) == ARGV[1] then
+        return redis.call("DEL", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, window: float, url: str, pending_timeout: float = 600) -> None:
+        super().__init__(window, pending_timeout=pending_timeout)
+        self.url = url
+
+    @staticmethod
+    def redis_key(key: str) -> str:
+        return f"mega:task:{ key }"
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            indexed = get_redis(self.url).get(self.redis_key(key))
+        except (RedisError, OSError):
+            return super().get(key)
+
+        return indexed.decode() if indexed is not None else None
+
+    def claim(self, key: str, task_id: str) -> str:
+        if self.window <= 0:
+            return task_id
+
+        try:
+            client = get_redis(self.url)
+
+            # Atomic: of two concurrent submissions, only one is indexed
+            while not client.set(
+                self.redis_key(key), task_id, nx=True, ex=max(int(self.window), 1)
+            ):
+                indexed = client.get(self.redis_key(key))
+
+                if indexed is not None:  # Else expired meanwhile: claim it again
+                    return indexed.decode()
+
+            return task_id
+        except (RedisError, OSError):
+            return super().claim(key, task_id)
+
+    def age(self, key: str) -> Optional[float]:
+        try:
+            ttl = get_redis(self.url).ttl(self.redis_key(key))
+        except (RedisError, OSError):
+            return super().age(key)
+
+        # Negative: no such key (-2) or no expiration (-1)
+        return max(int(self.window), 1) - ttl if ttl >= 0 else None
+
+    def release(self, key: str, task_id: str) -> None:
+        try:
+            get_redis(self.url).register_script(self.RELEASE_SCRIPT)(
+                keys=[self.redis_key(key)], args=[task_id]
+            )
+        except (RedisError, OSError):
+            super().release(key, task_id)
+
+
+def create_task_index(
+    window: float, backend: str = "memory", url: str = "", pending_timeout: float = 600
+) -> TaskIndex:
+    """Return the index of the tasks with the wished backend: 'memory' or 'redis'"""
+    if backend.lower() == "redis" and url:
+        return RedisTaskIndex(window, url=url, pending_timeout=pending_timeout)
+
+    return TaskIndex(window, pending_timeout=pending_timeout)
@@ -0,0 +1,133 @@
+import asyncio
+from threading import Lock, Thread
+from typing import Any, Awaitable, Callable, Optional
+
+from megadebrid.libs.flow import MegaDebridFlow
+
+
+class WorkerLoop:
+    """
+    Long-lived event loop of a worker process, running in a background thread with a warm MegaDebridFlow:
+    its session, connection pool and token are reused by every task instead of being set up for each one.
+    The MegaDebridFlow is opened (login included) by the first task: a failed login fails the task,
+    not the initialisation of the worker process, and the next task tries again.
+    The tasks submit their coroutines to the loop and wait for the result in their own thread.
+    """
+
+    # Loop of the current worker process
+    _shared = None
+    _shared_lock = Lock()
+
+    # Seconds given to the MegaDebridFlow to close on shutdown
+    CLOSE_TIMEOUT = 30
+
+    def __init__(self) -> None:
+        self.loop = None
+        self.thread = None
+        self.megadebrid = None
+        self.opening = None  # Lock created in the loop: the first tasks open the MegaDebridFlow once
+
+    @classmethod
+    def shared(cls) -> "WorkerLoop":
+        """Return the loop of the worker process, started on first use"""
+        with cls._shared_lock:
+            if cls._shared is None or not cls._shared.is_running:
+                cls._shared = cls()
+                cls._shared.start()
+
+            return cls._shared
+
+    @classmethod
+    def stop_shared(cls) -> None:
+        """Stop the loop of the worker process, if started"""
+        with cls._shared_lock:
+            if cls._shared is not None:
+                cls._shared.stop()
+                cls._shared = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self) -> None:
+        """Start the loop in a daemon thread, the MegaDebridFlow is opened by the first task"""
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(
+            target=self.run_forever, name="mega-worker-loop", daemon=True
+        )
+        self.thread.start()
+
+    def run_forever(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def open(self) -> None:
+        # The session must be created in the loop which will use it
+        megadebrid = MegaDebridFlow()
+
+        try:
+            self.megadebrid = await megadebrid.__aenter__()
+        except BaseException:
+            # E.g. login failed: don't leak the session
+            await megadebrid.__aexit__(None, None, None)
+            raise
+
+    async def get_megadebrid(self) -> MegaDebridFlow:
+        """Return the MegaDebridFlow of the loop, opened on first use"""
+        if self.megadebrid is None:
+            if self.opening is None:
+                self.opening = asyncio.Lock()
+
+            async with self.opening:
+                if self.megadebrid is None:
+                    await self.open()
+
+        return self.megadebrid
+
+    async def close(self) -> None:
+        if self.megadebrid is not None:
+            await self.megadebrid.__aexit__(None, None, None)
+            self.megadebrid = None
+
+        # The shared connector outlives the sessions which used it
+        await MegaDebridFlow.close_shared_connector()
+
+    def stop(self) -> None:
+        """Close the MegaDebridFlow, then stop the loop and wait for its thread"""
+        if self.loop is None:
+            return
+
+        if self.is_running:
+            try:
+                asyncio.run_coroutine_threadsafe(self.close(), self.loop).result(
+                    timeout=self.CLOSE_TIMEOUT
+                )
+            finally:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join()
+
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+
+    def run(
+        self,
+        func: Callable[[MegaDebridFlow], Awaitable[Any]],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Run the coroutine function with the MegaDebridFlow in the loop, block the calling thread until its result"""
+
+        async def run_func() -> Any:
+            return await func(await self.get_megadebrid())
+
+        return asyncio.run_coroutine_threadsafe(run_func(), self.loop).result(
+            timeout=timeout
+        )
+
+    def call(self, func_name: str, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run the MegaDebridFlow method in the loop, block the calling thread until its result"""
+
+        async def call_method(megadebrid: MegaDebridFlow) -> Any:
+            return await getattr(megadebrid, func_name)(**kwargs)
+
+        return self.run(call_method, timeout=timeout)
@@ -0,0 +1,25 @@
+from celery.concurrency.thread import TaskPool
+
+from .loop import WorkerLoop
+
+
+class AsyncioPool(TaskPool):
+    """
+    Execution pool for the I/O-bound tasks: one process runs up to 'concurrency' tasks at once,
+    as coroutines on the event loop of the process sharing one MegaDebridFlow (session and connector).
+    The threads of the pool only wait for the result of their coroutine, so the number of tasks
+    reserved from the broker is bounded by the number of downloads in progress.
+
+    Usage: CELERY_WORKER_POOL=asyncio celery -A megadebrid.worker worker -c 32
+    or:    CELERY_CUSTOM_WORKER_POOL=megadebrid.worker.pool:AsyncioPool celery -A megadebrid.worker worker -P custom -c 32
+    """
+
+    def on_start(self) -> None:
+        # No 'worker_process_init' signal without child processes: start the loop with the pool
+        WorkerLoop.shared()
+        super().on_start()
+
+    def on_stop(self) -> None:
+        # Let the tasks in progress finish, then close the MegaDebridFlow and stop the loop
+        super().on_stop()
+        WorkerLoop.stop_shared()
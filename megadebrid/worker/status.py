@@ -0,0 +1,71 @@
+from typing import Any, Iterable, Optional
+
+from celery.backends.base import BaseBackend, BaseKeyValueStoreBackend
+
+from .celery import app as celery_app
+
+# Keys of the result backend fetched by one MGET, to bound the size of each reply
+MGET_BATCH = 500
+
+
+def task_status(status: str, result: Any = None) -> dict:
+    """Status of a task as answered by Mega-Web"""
+    return {
+        "task_status": status,
+        # Path of the file, document of a batch, or 'PROGRESS' meta of the task while running
+        "task_result": result if isinstance(result, (str, dict)) else None,
+    }
+
+
+def fetch_results(
+    backend: BaseKeyValueStoreBackend, task_ids: list[str]
+) -> list[Optional[bytes]]:
+    """Return the stored results of the tasks (None if unknown), by batches of MGET"""
+    keys = [backend.get_key_for_task(task_id) for task_id in task_ids]
+    batches = [keys[i : i + MGET_BATCH] for i in range(0, len(keys), MGET_BATCH)]
+    client = getattr(backend, "client", None)
+
+    if hasattr(client, "pipeline"):
+        # Redis: every MGET sent in one round trip
+        pipeline = client.pipeline(transaction=False)
+
+        for batch in batches:
+            pipeline.mget(batch)
+
+        replies = pipeline.execute()
+    else:
+        replies = [backend.mget(batch) for batch in batches]
+
+    return [value for reply in replies for value in reply]
+
+
+def get_tasks_status(
+    task_ids: Iterable[str], backend: Optional[BaseBackend] = None
+) -> dict[str, dict]:
+    """
+    Return the status of many tasks by ID, read from a key-value result backend (e.g. Redis) at once
+    instead of one request per task. An unknown task is 'PENDING', as for AsyncResult.
+    """
+    backend = backend or celery_app.backend
+    task_ids = list(dict.fromkeys(task_ids))
+
+    if not isinstance(backend, BaseKeyValueStoreBackend):
+        # e.g. database backend: one query per task
+        return {
+            task_id: task_status(result.status, result.result)
+            for task_id, result in (
+                (task_id, celery_app.AsyncResult(task_id, backend=backend))
+                for task_id in task_ids
+            )
+        }
+
+    statuses = {}
+
+    for task_id, value in zip(task_ids, fetch_results(backend, task_ids)):
+        if value is None:
+            statuses[task_id] = task_status("PENDING")
+        else:
+            meta = backend.decode_result(value)
+            statuses[task_id] = task_status(meta["status"], meta.get("result"))
+
+    return statuses
@@ -0,0 +1,65 @@
+from json import dumps
+from typing import Any, Iterator, Optional
+
+from megadebrid.utils.stores import RedisError, get_redis, redis
+
+
+class TaskStream:
+    """
+    Redis pub/sub channel of the task states: the Mega-Workers publish each state change of their tasks,
+    Mega-Web relays them to the browsers as Server-Sent Events. The load depends on the number of changes,
+    not on the number of tasks followed. Publishing is best effort and never fails a task.
+    """
+
+    # Seconds between two comments sent on an idle stream, so that proxies keep the connection open
+    KEEPALIVE = 15
+
+    def __init__(self, url: str, channel: str = "mega:tasks") -> None:
+        self.url = url
+        self.channel = channel
+
+    @staticmethod
+    def status(task_id: str, status: str, result: Any = None) -> dict:
+        """State change of the task, in the format of the task status of Mega-Web"""
+        return {"task_id": task_id, "task_status": status, "task_result": result}
+
+    def publish(self, task_id: str, status: str, result: Any = None) -> None:
+        try:
+            get_redis(self.url).publish(
+                self.channel, dumps(self.status(task_id, status, result))
+            )
+        except (RedisError, OSError, TypeError, ValueError):
+            pass  # Not serializable or Redis unreachable: the task status can still be requested
+
+    def subscribe(self) -> "redis.client.PubSub":
+        """Subscribe to the channel, raise RedisError (or OSError) if Redis can't be reached"""
+        pubsub = get_redis(self.url).pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        return pubsub
+
+    def events(
+        self, pubsub: "redis.client.PubSub", keepalive: float = KEEPALIVE
+    ) -> Iterator[str]:
+        """Yield the published states as Server-Sent Events until the client disconnects"""
+        try:
+            yield "retry: 3000\n\n"  # Reconnection delay of the browser, in milliseconds
+
+            while True:
+                message = pubsub.get_message(timeout=keepalive)
+
+                if message is None:
+                    yield ": keepalive\n\n"
+                elif message["type"] == "message":
+                    yield f"data: { message['data'].decode() }\n\n"
+        finally:
+            pubsub.close()
+
+
+def create_task_stream(
+    backend: str = "none", url: str = "", channel: str = "mega:tasks"
+) -> Optional[TaskStream]:
+    """Return the stream of the task states with the wished backend: 'none' (disabled) or 'redis'"""
+    if backend.lower() == "redis" and url:
+        return TaskStream(url, channel=channel or "mega:tasks")
+
+    return None
@@ -1,9 +1,41 @@
 import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import cache
+from inspect import signature
+from os import environ
 from pathlib import Path
-from typing import Any
+from threading import Lock
+from typing import Any, Optional, Union
+
+from celery import Task
+from celery.exceptions import Ignore
+from celery.signals import (
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_revoked,
+    worker_process_init,
+    worker_process_shutdown,
+)
 
 from .celery import app as celery_app
-from megadebrid.libs.flow import MegaDebridFlow
+from .dedup import TaskIndex, create_task_index, split_links, task_key
+from .loop import WorkerLoop
+from .stream import TaskStream, create_task_stream
+from megadebrid.parsers.configparser import MegaConfigParser
+from megadebrid.utils.progressions import ThrottledCallback
+
+# States of the tasks which can't answer the same work submitted again
+UNSUCCESSFUL_STATES = ("FAILURE", "REVOKED")
+
+# Index of the tasks by canonical key, created on first use
+task_index = None
+
+# Seconds between two 'PROGRESS' states of a task written in the result backend
+PROGRESS_INTERVAL = float(environ.get("CELERY_PROGRESS_INTERVAL", 2))
+
+# Threads writing the progress states, out of the event loop of the worker process
+progress_executor = ThreadPoolExecutor(thread_name_prefix="mega-progress")
 
 
 def serializer(obj: Any):
@@ -13,61 +45,355 @@ def serializer(obj: Any):
     return obj
 
 
-async def async_wrapper(func_name, **kwargs) -> Any:
+@worker_process_init.connect
+def start_worker_loop(**kwargs) -> None:
+    """Start the event loop of the worker process before the first task, which opens its MegaDebridFlow"""
+    WorkerLoop.shared()
+
+
+@worker_process_shutdown.connect
+def stop_worker_loop(**kwargs) -> None:
+    """Close the MegaDebridFlow and its connections, then stop the event loop of the worker process"""
+    WorkerLoop.stop_shared()
+
+
+def get_task_index() -> TaskIndex:
+    """Return the index of the tasks of the process, configured by the TASKS_DEDUP config"""
+    global task_index
+
+    if task_index is None:
+        dedup_config = MegaConfigParser().get_tasks_dedup_config()
+        task_index = create_task_index(
+            float(dedup_config["WINDOW"]),
+            backend=dedup_config["BACKEND"],
+            url=dedup_config["REDIS_URL"],
+            pending_timeout=float(dedup_config["PENDING_TIMEOUT"]),
+        )
+
+    return task_index
+
+
+def get_task_key(
+    task: Task, args: tuple = (), kwargs: Optional[dict] = None
+) -> Optional[str]:
+    """Canonical key of the task called with these arguments, positional ones included"""
+    try:
+        arguments = signature(task.run).bind_partial(*args, **(kwargs or {})).arguments
+    except TypeError:
+        return None
+
+    return task_key(task.name, arguments)
+
+
+def answers_work(index: TaskIndex, key: str, task_id: str) -> bool:
+    """
+    Whether the task indexed for the key still answers its work: neither failed nor revoked,
+    and seen by a worker (started, as 'task_track_started' is enabled) unless indexed recently:
+    a task PENDING for longer may be unknown or its message lost.
+    """
+    status = celery_app.AsyncResult(task_id).status
+
+    if status in UNSUCCESSFUL_STATES:
+        return False
+
+    if status == "PENDING":
+        age = index.age(key)
+        return age is not None and age < index.pending_timeout
+
+    return True
+
+
+def submit_task(task: Task, **kwargs) -> tuple[str, bool]:
+    """
+    Queue the task, unless the same work was submitted within the dedup window and didn't fail:
+    return the ID of the task answering it, and whether it is a duplicate.
+    """
+    key = get_task_key(task, kwargs=kwargs)
+
+    if key is None:
+        return str(task.delay(**kwargs).id), False
+
+    index = get_task_index()
+    indexed = index.get(key)
+
+    if indexed is not None:
+        if answers_work(index, key, indexed):
+            return indexed, True
+
+        index.release(key, indexed)
+
+    task_id = str(task.delay(**kwargs).id)
+    indexed = index.claim(key, task_id)
+
+    if indexed != task_id:
+        # Submitted concurrently for the same work: keep the indexed task only
+        celery_app.control.revoke(task_id)
+        return indexed, True
+
+    return task_id, False
+
+
+def claim_task(key: str, task_id: str) -> bool:
+    """Index the starting task, unless the indexed one still answers the same work: return whether it is"""
+    index = get_task_index()
+    indexed = index.claim(key, task_id)
+
+    if indexed == task_id:
+        return True
+
+    if answers_work(index, key, indexed):
+        return False
+
+    index.release(key, indexed)
+    return index.claim(key, task_id) == task_id
+
+
+class DedupTask(Task):
+    """
+    Task indexed by canonical key when it starts in the worker: one queued without 'submit_task'
+    (e.g. '.delay()') for the work of a task in flight or completed is ignored instead of run.
+    """
+
+    def __call__(self, *args, **kwargs):
+        key = get_task_key(self, args, kwargs)
+
+        # No ID: called directly, not as a task
+        if key is not None and self.request.id and not claim_task(key, self.request.id):
+            raise Ignore()
+
+        return super().__call__(*args, **kwargs)
+
+
+@task_failure.connect
+def unindex_failed_task(
+    sender: Task, task_id: str, args: tuple, kwargs: dict, **extras
+) -> None:
+    """A failed task no longer answers its work: the next submission queues it again"""
+    key = get_task_key(sender, args, kwargs)
+
+    if key is not None:
+        get_task_index().release(key, task_id)
+
+
+@task_revoked.connect
+def unindex_revoked_task(sender: Task, request, **extras) -> None:
+    """A revoked task no longer answers its work: the next submission queues it again"""
+    key = get_task_key(sender, request.args or (), request.kwargs)
+
+    if key is not None:
+        get_task_index().release(key, request.id)
+
+
+@cache
+def get_task_stream() -> Optional[TaskStream]:
+    """Return the stream of the task states of the process configured by the TASKS_STREAM config, None if disabled"""
+    stream_config = MegaConfigParser().get_tasks_stream_config()
+    return create_task_stream(
+        backend=stream_config["BACKEND"],
+        url=stream_config["REDIS_URL"],
+        channel=stream_config["CHANNEL"],
+    )
+
+
+def publish_status(task_id: str, status: str, result: Any = None) -> None:
+    """Publish the state change of the task to Mega-Web, if the stream is enabled"""
+    task_stream = get_task_stream()
+
+    if task_stream is not None:
+        task_stream.publish(task_id, status, serializer(result))
+
+
+@task_prerun.connect
+def publish_started_task(task_id: str, **extras) -> None:
+    publish_status(task_id, "STARTED")
+
+
+@task_postrun.connect
+def publish_finished_task(task_id: str, state: str, retval: Any, **extras) -> None:
+    """Published once the result is stored: a status requested afterwards is the same"""
+    publish_status(task_id, state, retval if state == "SUCCESS" else None)
+
+
+@task_revoked.connect
+def publish_revoked_task(request, **extras) -> None:
+    publish_status(request.id, "REVOKED")
+
+
+def report_progress(task: Task, task_id: str, meta: dict) -> None:
+    """Write the 'PROGRESS' state of the task in the result backend, then publish it"""
+    task.update_state(task_id=task_id, state="PROGRESS", meta=meta)
+    publish_status(task_id, "PROGRESS", meta)
+
+
+class TaskProgress:
+    """
+    Report the progress events of the MegaDebridFlow as 'PROGRESS' state of the task, throttled in time
+    so the result backend isn't written for each chunk. The events come from the event loop: the state is
+    written by another thread, and the events arriving meanwhile are coalesced into the latest one.
+    """
+
+    def __init__(self, task: Task, interval: float = PROGRESS_INTERVAL) -> None:
+        self.task = task
+        self.task_id = task.request.id  # The request is local to the thread of the task
+        self.latest = None
+        self.pending = None
+        self.lock = Lock()
+        self.callback = ThrottledCallback(self.report, interval=interval)
+
+    def __call__(self, event: dict) -> None:
+        self.callback(event)
+
+    def report(self, event: dict) -> None:
+        with self.lock:
+            self.latest = event
+
+            if self.pending is None:
+                self.pending = progress_executor.submit(self.write)
+
+    def write(self) -> None:
+        """Write the latest event until there is no newer one"""
+        while True:
+            with self.lock:
+                event, self.latest = self.latest, None
+
+                if event is None:
+                    self.pending = None
+                    return
+
+            try:
+                report_progress(self.task, self.task_id, event)
+            except Exception:
+                pass  # Best effort: an unreachable result backend doesn't fail the download
+
+    def close(self) -> None:
+        """Wait for the states being written: they must not overwrite the final state of the task"""
+        with self.lock:
+            pending = self.pending
+
+        if pending is not None:
+            wait([pending])
+
+
+def run_flow(func_name: str, task: Optional[Task] = None, **kwargs) -> Any:
     """
     Celery doesn't support yet direct asynchronous task, it requires to wrap asyncio methods.
 
     > celery 6 will mainly focus on asyncio support. but as you all can see you can't do that before Q1 2023.
     Source: https://github.com/celery/celery/issues/6552
 
+    The method runs on the event loop of the worker process (started on first use if the pool
+    doesn't send 'worker_process_init'), with its warm MegaDebridFlow: no new loop, session or login per task.
+
     Args:
         func_name (str): the method in MegaDebridFlow which will be handled as celery task
+        task (Task, optional): the bound celery task reporting the progress of the method as its state
 
     Returns:
         any: the type for each of the MegaDebridFlow functions. Mainly Paths that need to be
              serialized to be stored as JSON result by celery.
     """
-    async with MegaDebridFlow() as megadebrid:
-        result = await getattr(megadebrid, func_name)(**kwargs)
-        return serializer(result)
+    if task is None:
+        return serializer(WorkerLoop.shared().call(func_name, **kwargs))
+
+    progress = TaskProgress(task)
+
+    try:
+        return serializer(
+            WorkerLoop.shared().call(func_name, on_progress=progress, **kwargs)
+        )
+    finally:
+        progress.close()
 
 
-@celery_app.task(name="save_file")
-def save_file(url: str, folder: Path):
-    """Call the async_wrapper to handle the MegaDebridFlow method 'save_file' as synchronous task"""
-    result = asyncio.run(async_wrapper(func_name="save_file", url=url, folder=folder))
+@celery_app.task(name="save_file", base=DedupTask, bind=True)
+def save_file(self, url: str, folder: Path, segments: int = 1):
+    """Call run_flow to handle the MegaDebridFlow method 'save_file' as synchronous task"""
+    result = run_flow(
+        func_name="save_file",
+        task=self,
+        url=url,
+        folder=folder,
+        segments=int(segments),
+    )
     return result
 
 
-@celery_app.task(name="debrid_and_save_file")
-def debrid_and_save_file(link: str, folder: Path, password: str = ""):
-    """Call the async_wrapper to handle the MegaDebridFlow method 'debrid_and_save_file' as synchronous task"""
-    result = asyncio.run(
-        async_wrapper(
-            func_name="debrid_and_save_file",
-            link=link,
-            folder=folder,
-            password=password,
-        )
+@celery_app.task(name="debrid_and_save_file", base=DedupTask, bind=True)
+def debrid_and_save_file(
+    self, link: str, folder: Path, password: str = "", segments: int = 1
+):
+    """Call run_flow to handle the MegaDebridFlow method 'debrid_and_save_file' as synchronous task"""
+    result = run_flow(
+        func_name="debrid_and_save_file",
+        task=self,
+        link=link,
+        folder=folder,
+        password=password,
+        segments=int(segments),
     )
     return result
 
 
-@celery_app.task(name="download_magnet")
-def download_magnet(magnet: str, folder: Path):
-    """Call the async_wrapper to handle the MegaDebridFlow method 'download_magnet' as synchronous task"""
-    result = asyncio.run(
-        async_wrapper(func_name="download_magnet", magnet=magnet, folder=folder)
+@celery_app.task(name="download_magnet", base=DedupTask, bind=True)
+def download_magnet(self, magnet: str, folder: Path):
+    """Call run_flow to handle the MegaDebridFlow method 'download_magnet' as synchronous task"""
+    result = run_flow(
+        func_name="download_magnet", task=self, magnet=magnet, folder=folder
     )
     return result
 
 
-@celery_app.task(name="download_torrent")
-def download_torrent(torrent_path: Path, folder: Path):
-    """Call the async_wrapper to handle the MegaDebridFlow method 'download_torrent' as synchornous task"""
-    result = asyncio.run(
-        async_wrapper(
-            func_name="download_torrent", torrent_path=torrent_path, folder=folder
-        )
+@celery_app.task(name="download_torrent", base=DedupTask, bind=True)
+def download_torrent(self, torrent_path: Path, folder: Path):
+    """Call run_flow to handle the MegaDebridFlow method 'download_torrent' as synchornous task"""
+    result = run_flow(
+        func_name="download_torrent",
+        task=self,
+        torrent_path=torrent_path,
+        folder=folder,
     )
     return result
+
+
+@celery_app.task(name="debrid_and_save_batch", base=DedupTask, bind=True)
+def debrid_and_save_batch(
+    self,
+    links: Union[str, list[str]],
+    folder: Path,
+    password: str = "",
+    concurrency: int = 2,
+    segments: int = 1,
+):
+    """
+    Debrid and save a list of links in one task, with bounded concurrency inside the worker.
+    The per-link results are gathered in one compact document, reported as 'PROGRESS' meta
+    after each link then returned: {"total", "done", "results": {link: path}, "errors": {link: error}}
+    """
+    links = split_links(links)
+    document = {"total": len(links), "done": 0, "results": {}, "errors": {}}
+    task_id = self.request.id  # The request is local to the thread of the task
+
+    def on_result(link: str, result: Any) -> None:
+        document["done"] += 1
+
+        if isinstance(result, Path):
+            document["results"][link] = str(result)
+        else:
+            error = f"{ result.get('response_code') }: { result.get('response_text') }"
+            document["errors"][link] = error
+
+        report_progress(self, task_id, document)
+
+    async def save_batch(megadebrid) -> None:
+        async for link, result in megadebrid.debrid_and_save_many(
+            links,
+            folder=folder,
+            password=password or "",
+            concurrency=int(concurrency),
+            segments=int(segments),
+        ):
+            # The result backend is synchronous: keep it out of the event loop
+            await asyncio.to_thread(on_result, link, result)
+
+    WorkerLoop.shared().run(save_batch)
+    return document
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of the extraction of the debrid codes from the 'xhr_debrid' HTML:
+BeautifulSoup tree (previous path) against the incremental scanner and the fallback parsing.
+
+Usage (from the repository root): python -m tests.benchmark_megaextractor [NUMBER_OF_LINKS ...]
+"""
+
+import sys
+from timeit import repeat
+
+from bs4 import BeautifulSoup
+
+from megadebrid.utils.extractors import (
+    DebridCodesExtractor,
+    extract_debrid_codes,
+    parse_debrid_codes,
+)
+
+
+def build_html_body(links: int) -> bytes:
+    """HTML answered by Mega-Debrid for 'links' submitted links"""
+    return "".join(
+        f"\n<div id='' class='acp-box col-md-6 card'><h3> <span class='title'>https://1fichier.com/?{ i:020d}</span>"
+        f"<span class='infos'><i class='fa fa-info-circle'></i> <span name='info-content'>ID: #{ i }<br> (Server used at 12.48%)</span>"
+        f"</h3><span class='hoster'> <img src='/images/hosts/unfichier.png' title='Unfichier'></span>"
+        f"<div class='card-body'><span class='filename'>My_File_{ i }</span><span class='size'>1388 MB </span></div>"
+        f"<div class='span-debrid'><span id='debrid_{ i }' align='center' data-code='{ i:015x}' data-i='{ i }'>"
+        f"<button class='btn btn-primary'><i class='fa fa-play'></i></button></span></div></div>"
+        for i in range(links)
+    ).encode()
+
+
+def soup_debrid_codes(html_body: bytes) -> list[str]:
+    """Previous path: whole BeautifulSoup tree, first 'debrid_0' element"""
+    soup = BeautifulSoup(html_body, "html.parser")
+    return [soup.find(id="debrid_0")["data-code"]]
+
+
+def scan_by_chunks(html_body: bytes, size: int = 8192) -> list[str]:
+    """Incremental path: feed the body as received by chunks"""
+    extractor = DebridCodesExtractor()
+
+    for start in range(0, len(html_body), size):
+        extractor.feed(html_body[start : start + size])
+
+    return extractor.get_codes()
+
+
+def main(sizes: list[int]) -> None:
+    paths = {
+        "beautifulsoup": soup_debrid_codes,
+        "scanner": extract_debrid_codes,
+        "scanner (8KB chunks)": scan_by_chunks,
+        "fallback tree": parse_debrid_codes,
+    }
+
+    for links in sizes:
+        html_body = build_html_body(links)
+        print(f"{ links } link(s), { len(html_body) } bytes:")
+
+        for name, func in paths.items():
+            number = max(1, 2000 // links)
+            best = min(repeat(lambda: func(html_body), number=number, repeat=5))
+            print(f"  { name:<22} { best / number * 1e6:>10.1f} µs")
+
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [1, 10, 100])
@@ -0,0 +1,239 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch, AsyncMock, MagicMock
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from json import dumps
+
+from megadebrid.utils.stores import RedisError
+from megadebrid.utils.caches import (
+    TokenCache,
+    RedisTokenCache,
+    HostersCache,
+    LinksCache,
+    RedisLinksCache,
+    create_token_cache,
+    create_links_cache,
+)
+
+
+class TestMegaCache(IsolatedAsyncioTestCase):
+    """
+    Test the caches sharing the API token between processes
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / "mega" / "token.json"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    async def test_create_token_cache(self):
+        """
+        Test to get the file, Redis or disabled token cache
+        """
+        file_cache = create_token_cache("user", path=str(self.path))
+        redis_cache = create_token_cache(
+            "user", backend="redis", url="redis://localhost:6379"
+        )
+        none_cache = create_token_cache("user", backend="none", path=str(self.path))
+
+        self.assertIs(type(file_cache), TokenCache)
+        self.assertEqual(file_cache.path, self.path)
+        self.assertIsInstance(redis_cache, RedisTokenCache)
+        self.assertEqual(redis_cache.key, "mega:token:user")
+        self.assertIsNone(none_cache.path)
+        self.assertIsNone(await none_cache.load())
+
+    async def test_file_token_cache(self):
+        """
+        Test to save, reload and invalidate the token of the user in the cache file
+        """
+        cache = TokenCache("user", path=self.path)
+        self.assertIsNone(await cache.load())
+        self.path.parent.mkdir(parents=True)
+        self.path.with_name("token.json.tmp").write_text("")
+        self.path.with_name("token.json.tmp").chmod(0o644)
+
+        await cache.save("XXXXXXXXXXXXXXXXXXXXXXXXXX")
+        entry = await TokenCache("user", path=self.path).read()
+
+        self.assertEqual(entry["token"], "XXXXXXXXXXXXXXXXXXXXXXXXXX")
+        self.assertIn("issued_at", entry)
+        self.assertFalse(self.path.with_name("token.json.tmp").exists())
+        # Readable by the user only, even over a leftover temporary file
+        self.assertEqual(self.path.stat().st_mode & 0o777, 0o600)
+        # The token of another user isn't reused
+        self.assertIsNone(await TokenCache("other", path=self.path).load())
+
+        # A token already renewed by another process isn't dropped
+        await cache.invalidate("YYYYYYYYYYYYYYYYYYYYYYYYYY")
+        self.assertEqual(await cache.load(), "XXXXXXXXXXXXXXXXXXXXXXXXXX")
+
+        await cache.invalidate("XXXXXXXXXXXXXXXXXXXXXXXXXX")
+        self.assertIsNone(await cache.load())
+        self.assertFalse(self.path.exists())
+
+    async def test_redis_token_cache(self):
+        """
+        Test to read the token from the Redis hash and invalidate it with the compare-and-delete script
+        """
+        script = AsyncMock(return_value=1)
+        client = MagicMock(
+            hgetall=AsyncMock(
+                return_value={
+                    b"token": b"XXXXXXXXXXXXXXXXXXXXXXXXXX",
+                    b"issued_at": b"1111111111.0",
+                }
+            ),
+            register_script=MagicMock(return_value=script),
+        )
+
+        with patch("megadebrid.utils.caches.get_async_redis", return_value=client):
+            cache = RedisTokenCache("user", url="redis://localhost:6379")
+            token = await cache.load()
+            await cache.invalidate(token)
+
+        self.assertEqual(token, "XXXXXXXXXXXXXXXXXXXXXXXXXX")
+        self.assertEqual(script.await_args.kwargs["keys"], ["mega:token:user"])
+        self.assertEqual(script.await_args.kwargs["args"], [token])
+
+    async def test_redis_token_cache_unreachable(self):
+        """
+        Test to log in as without cache when Redis isn't reachable
+        """
+        client = MagicMock(
+            hgetall=AsyncMock(side_effect=RedisError("Connection refused")),
+            hset=AsyncMock(side_effect=RedisError("Connection refused")),
+        )
+
+        with patch("megadebrid.utils.caches.get_async_redis", return_value=client):
+            cache = RedisTokenCache("user", url="redis://localhost:6379")
+            await cache.save("XXXXXXXXXXXXXXXXXXXXXXXXXX")
+
+            self.assertIsNone(await cache.load())
+
+    async def test_hosters_cache(self):
+        """
+        Test to serve the hosters list from memory, then from the on-disk snapshot in a new process
+        """
+        response = {"response_code": "ok", "response_text": "", "hosters": []}
+        fetch = AsyncMock(return_value=response)
+
+        cache = HostersCache(ttl=3600, path=self.path)
+        self.assertEqual(await cache.get(fetch), response)
+        self.assertEqual(await cache.get(fetch), response)
+        fetch.assert_awaited_once()
+
+        # New process: the snapshot is served without network call
+        self.assertEqual(
+            await HostersCache(ttl=3600, path=self.path).get(fetch), response
+        )
+        fetch.assert_awaited_once()
+
+        # Errors aren't cached
+        error = {"response_code": "ko", "response_text": "Maintenance"}
+        self.assertEqual(
+            await HostersCache(ttl=3600).get(AsyncMock(return_value=error)), error
+        )
+
+    async def test_hosters_cache_stale(self):
+        """
+        Test to serve the expired hosters list right away while one background task refreshes it
+        """
+        stale = {"response_code": "ok", "hosters": [{"name": "acast"}]}
+        fresh = {"response_code": "ok", "hosters": [{"name": "1fichier"}]}
+        fetch = AsyncMock(return_value=fresh)
+
+        cache = HostersCache(ttl=3600, path=self.path)
+        cache.response, cache.fetched_at = stale, 0.0
+
+        responses = [await cache.get(fetch) for _ in range(3)]
+        await cache.wait_refresh()
+
+        self.assertEqual(responses, [stale] * 3)
+        fetch.assert_awaited_once()
+        self.assertEqual(await cache.get(fetch), fresh)
+        self.assertEqual(await HostersCache(ttl=3600, path=self.path).get(fetch), fresh)
+
+    async def test_hosters_cache_refresh_failure(self):
+        """
+        Test to keep serving the expired hosters list when its refresh fails
+        """
+        stale = {"response_code": "ok", "hosters": []}
+        fetch = AsyncMock(side_effect=OSError("Network is unreachable"))
+
+        cache = HostersCache(ttl=3600)
+        cache.response, cache.fetched_at = stale, 0.0
+
+        self.assertEqual(await cache.get(fetch), stale)
+        await cache.wait_refresh()
+        self.assertEqual(await cache.get(fetch), stale)
+
+    async def test_create_links_cache(self):
+        """
+        Test to get the in-memory or the Redis links cache shared in the process
+        """
+        memory_cache = create_links_cache(3600, size=2)
+        redis_cache = create_links_cache(
+            3600, size=2, backend="redis", url="redis://localhost:6379"
+        )
+
+        self.assertIs(type(memory_cache), LinksCache)
+        self.assertIs(create_links_cache(3600, size=2), memory_cache)
+        self.assertIsInstance(redis_cache, RedisLinksCache)
+        self.assertFalse(create_links_cache(0, size=2).enabled)
+
+    async def test_links_cache(self):
+        """
+        Test to cache the debrid links by link and password hash, with LRU eviction and expiration
+        """
+        response = {"response_code": "ok", "debridLink": "https://unrestrict.link/1"}
+        cache = LinksCache(ttl=3600, size=2)
+
+        await cache.set("https://1fichier.com/?a", "", response)
+        await cache.set("https://1fichier.com/?b", "", response)
+        await cache.set("https://1fichier.com/?c", "", {"response_code": "ko"})
+
+        self.assertEqual(await cache.get("https://1fichier.com/?a", ""), response)
+        self.assertIsNone(await cache.get("https://1fichier.com/?a", "5f4dcc3b"))
+        self.assertIsNone(await cache.get("https://1fichier.com/?c", ""))
+
+        # '?a' was used more recently than '?b': '?b' is evicted
+        await cache.set("https://1fichier.com/?d", "", response)
+        self.assertIsNone(await cache.get("https://1fichier.com/?b", ""))
+        self.assertEqual(await cache.get("https://1fichier.com/?a", ""), response)
+
+        await cache.invalidate("https://1fichier.com/?a", "")
+        self.assertIsNone(await cache.get("https://1fichier.com/?a", ""))
+
+        with patch("megadebrid.utils.caches.monotonic", return_value=float("inf")):
+            self.assertIsNone(await cache.get("https://1fichier.com/?d", ""))
+
+        self.assertEqual(cache.stats, {"hits": 2, "misses": 5})
+
+    async def test_redis_links_cache(self):
+        """
+        Test to share the debrid links in Redis with its expiration, and the in-memory fallback
+        """
+        response = {"response_code": "ok", "debridLink": "https://unrestrict.link/1"}
+        client = MagicMock(
+            get=AsyncMock(return_value=None), set=AsyncMock(), delete=AsyncMock()
+        )
+
+        with patch("megadebrid.utils.caches.get_async_redis", return_value=client):
+            cache = RedisLinksCache(ttl=3600, size=2, url="redis://localhost:6379")
+            self.assertIsNone(await cache.get("https://1fichier.com/?a", ""))
+            await cache.set("https://1fichier.com/?a", "", response)
+
+        key = f"mega:link:{ cache.make_key('https://1fichier.com/?a', '') }"
+        client.set.assert_awaited_once_with(key, dumps(response), ex=3600)
+
+        client.get = AsyncMock(side_effect=RedisError("Connection refused"))
+        client.set = AsyncMock(side_effect=RedisError("Connection refused"))
+
+        with patch("megadebrid.utils.caches.get_async_redis", return_value=client):
+            await cache.set("https://1fichier.com/?a", "", response)
+            self.assertEqual(await cache.get("https://1fichier.com/?a", ""), response)
@@ -47,14 +47,14 @@ class TestMegaCli(IsolatedAsyncioTestCase):
             "cli_args": ["ajax", "torrent-status", "--id", "12345"],
             "object": MegaDebridAjax,
             "func_mocked": "get_torrent_status",
-            "expected_kwargs": {"torrent_id": "12345"},
+            "expected_kwargs": {"torrent_id": ["12345"], "batch_size": 50},
         },
         {
             # Command alias: ajax_torrent_status
-            "cli_args": ["ajax", "status", "-i", "12345"],
+            "cli_args": ["ajax", "status", "-i", "12345", "67890", "--batch-size", "1"],
             "object": MegaDebridAjax,
             "func_mocked": "get_torrent_status",
-            "expected_kwargs": {"torrent_id": "12345"},
+            "expected_kwargs": {"torrent_id": ["12345", "67890"], "batch_size": 1},
         },
         {
             # Command name: ajax_upload_magnet
@@ -227,6 +227,20 @@ class TestMegaCli(IsolatedAsyncioTestCase):
             "func_mocked": "get_hosters_list",
             "expected_kwargs": {},
         },
+        {
+            # Command name: api_hoster
+            "cli_args": ["api", "hoster", "https://1fichier.com/?abcdefghij"],
+            "object": MegaDebridApi,
+            "func_mocked": "get_hoster",
+            "expected_kwargs": {"link": "https://1fichier.com/?abcdefghij"},
+        },
+        {
+            # Command alias: api_hoster
+            "cli_args": ["api", "supported", "https://1fichier.com/?abcdefghij"],
+            "object": MegaDebridApi,
+            "func_mocked": "get_hoster",
+            "expected_kwargs": {"link": "https://1fichier.com/?abcdefghij"},
+        },
         {
             # Command name: api_torrents_list
             "cli_args": ["api", "my-torrents"],
@@ -326,6 +340,48 @@ class TestMegaCli(IsolatedAsyncioTestCase):
                 "&tr=udp%3A%2F%2Ftracker.torrent.eu.org%3A451%2Fannounce"
             },
         },
+        {
+            # Command name: api_upload_magnets
+            "cli_args": [
+                "api",
+                "upload-magnets",
+                "--from-file",
+                "tests/magnets.txt",
+            ],
+            "object": MegaDebridApi,
+            "func_mocked": "upload_magnets",
+            "expected_kwargs": {
+                "magnets": [
+                    "magnet:?xt=urn:btih:fb72d751bcc437746583c298ce395b84f3089e8f"
+                    "&dn=Rick.and.Morty.S06E01.WEBRip.mp4",
+                    "magnet:?xt=urn:btih:0c5d9c5ec1f3a5e4c2e3f4a6b7c8d9e0f1a2b3c4"
+                    "&dn=Rick.and.Morty.S06E02.WEBRip.mp4",
+                ],
+                "concurrency": 8,
+            },
+        },
+        {
+            # Command alias: api_upload_magnets
+            "cli_args": [
+                "api",
+                "magnets",
+                "-f",
+                "tests/magnets.txt",
+                "-c",
+                "2",
+            ],
+            "object": MegaDebridApi,
+            "func_mocked": "upload_magnets",
+            "expected_kwargs": {
+                "magnets": [
+                    "magnet:?xt=urn:btih:fb72d751bcc437746583c298ce395b84f3089e8f"
+                    "&dn=Rick.and.Morty.S06E01.WEBRip.mp4",
+                    "magnet:?xt=urn:btih:0c5d9c5ec1f3a5e4c2e3f4a6b7c8d9e0f1a2b3c4"
+                    "&dn=Rick.and.Morty.S06E02.WEBRip.mp4",
+                ],
+                "concurrency": 2,
+            },
+        },
         {
             # Command name: api_upload_torrent
             "cli_args": [
@@ -352,6 +408,24 @@ class TestMegaCli(IsolatedAsyncioTestCase):
                 "torrent": Path("/tmp/Rick.and.Morty.S06E01.WEBRip.mp4.torrent")
             },
         },
+        {
+            # Command name: api_upload_torrents
+            "cli_args": [
+                "api",
+                "upload-torrents",
+                "/tmp/Rick.and.Morty.S06E01.WEBRip.mp4.torrent",
+                "/tmp/Rick.and.Morty.S06E02.WEBRip.mp4.torrent",
+            ],
+            "object": MegaDebridApi,
+            "func_mocked": "upload_torrents",
+            "expected_kwargs": {
+                "torrents": [
+                    Path("/tmp/Rick.and.Morty.S06E01.WEBRip.mp4.torrent"),
+                    Path("/tmp/Rick.and.Morty.S06E02.WEBRip.mp4.torrent"),
+                ],
+                "concurrency": 8,
+            },
+        },
         {
             # Command name: api_debrid_link
             "cli_args": [
@@ -364,6 +438,7 @@ class TestMegaCli(IsolatedAsyncioTestCase):
             "expected_kwargs": {
                 "link": "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA",
                 "password": None,
+                "cache": True,
             },
         },
         {
@@ -374,16 +449,23 @@ class TestMegaCli(IsolatedAsyncioTestCase):
             "expected_kwargs": {
                 "link": "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA",
                 "password": None,
+                "cache": True,
             },
         },
         {
             # Command alias 2: api_debrid_link
-            "cli_args": ["api", "link", "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA"],
+            "cli_args": [
+                "api",
+                "link",
+                "--no-cache",
+                "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA",
+            ],
             "object": MegaDebridApi,
             "func_mocked": "debrid_link",
             "expected_kwargs": {
                 "link": "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA",
                 "password": None,
+                "cache": False,
             },
         },
         # MegaDebridFlow
@@ -400,6 +482,7 @@ class TestMegaCli(IsolatedAsyncioTestCase):
             "expected_kwargs": {
                 "torrent_hash": "fb72d751bcc437746583c298ce395b84f3089e8f",
                 "second": 3,
+                "max_second": 60,
             },
         },
         {
@@ -415,6 +498,27 @@ class TestMegaCli(IsolatedAsyncioTestCase):
             "expected_kwargs": {
                 "torrent_hash": "fb72d751bcc437746583c298ce395b84f3089e8f",
                 "second": 3,
+                "max_second": 60,
+            },
+        },
+        {
+            # Command name: flow_wait_complete
+            "cli_args": [
+                "flow",
+                "wait",
+                "--hash",
+                "fb72d751bcc437746583c298ce395b84f3089e8f",
+                "--second",
+                "1",
+                "--max-second",
+                "30",
+            ],
+            "object": MegaDebridFlow,
+            "func_mocked": "wait_until_complete",
+            "expected_kwargs": {
+                "torrent_hash": "fb72d751bcc437746583c298ce395b84f3089e8f",
+                "second": 1,
+                "max_second": 30,
             },
         },
         {
@@ -434,6 +538,7 @@ class TestMegaCli(IsolatedAsyncioTestCase):
                 "filename": None,
                 "chunk_size": 1024 * 1024 * 10,
                 "progress_bar": None,
+                "segments": 1,
             },
         },
         {
@@ -453,6 +558,29 @@ class TestMegaCli(IsolatedAsyncioTestCase):
                 "filename": None,
                 "chunk_size": 1024 * 1024 * 10,
                 "progress_bar": None,
+                "segments": 1,
+            },
+        },
+        {
+            # Command alias with segments: flow_save_file
+            "cli_args": [
+                "flow",
+                "save",
+                "--folder",
+                "/tmp/downloads",
+                "--segments",
+                "8",
+                "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png",
+            ],
+            "object": MegaDebridFlow,
+            "func_mocked": "save_file",
+            "expected_kwargs": {
+                "url": "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png",
+                "folder": Path("/tmp/downloads"),
+                "filename": None,
+                "chunk_size": 1024 * 1024 * 10,
+                "progress_bar": None,
+                "segments": 8,
             },
         },
         {
@@ -472,6 +600,8 @@ class TestMegaCli(IsolatedAsyncioTestCase):
                 "password": None,
                 "chunk_size": 1024 * 1024 * 10,
                 "progress_bar": None,
+                "segments": 1,
+                "cache": True,
             },
         },
         {
@@ -491,6 +621,8 @@ class TestMegaCli(IsolatedAsyncioTestCase):
                 "password": None,
                 "chunk_size": 1024 * 1024 * 10,
                 "progress_bar": None,
+                "segments": 1,
+                "cache": True,
             },
         },
         {
@@ -510,6 +642,38 @@ class TestMegaCli(IsolatedAsyncioTestCase):
                 "password": None,
                 "chunk_size": 1024 * 1024 * 10,
                 "progress_bar": None,
+                "segments": 1,
+                "cache": True,
+            },
+        },
+        {
+            # Command name: flow_debrid_and_save_many
+            "cli_args": [
+                "flow",
+                "download-many",
+                "--from-file",
+                "tests/links.txt",
+                "-F",
+                "/tmp/downloads",
+                "--concurrency",
+                "3",
+                "--prefetch",
+                "6",
+            ],
+            "object": MegaDebridFlow,
+            "func_mocked": "debrid_and_save_many",
+            "expected_kwargs": {
+                "links": [
+                    "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA",
+                    "https://1fichier.com/?BBBBBBBBBBBBBBBBBBBB",
+                ],
+                "folder": Path("/tmp/downloads"),
+                "password": None,
+                "concurrency": 3,
+                "prefetch": 6,
+                "chunk_size": 1024 * 1024 * 10,
+                "segments": 1,
+                "cache": True,
             },
         },
         {
@@ -607,6 +771,22 @@ class TestMegaCli(IsolatedAsyncioTestCase):
         self.parser = MegaArgParser.create_parser()
         self.MegaCLI = import_module("mega-cli").MegaCLI
 
+    @patch("sys.stderr")
+    async def test_megacli_unreadable_file(self, mocked_stderr):
+        """
+        Test that a bulk command given a file which can't be read exits with a usage error
+        """
+        with self.assertRaises(SystemExit) as context:
+            self.parser.parse_args(
+                ["api", "upload-magnets", "-f", "/nonexistent/magnets.txt"]
+            )
+
+        self.assertEqual(context.exception.code, 2)
+        self.assertIn(
+            "can't read '/nonexistent/magnets.txt'",
+            "".join(call.args[0] for call in mocked_stderr.write.call_args_list),
+        )
+
     @patch("megadebrid.parsers.argparser.MegaArgParser.parse_args")
     async def test_megacli_commands(self, mocked_parse_args):
         """
@@ -1,8 +1,10 @@
+import asyncio
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import patch, mock_open
+from unittest.mock import patch, mock_open, AsyncMock
 from aioresponses import aioresponses
 
 from megadebrid.libs.api import MegaDebridApi
+from megadebrid.utils.limiters import TokenBucket
 
 
 @patch(
@@ -57,3 +59,113 @@ class TestMegaDecorator(IsolatedAsyncioTestCase):
 
         self.assertEqual(response["response_code"], "ok")
         self.assertIsInstance(response["history"], list)
+
+    @aioresponses()
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    async def test_rate_limited(self, mocked, mocked_sleep):
+        """
+        Test to perform more actions on Mega-Debrid API than allowed by the limiter burst.
+        decorator: @rate_limited is involked
+        """
+        mocked.add(
+            method="GET",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getUserHistory&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={"response_code": "ok", "response_text": "", "history": []},
+            repeat=True,
+        )
+
+        # Frozen clock: the time spent by the mocked requests doesn't refill the bucket
+        with patch("megadebrid.utils.limiters.monotonic", return_value=1000.0):
+            async with MegaDebridApi() as megadebrid:
+                megadebrid.limiter = TokenBucket(rate=10, burst=2)
+
+                for _ in range(4):
+                    await megadebrid.get_user_history()
+
+        # 2 requests in the burst, then 1 request each 0.1 second
+        self.assertEqual(mocked_sleep.await_count, 2)
+        self.assertAlmostEqual(mocked_sleep.await_args_list[0].args[0], 0.1, places=2)
+        self.assertAlmostEqual(mocked_sleep.await_args_list[1].args[0], 0.2, places=2)
+        self.assertEqual(megadebrid.rate_limit_stats["api"]["calls"], 4)
+        self.assertEqual(megadebrid.rate_limit_stats["api"]["delayed"], 2)
+
+    @patch("asyncio.sleep", new_callable=AsyncMock)
+    async def test_rate_limited_refill(self, mocked_sleep):
+        """
+        Test that the limiter bucket refills with the (mocked) elapsed time, not the real one.
+        """
+        with patch("megadebrid.utils.limiters.monotonic") as mocked_monotonic:
+            mocked_monotonic.return_value = 1000.0
+            limiter = TokenBucket(rate=10, burst=2)
+
+            for _ in range(3):
+                await limiter.acquire()
+
+            # 0.5 second later: 5 tokens refilled, but the bucket holds 2 at most
+            mocked_monotonic.return_value = 1000.5
+            self.assertEqual(await limiter.acquire(), 0.0)
+            self.assertEqual(await limiter.acquire(), 0.0)
+            self.assertAlmostEqual(await limiter.acquire(), 0.1, places=2)
+
+        self.assertEqual(mocked_sleep.await_count, 2)
+        self.assertEqual(limiter.stats["calls"], 6)
+        self.assertEqual(limiter.stats["delayed"], 2)
+
+    @aioresponses()
+    async def test_renew_token_single_flight(self, mocked):
+        """
+        Test to perform concurrent actions on Mega-Debrid API while token is exprired:
+        only one re-authentication is done, the other requests wait and use the new token.
+        decorator: @renew_obsolete_token is involked
+        """
+        mocked.add(
+            method="GET",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getUserHistory&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={
+                "response_code": "TOKEN_ERROR",
+                "response_text": "Token error, please log-in",
+            },
+            repeat=True,
+        )
+        mocked.add(
+            method="GET",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=connectUser&login=user&password=password",
+            content_type="text/html; charset=UTF-8",
+            payload={
+                "response_code": "ok",
+                "response_text": "User logged",
+                "token": "YYYYYYYYYYYYYYYYYYYYYYYYYY",
+                "vip_end": "1111111111",
+                "email": "user@example.com",
+            },
+            repeat=True,
+        )
+        mocked.add(
+            method="GET",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getUserHistory&token=YYYYYYYYYYYYYYYYYYYYYYYYYY",
+            content_type="text/html; charset=UTF-8",
+            payload={"response_code": "ok", "response_text": "", "history": []},
+            repeat=True,
+        )
+
+        async with MegaDebridApi() as megadebrid:
+            responses = await asyncio.gather(
+                *(megadebrid.get_user_history() for _ in range(10))
+            )
+
+        self.assertTrue(all(r["response_code"] == "ok" for r in responses))
+        self.assertEqual(megadebrid.token_renewals, 1)
+        self.assertEqual(
+            sum(
+                len(calls)
+                for (_, url), calls in mocked.requests.items()
+                if url.query.get("action") == "connectUser"
+            ),
+            1,
+        )
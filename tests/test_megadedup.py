@@ -0,0 +1,212 @@
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+from hashlib import sha1
+from base64 import b32encode
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from megadebrid.utils.stores import RedisError
+from megadebrid.worker.dedup import (
+    RedisTaskIndex,
+    TaskIndex,
+    canonical_link,
+    magnet_infohash,
+    task_key,
+    torrent_file_identity,
+    torrent_infohash,
+)
+from megadebrid.worker.tasks import get_task_key, save_file, submit_task
+
+
+class TestMegaDedup(TestCase):
+    """
+    Test the canonical keys of the tasks and their index used to deduplicate the submissions
+    """
+
+    INFO = (
+        b"d6:lengthi1024e4:name32:Rick.and.Morty.S06E01.WEBRip.mp4"
+        b"12:piece lengthi16384e6:pieces20:" + b"\x01" * 20 + b"e"
+    )
+    TORRENT = (
+        b"d8:announce39:http://example.tracker.wf:7777/announce"
+        b"13:announce-listll39:http://example.tracker.wf:7777/announceee"
+        b"4:info" + INFO + b"e"
+    )
+
+    def test_canonical_link(self):
+        """Test that the spellings of the same link have the same canonical form"""
+        self.assertEqual(
+            canonical_link(" HTTPS://1Fichier.com:443/?AAAAAAAAAAAAAAAAAAAA#top "),
+            "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA",
+        )
+        self.assertEqual(
+            canonical_link("http://example.com:8080"), "http://example.com:8080/"
+        )
+        # The query identifies the file on most hosters: kept as is
+        self.assertNotEqual(
+            canonical_link("https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA"),
+            canonical_link("https://1fichier.com/?aaaaaaaaaaaaaaaaaaaa"),
+        )
+
+    def test_magnet_infohash(self):
+        """Test that the hexadecimal and base32 infohashes of a magnet are the same key"""
+        infohash = "fb72d751bcc437746583c298ce395b84f3089e8f"
+        base32 = b32encode(bytes.fromhex(infohash)).decode()
+
+        self.assertEqual(
+            magnet_infohash(f"magnet:?xt=urn:btih:{ infohash.upper() }&dn=file"),
+            infohash,
+        )
+        self.assertEqual(
+            magnet_infohash(f"magnet:?xt=urn:btih:{ base32 }&tr=udp://tracker"),
+            infohash,
+        )
+
+    def test_torrent_infohash(self):
+        """Test that the infohash of a torrent is the SHA-1 of its 'info' dictionary"""
+        self.assertEqual(torrent_infohash(self.TORRENT), sha1(self.INFO).hexdigest())
+
+        with self.assertRaises(ValueError):
+            torrent_infohash(b"d8:announce3:urle")
+
+        with self.assertRaises(ValueError):
+            torrent_infohash(b"<html></html>")
+
+        with TemporaryDirectory() as folder:
+            torrent_path = Path(folder) / "file.torrent"
+            torrent_path.write_bytes(self.TORRENT)
+
+            self.assertEqual(
+                torrent_file_identity(str(torrent_path)), sha1(self.INFO).hexdigest()
+            )
+            # Not readable here: identified by its path
+            self.assertEqual(
+                torrent_file_identity(f"{ folder }/missing.torrent"),
+                f"path:{ folder }/missing.torrent",
+            )
+
+    def test_task_key(self):
+        """Test that the same work saved in the same folder has the same key"""
+        link = "https://1fichier.com/?AAAAAAAAAAAAAAAAAAAA"
+
+        self.assertEqual(
+            task_key("debrid_and_save_file", {"link": link, "folder": "/tmp"}),
+            task_key(
+                "debrid_and_save_file",
+                {
+                    "link": "HTTPS://1FICHIER.COM/?AAAAAAAAAAAAAAAAAAAA#",
+                    "folder": "/tmp/",
+                },
+            ),
+        )
+        self.assertNotEqual(
+            task_key("debrid_and_save_file", {"link": link, "folder": "/tmp"}),
+            task_key("debrid_and_save_file", {"link": link, "folder": "/srv"}),
+        )
+        self.assertNotEqual(
+            task_key("debrid_and_save_file", {"link": link, "folder": "/tmp"}),
+            task_key("save_file", {"url": link, "folder": "/tmp"}),
+        )
+        # The links of a batch in any order
+        self.assertEqual(
+            task_key(
+                "debrid_and_save_batch",
+                {"links": f"{ link }\nhttps://1fichier.com/?B", "folder": "/tmp"},
+            ),
+            task_key(
+                "debrid_and_save_batch",
+                {"links": ["https://1fichier.com/?B", link, link], "folder": "/tmp"},
+            ),
+        )
+        # Not identifiable: never deduplicated
+        self.assertIsNone(task_key("download_magnet", {"folder": "/tmp"}))
+        self.assertIsNone(task_key("unknown_task", {"link": link}))
+
+    @patch("megadebrid.worker.dedup.monotonic")
+    def test_task_index(self, mocked_monotonic):
+        """Test that a key answers with the first task until it expires or is released"""
+        mocked_monotonic.return_value = 1000.0
+        index = TaskIndex(window=60)
+
+        self.assertEqual(index.claim("key", "task-1"), "task-1")
+        self.assertEqual(index.claim("key", "task-2"), "task-1")
+        self.assertEqual(index.get("key"), "task-1")
+
+        # Only the indexed task releases the key
+        index.release("key", "task-2")
+        self.assertEqual(index.get("key"), "task-1")
+        index.release("key", "task-1")
+        self.assertIsNone(index.get("key"))
+        self.assertEqual(index.claim("key", "task-2"), "task-2")
+
+        # Out of the dedup window
+        mocked_monotonic.return_value = 1061.0
+        self.assertIsNone(index.get("key"))
+        self.assertEqual(index.claim("key", "task-3"), "task-3")
+
+        # Disabled
+        self.assertEqual(TaskIndex(window=0).claim("key", "task-4"), "task-4")
+
+    @patch("megadebrid.worker.dedup.monotonic")
+    @patch("megadebrid.worker.tasks.celery_app.AsyncResult")
+    def test_submit_task(self, mocked_async_result, mocked_monotonic):
+        """Test that a task PENDING for longer than the timeout no longer answers its work"""
+        mocked_monotonic.return_value = 1000.0
+        kwargs = {"url": "https://1fichier.com/?xxxxxxxxxxxx", "folder": "/tmp"}
+        index = TaskIndex(window=86400, pending_timeout=600)
+
+        with patch("megadebrid.worker.tasks.task_index", index), patch.object(
+            save_file,
+            "delay",
+            side_effect=[MagicMock(id="task-1"), MagicMock(id="task-2")],
+        ):
+            self.assertEqual(submit_task(save_file, **kwargs), ("task-1", False))
+
+            # Queued recently: waiting for a worker
+            mocked_monotonic.return_value = 1100.0
+            mocked_async_result.return_value.status = "PENDING"
+            self.assertEqual(index.age(get_task_key(save_file, kwargs=kwargs)), 100.0)
+            self.assertEqual(submit_task(save_file, **kwargs), ("task-1", True))
+
+            # Never seen by a worker: unknown or lost, replaced
+            mocked_monotonic.return_value = 1700.0
+            self.assertEqual(submit_task(save_file, **kwargs), ("task-2", False))
+
+            mocked_async_result.return_value.status = "STARTED"
+            self.assertEqual(submit_task(save_file, **kwargs), ("task-2", True))
+
+    @patch("megadebrid.worker.tasks.run_flow", return_value="/tmp/file.png")
+    @patch("megadebrid.worker.tasks.celery_app.AsyncResult")
+    def test_duplicate_task_ignored(self, mocked_async_result, mocked_run_flow):
+        """Test that a duplicate queued without submit_task is ignored while the indexed task answers its work"""
+        kwargs = {"url": "https://1fichier.com/?xxxxxxxxxxxx", "folder": "/tmp"}
+        key = get_task_key(save_file, kwargs=kwargs)
+        index = TaskIndex(window=86400)
+        index.claim(key, "task-1")
+
+        with patch("megadebrid.worker.tasks.task_index", index):
+            mocked_async_result.return_value.status = "STARTED"
+            result = save_file.apply(kwargs=kwargs)
+
+            self.assertEqual(result.state, "IGNORED")
+            mocked_run_flow.assert_not_called()
+            self.assertEqual(index.get(key), "task-1")
+
+            # The indexed task failed: the duplicate runs and replaces it
+            mocked_async_result.return_value.status = "FAILURE"
+            result = save_file.apply(kwargs=kwargs)
+
+            self.assertEqual(result.state, "SUCCESS")
+            mocked_run_flow.assert_called_once()
+            self.assertEqual(index.get(key), result.id)
+
+    @patch("megadebrid.worker.dedup.get_redis", side_effect=RedisError("unreachable"))
+    def test_redis_task_index_fallback(self, mocked_get_redis):
+        """Test that the index keeps deduplicating in memory while Redis is unreachable"""
+        index = RedisTaskIndex(window=60, url="redis://localhost:6379")
+
+        self.assertEqual(index.claim("key", "task-1"), "task-1")
+        self.assertEqual(index.claim("key", "task-2"), "task-1")
+        self.assertEqual(index.get("key"), "task-1")
+        index.release("key", "task-1")
+        self.assertIsNone(index.get("key"))
@@ -0,0 +1,73 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from megadebrid.utils.extractors import (
+    DebridCodesExtractor,
+    extract_debrid_codes,
+    parse_debrid_codes,
+)
+
+
+class TestMegaExtractor(TestCase):
+    """
+    Test the extraction of the debrid codes from the 'xhr_debrid' HTML
+    """
+
+    HTML_BODY = (
+        b"\n<div id='' class='acp-box col-md-6 card'><h3> <span class='title'>https://1fichier.com/?AAAA</span>"
+        b"</h3><div class='span-debrid'><span id='debrid_0' align='center' data-code='30561724716e3ec' data-i='0'>"
+        b"<button class='btn btn-primary'><i class='fa fa-play'></i></button></span></div></div>"
+        b"\n<div id='' class='acp-box col-md-6 card'><h3> <span class='title'>https://1fichier.com/?BBBB</span>"
+        b'</h3><div class="span-debrid"><span data-i="1" data-code="40561724716e3ed" id="debrid_1">'
+        b"<button class='btn btn-primary'><i class='fa fa-play'></i></button></span></div></div>"
+    )
+
+    def test_extract_debrid_codes(self):
+        """
+        Test to extract the codes of all the links, whatever the order of the attributes and the quotes
+        """
+        self.assertEqual(
+            extract_debrid_codes(self.HTML_BODY),
+            ["30561724716e3ec", "40561724716e3ed"],
+        )
+        self.assertEqual(extract_debrid_codes(b"<div>Maintenance</div>"), [])
+
+    def test_extract_debrid_codes_data_id(self):
+        """
+        Test to ignore the attributes ending with 'id', such as 'data-id'
+        """
+        html_body = (
+            b"<span data-id='debrid_3' data-code='decoy'></span>"
+            b"<span data-id=\"debrid_4\" id='debrid_0' data-code='30561724716e3ec'></span>"
+        )
+        self.assertEqual(extract_debrid_codes(html_body), ["30561724716e3ec"])
+        self.assertEqual(parse_debrid_codes(html_body), ["30561724716e3ec"])
+
+    def test_extract_debrid_codes_by_chunks(self):
+        """
+        Test to extract the codes when the tags are split between the received chunks
+        """
+        for size in (1, 7, 64):
+            extractor = DebridCodesExtractor()
+
+            for start in range(0, len(self.HTML_BODY), size):
+                extractor.feed(self.HTML_BODY[start : start + size])
+
+            self.assertEqual(
+                extractor.get_codes(), ["30561724716e3ec", "40561724716e3ed"]
+            )
+
+    def test_parse_debrid_codes(self):
+        """
+        Test the fallback parsing of the document tree, with lxml or BeautifulSoup
+        """
+        self.assertEqual(
+            parse_debrid_codes(self.HTML_BODY), ["30561724716e3ec", "40561724716e3ed"]
+        )
+
+        with patch("megadebrid.utils.extractors.lxml_html", None):
+            self.assertEqual(
+                parse_debrid_codes(self.HTML_BODY),
+                ["30561724716e3ec", "40561724716e3ed"],
+            )
+            self.assertEqual(parse_debrid_codes(b""), [])
@@ -3,6 +3,8 @@ from unittest.mock import patch, mock_open
 from aioresponses import aioresponses
 from random import randbytes, randint
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from yarl import URL
 
 from megadebrid.libs.ajax import MegaDebridAjax
 
@@ -120,7 +122,49 @@ class TestMegaDebridAjax(IsolatedAsyncioTestCase):
         self.assertEqual(response["response_code"], "ok")
         self.assertIsInstance(response["torrents"], dict)
         self.assertEqual(list(response["torrents"].keys())[0], torrent_id)
-        # test torrents_id = ['XXXX', 'XXXX']
+
+    @aioresponses()
+    async def test_get_torrents_status(self, mocked):
+        """
+        Test to get the current status of many torrents by batches of IDs
+        """
+        torrent_ids = [str(58545 + i) for i in range(5)]
+
+        for start in range(0, len(torrent_ids), 2):
+            mocked.add(
+                method="POST",
+                url="https://www.mega-debrid.eu/?ajax=statusTorrent",
+                status=200,
+                content_type="text/html; charset=UTF-8",
+                payload={
+                    "response_code": "ok",
+                    "torrents": {
+                        torrent_id: {"state": "downloading", "progress": 12.62}
+                        for torrent_id in torrent_ids[start : start + 2]
+                    },
+                },
+            )
+
+        async with MegaDebridAjax() as megadebrid:
+            response = await megadebrid.get_torrent_status(torrent_ids, batch_size=2)
+
+        self.assertEqual(response["response_code"], "ok")
+        self.assertCountEqual(response["torrents"].keys(), torrent_ids)
+
+        # 3 requests, each one with an array of at most 2 IDs
+        calls = mocked.requests[
+            ("POST", URL("https://www.mega-debrid.eu/?ajax=statusTorrent"))
+        ]
+        self.assertEqual(len(calls), 3)
+        self.assertCountEqual(
+            [torrent_id for call in calls for _, torrent_id in call.kwargs["data"]],
+            torrent_ids,
+        )
+        self.assertTrue(
+            all(
+                key == "torrentId[]" for call in calls for key, _ in call.kwargs["data"]
+            )
+        )
 
     @aioresponses()
     async def test_upload_magnet(self, mocked):
@@ -170,12 +214,14 @@ class TestMegaDebridAjax(IsolatedAsyncioTestCase):
             self.assertEqual(response["error"], "Torrent duplicate")
 
     @aioresponses()
-    @patch("builtins.open", new_callable=mock_open, read_data=randbytes(1024 * 10))
-    async def test_upload_torrent(self, mocked, mocked_open):
+    async def test_upload_torrent(self, mocked):
         """
         Test to upload a torrent file on Mega-Debrid account
         """
-        torrent_path = Path("/tmp/Rick.and.Morty.S06E01.WEBRip.mp4.torrent")
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        torrent_path = Path(tmp_dir.name) / "Rick.and.Morty.S06E01.WEBRip.mp4.torrent"
+        torrent_path.write_bytes(randbytes(1024 * 10))
 
         # It's possible to POST multiples time the same torrent, it will return the same response and
         # add it multiples time to the torrents list
@@ -265,3 +311,57 @@ class TestMegaDebridAjax(IsolatedAsyncioTestCase):
         self.assertIn(
             "http://www.mega-debrid.eu/index.php?page=streaming&id=", response["video"]
         )
+
+    @aioresponses()
+    async def test_debrid_links(self, mocked):
+        """
+        Test to debrid several links at once: one code per link, each one debrided
+        """
+        links = [
+            "https://1fichier.com/?CCCCCCCCCCCCCCCCCCCC",
+            "https://1fichier.com/?DDDDDDDDDDDDDDDDDDDD",
+        ]
+
+        mocked.add(
+            method="POST",
+            url="https://www.mega-debrid.eu/?ajax=xhr_debrid&onlyLinks=false",
+            status=200,
+            content_type="text/html; charset=UTF-8",
+            body="".join(
+                f"\n<div id='' class='acp-box col-md-6 card'><h3> <span class='title'>{ link }</span></h3>"
+                f"<div class='span-debrid'><span id='debrid_{ i }' align='center' data-code='3056172471{ i }' data-i='{ i }'>"
+                f"<button class='btn btn-primary'><i class='fa fa-play'></i></button></span></div></div>"
+                for i, link in enumerate(links)
+            ),
+        )
+
+        for i in range(len(links)):
+            mocked.add(
+                method="POST",
+                url="https://www.mega-debrid.eu/?ajax=debrid&json=1",
+                status=200,
+                content_type="text/html; charset=UTF-8",
+                payload={
+                    "text": "Download my file",
+                    "link": f"https://www{ self.nb }.unrestrict.link/download/file/3056172471{ i }/My_File.mkv",
+                    "video": f"http://www.mega-debrid.eu/index.php?page=streaming&id=3056172471{ i }",
+                    "autoDl": True,
+                },
+            )
+
+        async with MegaDebridAjax() as megadebrid:
+            responses = await megadebrid.debrid_links(links)
+
+        self.assertEqual(len(responses), 2)
+
+        for response in responses:
+            self.assertIn("unrestrict.link/download/file/", response["link"])
+
+        # The codes of both links were sent to 'ajax=debrid'
+        debrid_calls = [
+            call.kwargs["data"]["code"]
+            for (method, url), calls in mocked.requests.items()
+            if url.query.get("ajax") == "debrid"
+            for call in calls
+        ]
+        self.assertCountEqual(debrid_calls, ["30561724710", "30561724711"])
@@ -1,10 +1,13 @@
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch, mock_open
+from aiohttp import ClientConnectionError
 from aioresponses import aioresponses
 from random import randbytes, randint
 from pathlib import Path
+from tempfile import TemporaryDirectory
 
 from megadebrid.libs.api import MegaDebridApi
+from megadebrid.utils.caches import LinksCache
 
 
 @patch(
@@ -194,6 +197,42 @@ class TestMegaDebridApi(IsolatedAsyncioTestCase):
         self.assertIsNotNone(response["hosters"])
         self.assertIsInstance(response["hosters"], list)
 
+    @aioresponses()
+    async def test_get_hoster(self, mocked):
+        """
+        Test to get the hoster supporting a link from the Mega-Debrid hosters list
+        """
+
+        mocked.add(
+            method="GET",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getHostersList",
+            content_type="text/html; charset=UTF-8",
+            payload={
+                "response_code": "ok",
+                "response_text": "",
+                "hosters": [
+                    {
+                        "name": "1fichier",
+                        "url": "1fichier",
+                        "img": "https://cdn.mega-debrid.eu/images/hosts/1fichier.png",
+                        "domains": ["1fichier.com", "alterupload.com"],
+                        "status": "up",
+                        "regexps": ["#http[s]*?://[www.]*?1fichier.com/.*?#msi"],
+                        "type": "host",
+                    },
+                ],
+            },
+            repeat=True,
+        )
+
+        async with MegaDebridApi() as megadebrid:
+            hoster = await megadebrid.get_hoster("https://www.1fichier.com/?abcdefghij")
+            unsupported = await megadebrid.get_hoster("https://example.com/file.zip")
+
+        self.assertEqual(hoster["name"], "1fichier")
+        self.assertIsNone(unsupported)
+
     @aioresponses()
     async def test_get_torrents_list(self, mocked):
         """
@@ -323,12 +362,50 @@ class TestMegaDebridApi(IsolatedAsyncioTestCase):
             self.assertEqual(response["response_text"], "Torrent duplicate")
 
     @aioresponses()
-    @patch("builtins.open", new_callable=mock_open, read_data=randbytes(1024 * 10))
-    async def test_upload_torrent(self, mocked, mocked_open):
+    async def test_upload_magnets(self, mocked):
+        """
+        Test to upload many magnets concurrently: each one gets its response, even if another fails
+        """
+        magnets = [
+            f"magnet:?xt=urn:btih:{index:040x}&dn=Rick.and.Morty.S06E0{ index }.WEBRip.mp4"
+            for index in range(self.nb + 1)
+        ]
+
+        # The first request fails on the network, the other ones succeed
+        mocked.add(
+            method="POST",
+            url="https://www.mega-debrid.eu/api.php?action=uploadTorrent&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            exception=ClientConnectionError("Connection reset by peer"),
+        )
+        mocked.add(
+            method="POST",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=uploadTorrent&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={"response_code": "ok", "response_text": "", "newTorrent": {}},
+            repeat=True,
+        )
+
+        async with MegaDebridApi() as megadebrid:
+            results = [
+                result
+                async for result in megadebrid.upload_magnets(magnets, concurrency=3)
+            ]
+
+        self.assertCountEqual([magnet for magnet, _ in results], magnets)
+        response_codes = [response["response_code"] for _, response in results]
+        self.assertEqual(response_codes.count("CLIENT_ERROR"), 1)
+        self.assertEqual(response_codes.count("ok"), self.nb)
+
+    @aioresponses()
+    async def test_upload_torrent(self, mocked):
         """
         Test to upload a torrent file on Mega-Debrid account
         """
-        torrent_path = Path("/tmp/Rick.and.Morty.S06E01.WEBRip.mp4.torrent")
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        torrent_path = Path(tmp_dir.name) / "Rick.and.Morty.S06E01.WEBRip.mp4.torrent"
+        torrent_path.write_bytes(randbytes(1024 * 10))
 
         # It's possible to POST multiple time the same torrent, that will return the same response.
         mocked.add(
@@ -382,3 +459,39 @@ class TestMegaDebridApi(IsolatedAsyncioTestCase):
 
         self.assertEqual(response["response_code"], "ok")
         self.assertIn("unrestrict.link/download/file/", response["debridLink"])
+
+    @aioresponses()
+    async def test_debrid_link_cached(self, mocked):
+        """
+        Test to debrid a link once while it is cached, unless the cache is bypassed
+        """
+        link = "https://1fichier.com/?xxxxxxxxxxxx"
+
+        mocked.add(
+            method="POST",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getLink&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={
+                "response_code": "ok",
+                "response_text": "",
+                "debridLink": f"https://www{ self.nb }.unrestrict.link/download/file/xxxxxxxxxxxxxxx/Rick.and.Morty.S06E01.WEBRip.mp4",
+                "filename": "Rick.and.Morty.S06E01.WEBRip.mp4",
+            },
+            repeat=True,
+        )
+
+        async with MegaDebridApi() as megadebrid:
+            megadebrid.links_cache = LinksCache(ttl=3600, size=16)
+            first = await megadebrid.debrid_link(link)
+            second = await megadebrid.debrid_link(link)
+            other_password = await megadebrid.debrid_link(link, "password")
+            bypassed = await megadebrid.debrid_link(link, cache=False)
+
+        self.assertEqual(first, second)
+        self.assertEqual(bypassed, first)
+        self.assertEqual(other_password["response_code"], "ok")
+        self.assertEqual(megadebrid.links_cache.stats, {"hits": 1, "misses": 2})
+        self.assertEqual(len(megadebrid.links_cache.entries), 2)
+        # Only the first, the other password and the bypassed calls reached the API
+        self.assertEqual(sum(len(calls) for calls in mocked.requests.values()), 3)
@@ -1,5 +1,5 @@
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import patch, mock_open
+from unittest.mock import patch, mock_open, AsyncMock, MagicMock
 from os import environ
 
 from megadebrid.libs.base import MegaDebrid
@@ -107,3 +107,67 @@ class TestMegaDebridApi(IsolatedAsyncioTestCase):
             self.assertEqual(
                 megadebrid.hash_passwd("test123"), "cc03e747a6afbbcbf8be7668acfebee5"
             )
+
+    @patch("builtins.open", mock_open(read_data=""))
+    async def test_connector_config(self):
+        """
+        Test the connection pool and timeouts are tuned from CONNECTOR environment variables
+        """
+
+        with patch.dict(
+            environ,
+            {"MEGA_CONNECTOR_LIMIT": "42", "MEGA_CONNECTOR_TIMEOUT_SOCK_READ": "0"},
+            clear=True,
+        ):
+            async with MegaDebrid() as megadebrid:
+                self.assertEqual(megadebrid.session.connector.limit, 42)
+                self.assertEqual(megadebrid.session.connector.limit_per_host, 16)
+                self.assertIsNone(megadebrid.session.timeout.total)
+                self.assertIsNone(megadebrid.session.timeout.sock_read)
+                self.assertEqual(megadebrid.session.timeout.connect, 30)
+
+    @patch("builtins.open", mock_open(read_data=""))
+    async def test_shared_connector(self):
+        """
+        Test the connector is shared between MegaDebrid objects and isn't closed with their session
+        """
+        async with MegaDebrid(share_connector=True) as first_megadebrid:
+            connector = first_megadebrid.session.connector
+
+            async with MegaDebrid(share_connector=True) as second_megadebrid:
+                self.assertIs(second_megadebrid.session.connector, connector)
+
+        self.assertFalse(connector.closed)
+        await MegaDebrid.close_shared_connector()
+        self.assertTrue(connector.closed)
+
+    @patch("builtins.open", mock_open(read_data=""))
+    async def test_read_json(self):
+        """
+        Test to decode the responses with the pluggable 'loads', and the non-JSON bodies as error
+        """
+        response = MagicMock(status=502)
+
+        async with MegaDebrid() as megadebrid:
+            response.read = AsyncMock(return_value=b'{"response_code": "ok"}')
+            self.assertEqual(
+                await megadebrid.read_json(response), {"response_code": "ok"}
+            )
+
+            response.read = AsyncMock(return_value=b"<html>Bad Gateway</html>")
+            self.assertEqual(
+                await megadebrid.read_json(response),
+                {
+                    "response_code": "INVALID_RESPONSE",
+                    "response_text": "<html>Bad Gateway</html>",
+                    "http_status": 502,
+                },
+            )
+
+        loads = MagicMock(return_value={"response_code": "ok"})
+
+        async with MegaDebrid(loads=loads) as megadebrid:
+            response.read = AsyncMock(return_value=b'{"response_code": "ok"}')
+            await megadebrid.read_json(response)
+
+        loads.assert_called_once_with(b'{"response_code": "ok"}')
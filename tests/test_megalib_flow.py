@@ -1,11 +1,15 @@
+import asyncio
 from asynctempfile import NamedTemporaryFile
+from tempfile import TemporaryDirectory
+from json import dumps, loads
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch, mock_open, AsyncMock
-from aioresponses import aioresponses
+from aioresponses import aioresponses, CallbackResult
 from random import randbytes, randint
 from pathlib import Path
 
 from megadebrid.libs.flow import MegaDebridFlow
+from megadebrid.utils.checkpoints import Checkpoint
 
 
 @patch(
@@ -21,6 +25,8 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
     def setUp(self):
         super().setUp()
         self.nb = randint(1, 9)
+        self.tmp_dir = TemporaryDirectory()
+        self.folder = Path(self.tmp_dir.name)
         self.magnet = (
             "magnet:?xt=urn:btih:fb72d751bcc437746583c298ce395b84f3089e8f"
             "&dn=Rick.and.Morty.S06E01.WEBRip.mp4"
@@ -31,6 +37,10 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
             "&tr=udp%3A%2F%2Ftracker.torrent.eu.org%3A451%2Fannounce"
         )
 
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
     async def test_get_magnet_hash(self):
         """Test to get magnet hash in the magnet link"""
 
@@ -79,13 +89,80 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
         self.assertIsNotNone(response["status"]["ub_link"])
 
     @aioresponses()
-    @patch("megadebrid.libs.flow.aiopen", return_value=NamedTemporaryFile())
-    async def test_save_file(self, mocked, mocked_aiopen):
+    @patch("builtins.print")
+    async def test_wait_until_complete_shared(self, mocked, mocked_print):
+        """
+        Test to wait concurrently for several torrents with one getTorrent request per torrent and cycle
+        """
+        hashes = [f"{ i }" * 40 for i in range(1, 3)]
+        requested = {torrent_hash: 0 for torrent_hash in hashes}
+
+        def status_callback(url, **kwargs):
+            # The first torrent is complete after 3 statuses, the second one after 6
+            torrent_hash = kwargs["data"]["hash"]
+            n = hashes.index(torrent_hash) + 1
+            i = requested[torrent_hash]
+            requested[torrent_hash] += 1
+            return CallbackResult(
+                status=200,
+                content_type="text/html; charset=UTF-8",
+                payload={
+                    "response_code": "ok",
+                    "status": {
+                        "name": f"Rick.and.Morty.S06E0{ n }.WEBRip.mp4",
+                        "nbFiles": "1",
+                        "size": "576758736",
+                        "status": "complete" if i >= 3 * n - 1 else "in progress",
+                        "progress": "100" if i >= 3 * n - 1 else f"{ 10 * i }",
+                        "speed": "0.00",
+                        "peers": None,
+                        "ub_link": (
+                            f"https://1fichier.com/?{ torrent_hash[:20] }"
+                            if i >= 3 * n - 1
+                            else None
+                        ),
+                    },
+                },
+            )
+
+        mocked.post(
+            "https://www.mega-debrid.eu/api.php?action=getTorrent&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            callback=status_callback,
+            repeat=True,
+        )
+
+        async with MegaDebridFlow() as megadebrid:
+            # Two waiters for the first torrent
+            responses = await asyncio.gather(
+                *(
+                    megadebrid.wait_until_complete(torrent_hash, shared=True)
+                    for torrent_hash in [hashes[0]] + hashes
+                )
+            )
+
+        for torrent_hash, response in zip([hashes[0]] + hashes, responses):
+            self.assertEqual(response["status"]["status"], "complete")
+            self.assertEqual(
+                response["status"]["ub_link"],
+                f"https://1fichier.com/?{ torrent_hash[:20] }",
+            )
+
+        # The waiters of the same torrent share its requests, never a getTorrents one
+        self.assertEqual(requested, {hashes[0]: 3, hashes[1]: 6})
+        self.assertEqual(
+            [str(url) for _, url in mocked.requests],
+            [
+                "https://www.mega-debrid.eu/api.php?action=getTorrent&token=XXXXXXXXXXXXXXXXXXXXXXXXXX"
+            ],
+        )
+
+    @aioresponses()
+    async def test_save_file(self, mocked):
         """
         Test to save a file with full asynchronous way (not specific to Mega-Debrid)
         """
         url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
-        saved_path = Path("/tmp/downloads/file_example_PNG_1MB.png")
+        saved_path = self.folder / "file_example_PNG_1MB.png"
 
         mocked.add(
             method="GET",
@@ -96,19 +173,285 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
         )
 
         async with MegaDebridFlow() as megadebrid:
-            response = await megadebrid.save_file(url, "/tmp/downloads/")
+            response = await megadebrid.save_file(url, self.folder)
 
         self.assertIsInstance(response, Path)
         self.assertEqual(response, saved_path)
 
     @aioresponses()
-    @patch("megadebrid.libs.flow.aiopen", return_value=NamedTemporaryFile())
-    async def test_debrid_and_save_file(self, mocked, mocked_aiopen):
+    async def test_save_file_progress(self, mocked):
+        """
+        Test that saving a file reports its progress events to the callback
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+        body = randbytes(1024 * 1024)
+        events = []
+
+        mocked.get(
+            url, status=200, headers={"Content-Length": str(len(body))}, body=body
+        )
+
+        async with MegaDebridFlow() as megadebrid:
+            await megadebrid.save_file(
+                url, self.folder, chunk_size=1024 * 256, on_progress=events.append
+            )
+
+        self.assertEqual({event["phase"] for event in events}, {"downloading"})
+        self.assertEqual({event["total"] for event in events}, {len(body)})
+        self.assertEqual(
+            [event["done"] for event in events],
+            sorted(event["done"] for event in events),
+        )
+        self.assertEqual(events[0]["done"], 0)
+        self.assertEqual(events[-1]["done"], len(body))
+
+    async def test_split_ranges(self):
+        """Test to split a file size into contiguous HTTP byte ranges"""
+
+        async with MegaDebridFlow() as megadebrid:
+            self.assertEqual(megadebrid.split_ranges(10, 1), [(0, 9)])
+            self.assertEqual(megadebrid.split_ranges(10, 3), [(0, 3), (4, 7), (8, 9)])
+            self.assertEqual(megadebrid.split_ranges(2, 4), [(0, 0), (1, 1)])
+
+    @aioresponses()
+    async def test_save_file_segmented(self, mocked):
+        """
+        Test to save a file by concurrent byte ranges written in place (not specific to Mega-Debrid)
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+        body = b"\x89\x50\x4e\x47" + randbytes(1024 * 1024)
+        requested_ranges = []
+
+        def range_callback(url, **kwargs):
+            start, end = kwargs["headers"]["Range"][len("bytes=") :].split("-")
+            requested_ranges.append((int(start), int(end)))
+            return CallbackResult(
+                status=206,
+                headers={"Content-Range": f"bytes { start }-{ end }/{ len(body) }"},
+                body=body[int(start) : int(end) + 1],
+            )
+
+        mocked.head(
+            url,
+            status=200,
+            headers={"Content-Length": str(len(body)), "Accept-Ranges": "bytes"},
+        )
+        mocked.get(url, callback=range_callback, repeat=True)
+
+        async with MegaDebridFlow() as megadebrid:
+            response = await megadebrid.save_file(url, self.folder, segments=4)
+
+        self.assertEqual(response, self.folder / "file_example_PNG_1MB.png")
+        self.assertEqual(response.read_bytes(), body)
+        self.assertEqual(len(requested_ranges), 4)
+
+    @aioresponses()
+    async def test_save_file_resume(self, mocked):
+        """
+        Test to resume a partial download from its '.part' file and sidecar checkpoint
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+        body = b"\x89\x50\x4e\x47" + randbytes(1024 * 1024)
+        half = len(body) // 2
+        requested_ranges = []
+
+        def range_callback(url, **kwargs):
+            start, end = kwargs["headers"]["Range"][len("bytes=") :].split("-")
+            requested_ranges.append((int(start), int(end)))
+            return CallbackResult(
+                status=206,
+                headers={"Content-Range": f"bytes { start }-{ end }/{ len(body) }"},
+                body=body[int(start) : int(end) + 1],
+            )
+
+        # Previous download interrupted in the middle of the file
+        (self.folder / "file_example_PNG_1MB.png.part").write_bytes(
+            body[:half] + bytes(len(body) - half)
+        )
+        (self.folder / "file_example_PNG_1MB.png.part.json").write_text(
+            dumps(
+                {
+                    "url": url,
+                    "total": len(body),
+                    "etag": '"5f3e-1fe"',
+                    "last_modified": None,
+                    "ranges": [[0, half - 1]],
+                }
+            )
+        )
+
+        mocked.head(
+            url,
+            status=200,
+            headers={
+                "Content-Length": str(len(body)),
+                "Accept-Ranges": "bytes",
+                "ETag": '"5f3e-1fe"',
+            },
+        )
+        mocked.get(url, callback=range_callback, repeat=True)
+
+        async with MegaDebridFlow() as megadebrid:
+            response = await megadebrid.save_file(url, self.folder)
+
+        self.assertEqual(response.read_bytes(), body)
+        self.assertEqual(requested_ranges, [(half, len(body) - 1)])
+        self.assertEqual(list(self.folder.iterdir()), [response])
+
+    @aioresponses()
+    async def test_save_file_incomplete(self, mocked):
+        """
+        Test that a file whose byte ranges could not all be downloaded is not completed, and stays resumable
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+        body = randbytes(1000)
+
+        def capped_callback(url, **kwargs):
+            # Server capping each partial response at 100 bytes
+            start, end = kwargs["headers"]["Range"][len("bytes=") :].split("-")
+            return CallbackResult(
+                status=206,
+                headers={
+                    "Content-Range": f"bytes { start }-{ int(start) + 99 }/{ len(body) }"
+                },
+                body=body[int(start) : int(start) + 100],
+            )
+
+        mocked.head(
+            url,
+            status=200,
+            headers={"Content-Length": str(len(body)), "Accept-Ranges": "bytes"},
+        )
+        mocked.get(url, callback=capped_callback, repeat=True)
+
+        async with MegaDebridFlow() as megadebrid:
+            with self.assertRaises(Exception):
+                await megadebrid.save_file(url, self.folder, segments=2)
+
+        self.assertFalse((self.folder / "file_example_PNG_1MB.png").exists())
+        self.assertTrue((self.folder / "file_example_PNG_1MB.png.part.json").exists())
+
+    @aioresponses()
+    async def test_save_segment_mismatch(self, mocked):
+        """
+        Test that a partial response for another range, or shorter than its range, fails the segment
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+        body = randbytes(1000)
+        checkpoint = Checkpoint(path=self.folder / "file.png", url=url, total=len(body))
+        await checkpoint.allocate()
+
+        for headers, content in [
+            ({"Content-Range": "bytes 100-599/1000"}, body[100:600]),  # Shifted
+            ({}, body[:500]),  # Without Content-Range
+            ({"Content-Range": "bytes 0-499/1000"}, body[:400]),  # Short
+        ]:
+            mocked.get(url, status=206, headers=headers, body=content)
+
+            async with MegaDebridFlow() as megadebrid:
+                with self.assertRaises(Exception):
+                    await megadebrid.save_segment(
+                        url, checkpoint, 0, 499, 1024, lambda size: None
+                    )
+
+    @aioresponses()
+    async def test_save_file_short_body(self, mocked):
+        """
+        Test that a single stream shorter than its Content-Length is not completed
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+
+        mocked.get(
+            url, status=200, headers={"Content-Length": "2000"}, body=b"\x00" * 1000
+        )
+
+        async with MegaDebridFlow() as megadebrid:
+            with self.assertRaises(Exception):
+                await megadebrid.save_file(url, self.folder)
+
+        self.assertFalse((self.folder / "file_example_PNG_1MB.png").exists())
+        self.assertTrue((self.folder / "file_example_PNG_1MB.png.part.json").exists())
+
+    @aioresponses()
+    async def test_save_file_killed_before_sync(self, mocked):
+        """
+        Test that the sidecar only records the bytes synced to the disk when the download is killed
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+        body = randbytes(1024)
+        sync = Checkpoint.sync
+        synced = []
+
+        async def killed_sync(part_file):
+            # The first chunk reaches the disk, the worker is killed before the second one does
+            if synced:
+                raise OSError("Killed")
+            await sync(part_file)
+            synced.append(part_file)
+
+        mocked.get(
+            url, status=200, headers={"Content-Length": str(len(body))}, body=body
+        )
+        mocked.get(
+            url,
+            status=206,
+            headers={"Content-Range": f"bytes 0-{ len(body) - 1 }/{ len(body) }"},
+            body=body,
+        )
+
+        with patch.object(Checkpoint, "SAVE_INTERVAL", 0.0), patch.object(
+            Checkpoint, "sync", staticmethod(killed_sync)
+        ):
+            async with MegaDebridFlow() as megadebrid:
+                # Single stream
+                with self.assertRaises(OSError):
+                    await megadebrid.save_file(url, self.folder, chunk_size=256)
+
+                checkpoint = await Checkpoint.load(
+                    self.folder / "file_example_PNG_1MB.png"
+                )
+                self.assertEqual(checkpoint.ranges, [(0, 255)])
+
+                # Segment
+                synced.clear()
+                checkpoint = Checkpoint(
+                    path=self.folder / "file.png", url=url, total=len(body)
+                )
+                await checkpoint.allocate()
+
+                with self.assertRaises(OSError):
+                    await megadebrid.save_segment(
+                        url, checkpoint, 0, len(body) - 1, 256, lambda size: None
+                    )
+
+                self.assertEqual(checkpoint.ranges, [(0, 255)])
+
+    async def test_checkpoint_concurrent_saves(self):
+        """
+        Test that the segments saving the sidecar at the same time don't race on its temporary file
+        """
+        checkpoint = Checkpoint(
+            path=self.folder / "file_example_PNG_1MB.png",
+            url="https://file-examples.com/file_example_PNG_1MB.png",
+            total=1000,
+        )
+        await checkpoint.allocate()
+        checkpoint.saved_at = 0.0
+
+        await asyncio.gather(*(checkpoint.save() for _ in range(4)))
+        await asyncio.gather(*(checkpoint.save(force=True) for _ in range(4)))
+
+        self.assertEqual(
+            loads(checkpoint.sidecar_path.read_text())["total"], checkpoint.total
+        )
+
+    @aioresponses()
+    async def test_debrid_and_save_file(self, mocked):
         """
         Test to unrestrict a link and save the file at generated based on async save_file on Mega-Debrid API
         """
         link = "https://1fichier.com/?xxxxxxxxxxxx"  # ? could be links
-        saved_path = Path("/tmp/downloads/Rick.and.Morty.S06E01.WEBRip.mp4")
+        saved_path = self.folder / "Rick.and.Morty.S06E01.WEBRip.mp4"
 
         mocked.add(
             method="POST",
@@ -136,20 +479,124 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
         )
 
         async with MegaDebridFlow() as megadebrid:
-            response = await megadebrid.debrid_and_save_file(link, "/tmp/downloads")
+            response = await megadebrid.debrid_and_save_file(link, self.folder)
 
         self.assertIsInstance(response, Path)
         self.assertEqual(response, saved_path)
 
+    @aioresponses()
+    async def test_debrid_and_save_many(self, mocked):
+        """
+        Test to unrestrict many links and save their files through the pipeline: a link which cannot be
+        debrided yields its response while the other files are downloaded
+        """
+        links = [f"https://1fichier.com/?{index:012d}" for index in range(self.nb)]
+        unavailable = "https://1fichier.com/?unavailable"
+
+        def debrid_callback(url, **kwargs):
+            link = kwargs["data"]["link"]
+
+            if link == unavailable:
+                return CallbackResult(
+                    status=200,
+                    payload={"response_code": "UNAVAILABLE", "response_text": ""},
+                )
+
+            filename = f"Rick.and.Morty.S06E{links.index(link) + 1:02d}.WEBRip.mp4"
+            return CallbackResult(
+                status=200,
+                payload={
+                    "response_code": "ok",
+                    "response_text": "",
+                    "debridLink": f"https://www{ self.nb }.unrestrict.link/download/file/{ filename }",
+                    "filename": filename,
+                },
+            )
+
+        mocked.post(
+            "https://www.mega-debrid.eu/api.php?action=getLink&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            callback=debrid_callback,
+            repeat=True,
+        )
+        for index in range(self.nb):
+            mocked.get(
+                f"https://www{ self.nb }.unrestrict.link/download/file/"
+                f"Rick.and.Morty.S06E{index + 1:02d}.WEBRip.mp4",
+                status=200,
+                body=randbytes(1024),
+            )
+
+        async with MegaDebridFlow() as megadebrid:
+            results = dict(
+                [
+                    result
+                    async for result in megadebrid.debrid_and_save_many(
+                        links + [unavailable], self.folder, concurrency=2, prefetch=2
+                    )
+                ]
+            )
+
+        self.assertEqual(results.pop(unavailable)["response_code"], "UNAVAILABLE")
+        self.assertEqual(
+            results,
+            {
+                link: self.folder / f"Rick.and.Morty.S06E{index + 1:02d}.WEBRip.mp4"
+                for index, link in enumerate(links)
+            },
+        )
+        self.assertTrue(all(path.stat().st_size == 1024 for path in results.values()))
+
+    @aioresponses()
+    async def test_debrid_and_save_many_unexpected_error(self, mocked):
+        """
+        Test that an unexpected error while handling a link (malformed response, unreachable links cache)
+        yields its error response instead of leaving the pipeline waiting forever
+        """
+        link = "https://1fichier.com/?xxxxxxxxxxxx"
+
+        mocked.post(
+            "https://www.mega-debrid.eu/api.php?action=getLink&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            status=200,
+            payload={"response_code": "ok", "response_text": ""},  # No 'debridLink'
+        )
+
+        async def collect(megadebrid):
+            return [
+                result
+                async for result in megadebrid.debrid_and_save_many(
+                    [link], self.folder, cache=False
+                )
+            ]
+
+        async with MegaDebridFlow() as megadebrid:
+            with patch.object(
+                megadebrid.links_cache,
+                "invalidate",
+                AsyncMock(side_effect=ConnectionError("Redis unreachable")),
+            ):
+                results = await asyncio.wait_for(collect(megadebrid), timeout=5)
+
+        self.assertEqual(
+            results,
+            [
+                (
+                    link,
+                    {
+                        "response_code": "CLIENT_ERROR",
+                        "response_text": "ConnectionError: Redis unreachable",
+                    },
+                )
+            ],
+        )
+
     @aioresponses()
     @patch("builtins.print")
-    @patch("megadebrid.libs.flow.aiopen", return_value=NamedTemporaryFile())
-    async def test_download_magnet(self, mocked, mocked_aiopen, mocked_print):
+    async def test_download_magnet(self, mocked, mocked_print):
         """
         Test to 'add a magnet link' on the Torrent Converter, wait until the torrent have been uploaded
         on 1fichier then unrestrict it and finally download it. Everything through Mega-Debrid API
         """
-        saved_path = Path("/tmp/downloads/Rick.and.Morty.S06E01.WEBRip.mp4")
+        saved_path = self.folder / "Rick.and.Morty.S06E01.WEBRip.mp4"
 
         # Torrent Converter: Submission of the magnet link
         mocked.add(
@@ -167,6 +614,15 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
                 },
             },
         )
+        # Shared poller: the torrent isn't listed yet, its status is requested alone
+        mocked.add(
+            method="GET",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getTorrents&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={"response_code": "ok", "response_text": "", "torrents": []},
+            repeat=True,
+        )
         # Torrent Converter: Starting
         mocked.add(
             method="POST",
@@ -300,7 +756,7 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
         )
 
         async with MegaDebridFlow() as megadebrid:
-            response = await megadebrid.download_magnet(self.magnet, "/tmp/downloads")
+            response = await megadebrid.download_magnet(self.magnet, self.folder)
 
         self.assertIsInstance(response, Path)
         self.assertEqual(response, saved_path)
@@ -311,7 +767,7 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
         """
         Test connect user on Mega-Debrid API with wrong credentials
         """
-        # saved_path = Path("/tmp/downloads/Rick.and.Morty.S06E01.WEBRip.mp4")
+        # saved_path = self.folder / "Rick.and.Morty.S06E01.WEBRip.mp4"
 
         # Torrent Converter: Submission magnet link that already exists
         mocked.add(
@@ -332,17 +788,14 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
 
     @aioresponses()
     @patch("builtins.print")
-    @patch("builtins.open", new_callable=mock_open, read_data=randbytes(1024 * 10))
-    @patch("megadebrid.libs.flow.aiopen", return_value=NamedTemporaryFile())
-    async def test_download_torrent(
-        self, mocked, mocked_aiopen, mocked_open, mocked_print
-    ):
+    async def test_download_torrent(self, mocked, mocked_print):
         """
         Test to 'add a torrent' on the Torrent Converter, wait until the torrent have been uploaded
         on 1fichier then unrestrict it and finally download it. Everything through Mega-Debrid API
         """
-        torrent_path = Path("/tmp/Rick.and.Morty.S06E01.WEBRip.mp4.torrent")
-        saved_path = Path("/tmp/downloads/Rick.and.Morty.S06E01.WEBRip.mp4")
+        torrent_path = self.folder / "Rick.and.Morty.S06E01.WEBRip.mp4.torrent"
+        torrent_path.write_bytes(randbytes(1024 * 10))
+        saved_path = self.folder / "Rick.and.Morty.S06E01.WEBRip.mp4"
 
         # Torrent Converter: Submission of the torrent file
         # It's possible to POST multiple time the same torrent file, that will return the same response (no duplicate).
@@ -362,6 +815,15 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
             },
             repeat=True,
         )
+        # Shared poller: the torrent isn't listed yet, its status is requested alone
+        mocked.add(
+            method="GET",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getTorrents&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={"response_code": "ok", "response_text": "", "torrents": []},
+            repeat=True,
+        )
         # Torrent Converter: Starting
         mocked.add(
             method="POST",
@@ -495,7 +957,7 @@ class TestMegaDebridFlow(IsolatedAsyncioTestCase):
         )
 
         async with MegaDebridFlow() as megadebrid:
-            response = await megadebrid.download_torrent(torrent_path, "/tmp/downloads")
+            response = await megadebrid.download_torrent(torrent_path, self.folder)
 
         self.assertIsInstance(response, Path)
         self.assertEqual(response, saved_path)
@@ -0,0 +1,73 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from megadebrid.utils.stores import RedisError
+from megadebrid.utils.limiters import TokenBucket, RedisTokenBucket, create_bucket
+
+
+@patch("asyncio.sleep", new_callable=AsyncMock)
+class TestMegaLimiter(IsolatedAsyncioTestCase):
+    """
+    Test the token buckets limiting the requests sent to Mega-Debrid
+    """
+
+    async def test_create_bucket(self, mocked_sleep):
+        """
+        Test to get the in-memory or the Redis bucket shared in the process
+        """
+        memory_bucket = create_bucket("test", rate=10, burst=5)
+        redis_bucket = create_bucket(
+            "test", rate=10, burst=5, backend="redis", url="redis://localhost:6379"
+        )
+
+        self.assertIs(type(memory_bucket), TokenBucket)
+        self.assertIsInstance(redis_bucket, RedisTokenBucket)
+        self.assertIs(
+            create_bucket(
+                "test", rate=10, burst=5, backend="redis", url="redis://localhost:6379"
+            ),
+            redis_bucket,
+        )
+
+    async def test_redis_bucket(self, mocked_sleep):
+        """
+        Test to wait the time returned by the atomic Lua script of the shared bucket
+        """
+        script = AsyncMock(return_value=b"0.25")
+        client = MagicMock(register_script=MagicMock(return_value=script))
+
+        with patch("megadebrid.utils.limiters.get_async_redis", return_value=client):
+            bucket = RedisTokenBucket(
+                rate=40, burst=10, url="redis://localhost:6379", key="mega:limiter:api"
+            )
+            wait = await bucket.acquire()
+
+        self.assertEqual(wait, 0.25)
+        self.assertEqual(script.await_args.kwargs["keys"], ["mega:limiter:api"])
+        self.assertEqual(script.await_args.kwargs["args"], [40, 10])
+        mocked_sleep.assert_awaited_once_with(0.25)
+
+    async def test_redis_bucket_fallback(self, mocked_sleep):
+        """
+        Test to fall back on the conservative in-memory bucket when Redis isn't reachable
+        """
+        script = AsyncMock(side_effect=RedisError("Connection refused"))
+        client = MagicMock(register_script=MagicMock(return_value=script))
+
+        with patch(
+            "megadebrid.utils.limiters.get_async_redis", return_value=client
+        ), patch("megadebrid.utils.limiters.monotonic", return_value=1000.0):
+            bucket = RedisTokenBucket(
+                rate=40, burst=10, url="redis://localhost:6379", fallback_rate=2
+            )
+
+            for _ in range(3):
+                await bucket.acquire()
+
+        # Redis isn't retried until RETRY_INTERVAL, the local bucket (2 req/s, no burst) delayed the 2 last calls
+        self.assertEqual(script.await_count, 1)
+        self.assertEqual(bucket.stats["calls"], 3)
+        self.assertEqual(bucket.stats["delayed"], 2)
+        self.assertEqual(
+            [call.args[0] for call in mocked_sleep.await_args_list], [0.5, 1.0]
+        )
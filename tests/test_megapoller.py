@@ -0,0 +1,44 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from megadebrid.utils.pollers import PollingSchedule
+
+
+class TestMegaPoller(TestCase):
+    """
+    Test the polling schedule of the torrent statuses
+    """
+
+    @patch("megadebrid.utils.pollers.monotonic")
+    def test_polling_schedule(self, mocked_monotonic):
+        """
+        Test the interval backs off while the time to completion is unknown,
+        then follows the estimated time to completion within the min/max values
+        """
+        schedule = PollingSchedule(min_interval=2, max_interval=60)
+        pending = {"status": "pending", "progress": "0", "speed": "0.00", "size": "0"}
+
+        # Unknown time to completion: back off up to the maximum
+        mocked_monotonic.return_value = 0
+        self.assertEqual(
+            [schedule.next_interval(pending) for _ in range(0, 6)],
+            [4, 8, 16, 32, 60, 60],
+        )
+
+        # First progress: estimate with the speed (MB/s) and size (bytes) fields
+        status = {
+            "status": "in progress",
+            "progress": "10",
+            "speed": "1.00",
+            "size": f"{ 100 * 1024 * 1024 }",
+        }
+        mocked_monotonic.return_value = 100
+        self.assertEqual(schedule.next_interval(status), 45)
+
+        # Then estimate with the progress made: 10% in 10 seconds, 80% remaining
+        mocked_monotonic.return_value = 110
+        self.assertEqual(schedule.next_interval({**status, "progress": "20"}), 40)
+
+        # Nearly complete: tightened to the minimum
+        mocked_monotonic.return_value = 120
+        self.assertEqual(schedule.next_interval({**status, "progress": "99"}), 2)
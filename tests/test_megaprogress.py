@@ -0,0 +1,75 @@
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from megadebrid.utils.progressions import Progress
+
+
+class TerminalIO(StringIO):
+    def isatty(self):
+        return True
+
+
+@patch("megadebrid.utils.progressions.monotonic")
+class TestMegaProgress(TestCase):
+    """
+    Test the terminal renderer of the downloads
+    """
+
+    def test_render_throttled(self, mocked_monotonic):
+        """Test that the chunks are counted exactly but redrawn at most once per interval, and at completion"""
+        mocked_monotonic.return_value = 100.0
+        stream = TerminalIO()
+        progress = Progress(interval=0.1, stream=stream, size=10)
+        total = 1024 * 1024
+
+        # 1024 chunks of 1kB in 1 second
+        for index in range(1, 1025):
+            mocked_monotonic.return_value = 100.0 + index / 1024
+            progress.render(1024 * index, total, choice="bar")
+
+        lines = stream.getvalue().split("\r")[1:]
+        self.assertLessEqual(len(lines), 12)
+        self.assertTrue(lines[0].startswith("Downloading [..........]"))
+        self.assertTrue(lines[-1].startswith("Downloading [██████████]  100.0%"))
+        self.assertIn(f"{ total }/{ total }", lines[-1])
+        # The line is ended only once complete
+        self.assertEqual([line.endswith("\n") for line in lines].count(True), 1)
+        self.assertTrue(lines[-1].endswith("\n"))
+        self.assertAlmostEqual(progress.smoothed, total, delta=total * 0.05)
+
+    def test_render_rates(self, mocked_monotonic):
+        """Test the instantaneous and smoothed rates, and the time left"""
+        mocked_monotonic.return_value = 0.0
+        progress = Progress(stream=TerminalIO())
+        total = 100 * 1024 * 1024
+
+        for second, done in [(0, 0), (1, 10), (2, 30)]:
+            mocked_monotonic.return_value = float(second)
+            progress.render(done * 1024 * 1024, total, to_convert=True)
+
+        self.assertEqual(progress.rate, 20 * 1024 * 1024)
+        self.assertEqual(progress.smoothed, (0.3 * 20 + 0.7 * 10) * 1024 * 1024)
+        self.assertIn(
+            " 20.0 MB/s (avg  13.0 MB/s)  ETA 00:05", progress.stream.getvalue()
+        )
+
+    def test_render_not_tty(self, mocked_monotonic):
+        """Test that logs get a plain line per log interval, without carriage return"""
+        mocked_monotonic.return_value = 0.0
+        stream = StringIO()
+        progress = Progress(log_interval=10, stream=stream)
+
+        for second in range(61):
+            mocked_monotonic.return_value = float(second)
+            progress.render(second, 60, to_convert=True)
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertNotIn("\r", stream.getvalue())
+        self.assertTrue(lines[-1].startswith("100.0%"))
+
+        # Unknown size: ended by finish
+        progress.render(1024, 0)
+        progress.finish()
+        self.assertTrue(stream.getvalue().endswith("\n"))
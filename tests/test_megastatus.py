@@ -0,0 +1,79 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from celery.backends.redis import RedisBackend
+
+from megadebrid.worker.celery import app as celery_app
+from megadebrid.worker.status import MGET_BATCH, get_tasks_status
+
+
+class TestMegaStatus(TestCase):
+    """
+    Test the status of many tasks read at once from the result backend
+    """
+
+    def setUp(self):
+        self.backend = RedisBackend(app=celery_app, url="redis://localhost:6379")
+        stored = {
+            self.backend.get_key_for_task(task_id): self.backend.encode(meta)
+            for task_id, meta in {
+                "task-success": {
+                    "status": "SUCCESS",
+                    "result": "/tmp/Rick.and.Morty.S06E01.WEBRip.mp4",
+                },
+                "task-progress": {
+                    "status": "PROGRESS",
+                    "result": {"phase": "downloading", "done": 1, "total": 2},
+                },
+                "task-failure": {
+                    "status": "FAILURE",
+                    "result": {"exc_type": "Exception", "exc_message": ["Dead link"]},
+                },
+            }.items()
+        }
+        replies = []
+
+        # Redis pipeline: the MGET replies are returned together on execute
+        self.pipeline = MagicMock()
+        self.pipeline.mget.side_effect = lambda keys: replies.append(
+            [stored.get(key) for key in keys]
+        )
+        self.pipeline.execute.side_effect = lambda: [
+            replies.pop(0) for _ in list(replies)
+        ]
+        self.backend.client = MagicMock()
+        self.backend.client.pipeline.return_value = self.pipeline
+
+    def test_get_tasks_status(self):
+        """Test that the tasks are read by MGET in one pipeline, unknown ones being pending"""
+        statuses = get_tasks_status(
+            ["task-success", "task-progress", "task-failure", "task-unknown"],
+            backend=self.backend,
+        )
+
+        self.assertEqual(
+            statuses,
+            {
+                "task-success": {
+                    "task_status": "SUCCESS",
+                    "task_result": "/tmp/Rick.and.Morty.S06E01.WEBRip.mp4",
+                },
+                "task-progress": {
+                    "task_status": "PROGRESS",
+                    "task_result": {"phase": "downloading", "done": 1, "total": 2},
+                },
+                "task-failure": {"task_status": "FAILURE", "task_result": None},
+                "task-unknown": {"task_status": "PENDING", "task_result": None},
+            },
+        )
+        self.assertEqual(self.pipeline.mget.call_count, 1)
+        self.assertEqual(self.pipeline.execute.call_count, 1)
+
+    def test_get_tasks_status_batches(self):
+        """Test that many tasks are read by batches of MGET, still in one round trip"""
+        task_ids = [f"task-{ index }" for index in range(MGET_BATCH * 2 + 1)]
+        statuses = get_tasks_status(task_ids + task_ids[:10], backend=self.backend)
+
+        self.assertEqual(list(statuses), task_ids)
+        self.assertEqual(self.pipeline.mget.call_count, 3)
+        self.assertEqual(self.pipeline.execute.call_count, 1)
@@ -0,0 +1,59 @@
+from json import loads
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from megadebrid.utils.stores import RedisError
+from megadebrid.worker.stream import TaskStream, create_task_stream
+
+
+class TestMegaStream(TestCase):
+    """
+    Test the stream of the task states published by the workers and relayed by Mega-Web
+    """
+
+    @patch("megadebrid.worker.stream.get_redis")
+    def test_publish(self, mocked_get_redis):
+        """Test that a state change is published in the format of the task status"""
+        stream = TaskStream("redis://localhost:6379", channel="mega:tasks")
+        stream.publish("task-1", "SUCCESS", "/tmp/Rick.and.Morty.S06E01.WEBRip.mp4")
+
+        channel, message = mocked_get_redis.return_value.publish.call_args.args
+        self.assertEqual(channel, "mega:tasks")
+        self.assertEqual(
+            loads(message),
+            {
+                "task_id": "task-1",
+                "task_status": "SUCCESS",
+                "task_result": "/tmp/Rick.and.Morty.S06E01.WEBRip.mp4",
+            },
+        )
+
+        # Best effort: never fails the task
+        mocked_get_redis.return_value.publish.side_effect = RedisError("unreachable")
+        stream.publish("task-1", "SUCCESS")
+
+    def test_events(self):
+        """Test that the published states are relayed as Server-Sent Events, with keepalive comments"""
+        pubsub = MagicMock()
+        pubsub.get_message.side_effect = [
+            None,
+            {"type": "message", "data": b'{"task_id": "task-1"}'},
+        ]
+        events = TaskStream("redis://localhost:6379").events(pubsub, keepalive=0.1)
+
+        self.assertEqual(
+            [next(events) for _ in range(3)],
+            ["retry: 3000\n\n", ": keepalive\n\n", 'data: {"task_id": "task-1"}\n\n'],
+        )
+
+        # Client disconnected
+        events.close()
+        self.assertEqual(pubsub.close.call_count, 1)
+
+    def test_create_task_stream(self):
+        """Test that the stream is disabled unless the backend is Redis"""
+        self.assertIsNone(create_task_stream("none", "redis://localhost:6379"))
+        self.assertIsNone(create_task_stream("redis", ""))
+        self.assertIsInstance(
+            create_task_stream("redis", "redis://localhost:6379"), TaskStream
+        )
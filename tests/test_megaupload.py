@@ -0,0 +1,78 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+from tempfile import TemporaryDirectory
+from random import randbytes
+from pathlib import Path
+
+from megadebrid.utils.uploads import iter_chunks, torrent_form
+
+
+class BodyWriter:
+    """Collect the body written by the multipart payload"""
+
+    def __init__(self) -> None:
+        self.body = b""
+
+    async def write(self, chunk: bytes) -> None:
+        self.body += chunk
+
+
+class TestMegaUpload(IsolatedAsyncioTestCase):
+    """
+    Test the multipart forms uploading the torrents
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = TemporaryDirectory()
+        self.torrent_path = Path(self.tmp_dir.name) / "Rick.and.Morty.S06E01.torrent"
+        self.content = randbytes(1024 * 200)
+        self.torrent_path.write_bytes(self.content)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    async def write_form(self, form) -> bytes:
+        writer = BodyWriter()
+        await form().write(writer)
+        return writer.body
+
+    async def test_torrent_form_file(self):
+        """
+        Test to stream the torrent file with the other fields of the form
+        """
+        async with torrent_form("torrent", self.torrent_path, splitSizeFile=0) as form:
+            body = await self.write_form(form)
+
+        self.assertIn(b'name="splitSizeFile"', body)
+        self.assertIn(b'filename="Rick.and.Morty.S06E01.torrent"', body)
+        self.assertIn(b"Content-Type: application/x-bittorrent", body)
+        self.assertIn(self.content, body)
+
+    async def test_torrent_form_bytes(self):
+        """
+        Test to upload the content of a torrent without temporary file
+        """
+        async with torrent_form("file", self.content, filename="My.torrent") as form:
+            body = await self.write_form(form)
+
+        self.assertIn(b'filename="My.torrent"', body)
+        self.assertIn(self.content, body)
+
+    async def test_torrent_form_closed_on_error(self):
+        """
+        Test the torrent file is closed when the upload fails
+        """
+        handles = []
+
+        def record(f):
+            handles.append(f)
+            return iter_chunks(f)
+
+        with patch("megadebrid.utils.uploads.iter_chunks", side_effect=record):
+            with self.assertRaises(ConnectionResetError):
+                async with torrent_form("file", self.torrent_path):
+                    raise ConnectionResetError("Connection reset by peer")
+
+        self.assertTrue(handles[0].closed)
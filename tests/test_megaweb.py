@@ -7,6 +7,7 @@ from uuid import UUID, uuid4
 
 from megadebrid.web import create_app
 from megadebrid.web.views import TASKS_MAPPER
+from megadebrid.worker.dedup import TaskIndex
 
 
 class TestMegaWeb(TestCase):
@@ -28,6 +29,12 @@ class TestMegaWeb(TestCase):
         )
         cls.client = cls.app.test_client()
 
+    def setUp(self):
+        # Fresh dedup index: the tasks submitted by the other tests don't answer these ones
+        patcher = patch("megadebrid.worker.tasks.task_index", TaskIndex(window=86400))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @staticmethod
     def is_valid_uuid(value: str):
         """
@@ -153,6 +160,63 @@ class TestMegaWeb(TestCase):
         self.assertTrue(response.is_json)
         self.assertTrue(self.is_valid_uuid(response.json.get("task_id")))
 
+    @patch(
+        "megadebrid.worker.tasks.debrid_and_save_file.delay",
+        return_value=MagicMock(id=uuid4()),
+    )
+    def test_megaweb_create_task_form_data(self, mocked_task_debrid_and_save_file):
+        """
+        Test that the tasks receive the validated values of the form: integers, without the cleared fields
+        """
+        for segments, expected in [("4", {"segments": 4}), ("", {})]:
+            link = f"https://1fichier.com/?{ uuid4().hex[:20] }"
+
+            response = self.client.post(
+                "/tasks",
+                json={"link": link, "folder": "/tmp", "segments": segments},
+                content_type="application/json",
+                headers={"Mega-Task": "DebridAndSaveFile"},
+            )
+
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(
+                mocked_task_debrid_and_save_file.call_args.kwargs,
+                {"link": link, "folder": "/tmp", **expected},
+            )
+
+    @patch(
+        "megadebrid.worker.tasks.debrid_and_save_batch.delay",
+        return_value=MagicMock(id=uuid4()),
+    )
+    def test_megaweb_create_task_debrid_and_save_batch(
+        self, mocked_task_debrid_and_save_batch
+    ):
+        """
+        Test that a request with header "Mega-Task: DebridAndSaveBatch" on Flask correctly reaches
+        debrid_and_save_batch function of MegaWorker (celery task) with the newline-separated links.
+        """
+        links = "https://1fichier.com/?xxxxxxxxxxxx\nhttps://1fichier.com/?yyyyyyyyyyyy"
+        folder = "/tmp"
+
+        response = self.client.post(
+            "/tasks",
+            json={"links": links, "folder": folder},
+            content_type="application/json",
+            headers={"Mega-Task": "DebridAndSaveBatch"},
+        )
+
+        # Verify celery task creation: one task for all the links
+        self.assertEqual(mocked_task_debrid_and_save_batch.call_count, 1)
+        self.assertEqual(
+            mocked_task_debrid_and_save_batch.call_args.kwargs,
+            {"links": links, "folder": folder},
+        )
+        # Verify flask response
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.content_type, "application/json")
+        self.assertTrue(response.is_json)
+        self.assertTrue(self.is_valid_uuid(response.json.get("task_id")))
+
     @patch(
         "megadebrid.worker.tasks.download_magnet.delay",
         return_value=MagicMock(id=uuid4()),
@@ -223,6 +287,62 @@ class TestMegaWeb(TestCase):
         self.assertTrue(response.is_json)
         self.assertTrue(self.is_valid_uuid(response.json.get("task_id")))
 
+    @patch("megadebrid.worker.tasks.celery_app.AsyncResult")
+    @patch("megadebrid.worker.tasks.download_magnet.delay")
+    def test_megaweb_create_task_duplicate(
+        self, mocked_task_download_magnet, mocked_async_result
+    ):
+        """
+        Test that the same magnet submitted again is answered by the existing task instead of a new one,
+        unless that one failed.
+        """
+        task_ids = [uuid4(), uuid4()]
+        mocked_task_download_magnet.side_effect = [MagicMock(id=i) for i in task_ids]
+        mocked_async_result.return_value = MagicMock(status="STARTED")
+        magnet = "magnet:?xt=urn:btih:{}&dn=Rick.and.Morty.S06E02.WEBRip.mp4"
+
+        # Same infohash (upper-cased) and folder: same work
+        responses = [
+            self.client.post(
+                "/tasks",
+                json={"magnet": magnet.format(infohash), "folder": "/tmp/dedup"},
+                content_type="application/json",
+                headers={"Mega-Task": "DownloadMagnet"},
+            )
+            for infohash in [
+                "0c5d9c5ec1f3a5e4c2e3f4a6b7c8d9e0f1a2b3c4",
+                "0C5D9C5EC1F3A5E4C2E3F4A6B7C8D9E0F1A2B3C4",
+            ]
+        ]
+
+        self.assertEqual(mocked_task_download_magnet.call_count, 1)
+        self.assertEqual([response.status_code for response in responses], [202, 200])
+        self.assertEqual(
+            [response.json for response in responses],
+            [
+                {"task_id": str(task_ids[0]), "duplicate": False},
+                {"task_id": str(task_ids[0]), "duplicate": True},
+            ],
+        )
+
+        # The existing task failed: the work is queued again
+        mocked_async_result.return_value = MagicMock(status="FAILURE")
+        response = self.client.post(
+            "/tasks",
+            json={
+                "magnet": magnet.format("0c5d9c5ec1f3a5e4c2e3f4a6b7c8d9e0f1a2b3c4"),
+                "folder": "/tmp/dedup",
+            },
+            content_type="application/json",
+            headers={"Mega-Task": "DownloadMagnet"},
+        )
+
+        self.assertEqual(mocked_task_download_magnet.call_count, 2)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(
+            response.json, {"task_id": str(task_ids[1]), "duplicate": False}
+        )
+
     def test_megaweb_query_task_status(self):
         """
         Test that status requests will be correctly answered until completion or failure (JS behavior)
@@ -268,3 +388,86 @@ class TestMegaWeb(TestCase):
                     "task_result": "/tmp/downloads/Rick.and.Morty.S06E01.WEBRip.mp4",
                 },
             )
+
+    @patch("megadebrid.web.views.celery_app.AsyncResult")
+    def test_megaweb_query_task_progress(self, mocked_async_result):
+        """
+        Test that the status of a running task reports its last progress event
+        """
+        task_id = str(uuid4())
+        progress = {
+            "phase": "downloading",
+            "done": 1024 * 1024 * 30,
+            "total": 1024 * 1024 * 100,
+            "rate": 5242880.0,
+        }
+        mocked_async_result.return_value = MagicMock(status="PROGRESS", result=progress)
+
+        response = self.client.get(f"tasks/{task_id}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json,
+            {"task_id": task_id, "task_status": "PROGRESS", "task_result": progress},
+        )
+
+    @patch("megadebrid.web.views.get_task_stream", return_value=None)
+    def test_megaweb_stream_disabled(self, mocked_get_task_stream):
+        """
+        Test that the stream answers 503 when disabled, so the browser falls back on polling
+        """
+        response = self.client.get("/tasks/stream")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json["message"], "Service Unavailable")
+
+    @patch("megadebrid.web.views.get_task_stream")
+    def test_megaweb_stream_status(self, mocked_get_task_stream):
+        """
+        Test that the state changes published by the workers are streamed as Server-Sent Events
+        """
+        task_id = str(uuid4())
+        mocked_get_task_stream.return_value.events.return_value = iter(
+            [
+                "retry: 3000\n\n",
+                f'data: {{"task_id": "{ task_id }", "task_status": "STARTED", "task_result": null}}\n\n',
+            ]
+        )
+
+        response = self.client.get("/tasks/stream")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        self.assertEqual(
+            response.get_data(as_text=True).split("\n\n")[1],
+            f'data: {{"task_id": "{ task_id }", "task_status": "STARTED", "task_result": null}}',
+        )
+
+    @patch("megadebrid.web.views.get_tasks_status")
+    def test_megaweb_query_bulk_status(self, mocked_get_tasks_status):
+        """
+        Test that the status of many tasks is answered by one request, and that invalid lists are rejected
+        """
+        task_ids = [str(uuid4()) for _ in range(3)]
+        mocked_get_tasks_status.return_value = {
+            task_id: {"task_status": "STARTED", "task_result": None}
+            for task_id in task_ids
+        }
+
+        response = self.client.post(
+            "/tasks/status",
+            json={"task_ids": task_ids},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, mocked_get_tasks_status.return_value)
+        self.assertEqual(mocked_get_tasks_status.call_args.args, (task_ids,))
+
+        for post_json in [{}, {"task_ids": "id"}, {"task_ids": [1]}]:
+            response = self.client.post(
+                "/tasks/status", json=post_json, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(mocked_get_tasks_status.call_count, 1)
@@ -1,11 +1,21 @@
 from unittest import TestCase  # , IsolatedAsyncioTestCase
 from unittest.mock import patch, mock_open
+from aioresponses import aioresponses, CallbackResult
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
+from megadebrid.libs.flow import MegaDebridFlow
+from megadebrid.worker.loop import WorkerLoop
+from megadebrid.worker.pool import AsyncioPool
 from megadebrid.worker.tasks import (
     save_file,
     debrid_and_save_file,
+    debrid_and_save_batch,
     download_magnet,
     download_torrent,
+    run_flow,
+    start_worker_loop,
+    stop_worker_loop,
 )
 
 
@@ -84,3 +94,283 @@ class TestMegaWorker(TestCase):
         self.assertEqual(
             mocked_task_download_torrent.call_args.args, (torrent_path, "/tmp")
         )
+
+    @aioresponses()
+    def test_worker_loop(self, mocked):
+        """
+        Test that the tasks of a worker process run on one long-lived loop with the same MegaDebridFlow
+        """
+        mocked.add(
+            method="POST",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getLink&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={
+                "response_code": "ok",
+                "response_text": "",
+                "debridLink": "https://www1.unrestrict.link/download/file/xxxxxxxxxxxxxxx/Rick.and.Morty.S06E01.WEBRip.mp4",
+                "filename": "Rick.and.Morty.S06E01.WEBRip.mp4",
+            },
+            repeat=True,
+        )
+
+        start_worker_loop()
+        worker_loop = WorkerLoop.shared()
+        megadebrid = None
+
+        try:
+            # Opened by the first task
+            self.assertIsNone(worker_loop.megadebrid)
+
+            for _ in range(2):
+                response = run_flow(
+                    "debrid_link", link="https://1fichier.com/?xxxxxxxxxxxx"
+                )
+                self.assertEqual(response["response_code"], "ok")
+                megadebrid = megadebrid or worker_loop.megadebrid
+
+            self.assertIs(WorkerLoop.shared(), worker_loop)
+            self.assertIs(worker_loop.megadebrid, megadebrid)
+            self.assertTrue(worker_loop.is_running)
+        finally:
+            stop_worker_loop()
+
+        self.assertFalse(worker_loop.is_running)
+        self.assertIsNone(megadebrid.session)
+
+    @patch.dict("os.environ", {"MEGA_CONNECTOR_SHARED": "true"})
+    def test_worker_loop_shared_connector(self):
+        """
+        Test that the connector shared in the worker loop is closed when the loop stops
+        """
+
+        async def get_connector(megadebrid):
+            return megadebrid.session.connector
+
+        start_worker_loop()
+
+        try:
+            connector = WorkerLoop.shared().run(get_connector)
+            self.assertIs(WorkerLoop.shared().run(get_connector), connector)
+        finally:
+            stop_worker_loop()
+
+        self.assertTrue(connector.closed)
+
+    def test_worker_loop_login_failure(self):
+        """
+        Test that a failed login fails the task, not the start of the worker loop, and the next task logs in again
+        """
+
+        async def get_megadebrid(megadebrid):
+            return megadebrid
+
+        start_worker_loop()
+
+        try:
+            with patch.object(
+                MegaDebridFlow, "get_token", side_effect=Exception("Login banned")
+            ) as mocked_get_token:
+                # Started without login
+                self.assertTrue(WorkerLoop.shared().is_running)
+                mocked_get_token.assert_not_called()
+
+                with self.assertRaises(Exception):
+                    WorkerLoop.shared().run(get_megadebrid)
+
+            self.assertIsNone(WorkerLoop.shared().megadebrid)
+            self.assertIsInstance(
+                WorkerLoop.shared().run(get_megadebrid), MegaDebridFlow
+            )
+        finally:
+            stop_worker_loop()
+
+    @aioresponses()
+    def test_asyncio_pool(self, mocked):
+        """
+        Test that the asyncio pool runs the tasks of the process concurrently on one event loop
+        """
+        mocked.add(
+            method="POST",
+            status=200,
+            url="https://www.mega-debrid.eu/api.php?action=getLink&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            content_type="text/html; charset=UTF-8",
+            payload={"response_code": "ok", "response_text": ""},
+            repeat=True,
+        )
+        results = []
+
+        pool = AsyncioPool(limit=4)
+        pool.start()
+
+        try:
+            self.assertTrue(WorkerLoop.shared().is_running)
+            applied = [
+                pool.apply_async(
+                    run_flow,
+                    args=("debrid_link",),
+                    kwargs={"link": f"https://1fichier.com/?{ index }"},
+                    callback=results.append,
+                )
+                for index in range(8)
+            ]
+            for result in applied:
+                result.wait(timeout=5)
+        finally:
+            pool.stop()
+
+        self.assertEqual(
+            [response["response_code"] for response in results], ["ok"] * 8
+        )
+        self.assertIsNone(WorkerLoop._shared)
+
+    @aioresponses()
+    def test_debrid_and_save_batch(self, mocked):
+        """
+        Test that a batch of links is processed in one task reporting one result document
+        """
+        links = [f"https://1fichier.com/?{index:012d}" for index in range(3)]
+        unavailable = "https://1fichier.com/?unavailable"
+
+        def debrid_callback(url, **kwargs):
+            link = kwargs["data"]["link"]
+
+            if link == unavailable:
+                return CallbackResult(
+                    status=200,
+                    payload={"response_code": "UNAVAILABLE", "response_text": "Dead"},
+                )
+
+            filename = f"Rick.and.Morty.S06E{links.index(link) + 1:02d}.WEBRip.mp4"
+            return CallbackResult(
+                status=200,
+                payload={
+                    "response_code": "ok",
+                    "response_text": "",
+                    "debridLink": f"https://www1.unrestrict.link/download/file/{ filename }",
+                    "filename": filename,
+                },
+            )
+
+        mocked.post(
+            "https://www.mega-debrid.eu/api.php?action=getLink&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            callback=debrid_callback,
+            repeat=True,
+        )
+        for index in range(3):
+            mocked.get(
+                "https://www1.unrestrict.link/download/file/"
+                f"Rick.and.Morty.S06E{index + 1:02d}.WEBRip.mp4",
+                status=200,
+                body=b"\x00" * 1024,
+            )
+
+        with TemporaryDirectory() as folder, patch.object(
+            debrid_and_save_batch, "update_state"
+        ) as mocked_update_state:
+            try:
+                # Newline-separated links as sent by the Mega-Web form, with a duplicate
+                result = debrid_and_save_batch.apply(
+                    kwargs={
+                        "links": "\n".join(links + [unavailable, links[0], ""]),
+                        "folder": folder,
+                        "concurrency": 2,
+                    }
+                )
+                document = result.get()
+            finally:
+                stop_worker_loop()
+
+            self.assertEqual(
+                document,
+                {
+                    "total": 4,
+                    "done": 4,
+                    "results": {
+                        link: str(
+                            Path(folder)
+                            / f"Rick.and.Morty.S06E{index + 1:02d}.WEBRip.mp4"
+                        )
+                        for index, link in enumerate(links)
+                    },
+                    "errors": {unavailable: "UNAVAILABLE: Dead"},
+                },
+            )
+            self.assertEqual(mocked_update_state.call_count, 4)
+            self.assertEqual(mocked_update_state.call_args.kwargs["state"], "PROGRESS")
+            # The progress is written from another thread: the task ID must be given
+            self.assertEqual(
+                {call.kwargs["task_id"] for call in mocked_update_state.call_args_list},
+                {result.id},
+            )
+
+    @aioresponses()
+    def test_debrid_and_save_file_progress(self, mocked):
+        """
+        Test that a download task reports its progress as 'PROGRESS' state, throttled, up to completion
+        """
+        mocked.post(
+            "https://www.mega-debrid.eu/api.php?action=getLink&token=XXXXXXXXXXXXXXXXXXXXXXXXXX",
+            payload={
+                "response_code": "ok",
+                "response_text": "",
+                "debridLink": "https://www1.unrestrict.link/download/file/Rick.and.Morty.S06E01.WEBRip.mp4",
+                "filename": "Rick.and.Morty.S06E01.WEBRip.mp4",
+            },
+        )
+        mocked.get(
+            "https://www1.unrestrict.link/download/file/Rick.and.Morty.S06E01.WEBRip.mp4",
+            status=200,
+            headers={"Content-Length": str(1024 * 1024 * 20)},
+            body=b"\x00" * 1024 * 1024 * 20,
+        )
+
+        with TemporaryDirectory() as folder, patch.object(
+            debrid_and_save_file, "update_state"
+        ) as mocked_update_state:
+            try:
+                result = debrid_and_save_file.apply(
+                    kwargs={
+                        "link": "https://1fichier.com/?xxxxxxxxxxxx",
+                        "folder": folder,
+                    }
+                )
+            finally:
+                stop_worker_loop()
+
+            self.assertEqual(
+                result.get(), str(Path(folder) / "Rick.and.Morty.S06E01.WEBRip.mp4")
+            )
+
+        # Not one state per chunk of 10MB, and the last one is the completed download
+        states = [call.kwargs for call in mocked_update_state.call_args_list]
+        self.assertLessEqual(len(states), 3)
+        self.assertEqual(
+            {(state["task_id"], state["state"]) for state in states},
+            {(result.id, "PROGRESS")},
+        )
+        self.assertEqual(states[-1]["meta"]["phase"], "downloading")
+        self.assertEqual(states[-1]["meta"]["done"], 1024 * 1024 * 20)
+        self.assertEqual(states[-1]["meta"]["total"], 1024 * 1024 * 20)
+
+    @patch("megadebrid.worker.tasks.get_task_stream")
+    @patch(
+        "megadebrid.worker.tasks.run_flow", return_value="/tmp/file_example_PNG_1MB.png"
+    )
+    def test_publish_task_status(self, mocked_run_flow, mocked_get_task_stream):
+        """
+        Test that the state changes of a task are published to the stream of Mega-Web
+        """
+        url = "https://file-examples.com/storage/feeb72b10363daaeba4c0c9/2017/10/file_example_PNG_1MB.png"
+        result = save_file.apply(kwargs={"url": url, "folder": "/tmp"})
+
+        self.assertEqual(
+            [
+                call.args
+                for call in mocked_get_task_stream.return_value.publish.call_args_list
+            ],
+            [
+                (result.id, "STARTED", None),
+                (result.id, "SUCCESS", "/tmp/file_example_PNG_1MB.png"),
+            ],
+        )